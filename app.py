@@ -5,30 +5,78 @@ This module provides the application factory pattern for creating Flask app inst
 Routes are organized in separate blueprint modules in the routes package.
 """
 
+import os
+
 from flask import Flask
-from database import init_database, add_sample_data
+from database import init_database, add_sample_data, schema_is_current, register_request_connection
 from routes import register_blueprints
+from json_provider import FastJSONProvider
+from compression import init_compression
+from metrics import init_metrics
+from query_budget import init_query_budgets
+from profiling import init_profiling
+from services.suggest_service import build_suggestions
 
 
-def create_app():
+def create_app(init_db: bool = True, fast_startup: bool = None, database: str = None):
     """
     Application factory function to create and configure Flask app.
     
+    Args:
+        init_db: Create tables and sample data. Servers that prepare the
+            database once before starting workers pass False.
+        fast_startup: Skip table creation and sample data when the database
+            already has the current schema version. Defaults to the
+            LIBRARY_FAST_STARTUP environment variable.
+        database: SQLite file for this app. Defaults to the process-wide
+            database.DATABASE (the LIBRARY_DATABASE environment variable,
+            else library.db).
+    
     Returns:
         Flask: Configured Flask application instance
     """
     app = Flask(__name__)
     app.secret_key = "super secret key"
+    if database:
+        app.config['DATABASE'] = database
+    
+    # Serialize JSON responses with the fast provider (orjson when installed)
+    app.json = FastJSONProvider(app)
+    
+    if fast_startup is None:
+        fast_startup = os.environ.get('LIBRARY_FAST_STARTUP', '').lower() in ('1', 'true', 'yes')
     
-    # Initialize the database
-    init_database()
+    # Set up the schema in the app context so it goes to the app's database
+    with app.app_context():
+        if init_db and not (fast_startup and schema_is_current()):
+            # Initialize the database
+            init_database()
+            
+            # Add sample data for testing and demonstration
+            add_sample_data()
+        
+        # Load the typeahead suggestions now rather than on the first request
+        if not fast_startup and schema_is_current():
+            build_suggestions()
     
-    # Add sample data for testing and demonstration
-    add_sample_data()
+    # Record request, query and gateway latency, exposed at /metrics
+    init_metrics(app)
+    
+    # Check per-route SQL statement budgets (off unless QUERY_BUDGET_MODE is set)
+    init_query_budgets(app)
+    
+    # Profile selected requests (nothing is registered unless PROFILE_ENABLED is set)
+    init_profiling(app)
+    
+    # Share one database connection per request
+    register_request_connection(app)
     
     # Register all route blueprints
     register_blueprints(app)
     
+    # Compress large responses for clients that accept gzip or brotli
+    init_compression(app)
+    
     return app
 
 
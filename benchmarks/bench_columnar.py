@@ -0,0 +1,186 @@
+"""
+Columnar snapshot benchmark
+
+Builds a synthetic catalog (see benchmarks.datagen) at each requested size and times the reads
+the columnar snapshot (services.columnar_catalog) can serve, once through SQLite and once from
+the snapshot, with the same inputs:
+
+    get_catalog_books, search_books_in_catalog (title, author, ISBN prefix),
+    get_catalog_page (first page, and a page of available books only)
+
+It also reports the time to build the snapshot, the time to catch up after one book's
+copies change, and the snapshot's memory: its own per-column accounting and the bytes
+tracemalloc sees it holding.
+
+Usage:
+    python -m benchmarks.bench_columnar [--sizes 10000,100000] [--output bench_columnar.json]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict
+
+import database
+from database import get_snapshot_rows
+from benchmarks.bench_services import seed_database
+from benchmarks.datagen import LAST_NAMES, TITLE_NOUNS
+from services import columnar_catalog
+from services.columnar_catalog import BookColumns, ColumnarCatalog, catalog_columns
+from services.library_service import get_catalog_books, get_catalog_page, search_books_in_catalog
+
+DEFAULT_SIZES = (10_000, 100_000)
+
+
+def build_reads(data: Dict) -> Dict[str, Callable[[int], object]]:
+    """The benchmarked reads, each taking the iteration number."""
+    isbns = data['isbns']
+    return {
+        'get_catalog_books': lambda i: get_catalog_books(),
+        'search[title]': lambda i: search_books_in_catalog(TITLE_NOUNS[i % len(TITLE_NOUNS)], 'title'),
+        'search[title, 2 words]': lambda i: search_books_in_catalog(
+            f'{TITLE_NOUNS[i % len(TITLE_NOUNS)]} of', 'title'),
+        'search[author]': lambda i: search_books_in_catalog(LAST_NAMES[i % len(LAST_NAMES)], 'author'),
+        'search[isbn_prefix]': lambda i: search_books_in_catalog(isbns[i % len(isbns)][:8], 'isbn'),
+        'get_catalog_page': lambda i: get_catalog_page(limit=50),
+        'get_catalog_page[available]': lambda i: get_catalog_page(limit=200, available=True),
+    }
+
+
+def median_ms(operation: Callable[[int], object], max_ops: int, max_seconds: float) -> float:
+    """Median latency of operation(0), operation(1), ... over max_ops calls or max_seconds."""
+    latencies = []
+    deadline = time.perf_counter() + max_seconds
+    for i in range(max_ops):
+        start = time.perf_counter()
+        operation(i)
+        end = time.perf_counter()
+        latencies.append(end - start)
+        if end > deadline:
+            break
+    return round(statistics.median(latencies) * 1000, 4)
+
+
+def measure_snapshot(path: str) -> Dict:
+    """Build, memory and catch-up figures for a fresh snapshot of the database at `path`."""
+    # tracemalloc slows allocation down, so the build is timed separately
+    # Memory still held by a snapshot once the rows it was built from are freed
+    conn = sqlite3.connect(path)
+    tracemalloc.start()
+    rows = get_snapshot_rows(conn)
+    traced = BookColumns(rows)
+    del rows
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    conn.close()
+    del traced
+
+    start = time.perf_counter()
+    columns = catalog_columns()
+    build_ms = (time.perf_counter() - start) * 1000
+
+    conn = sqlite3.connect(path)
+    conn.execute('UPDATE books SET available_copies = available_copies WHERE id = 1')
+    conn.commit()
+    conn.close()
+    start = time.perf_counter()
+    catalog_columns()
+    catch_up_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        'build_ms': round(build_ms, 2),
+        'catch_up_ms': round(catch_up_ms, 3),
+        'memory': columns.memory_usage(),
+        'tracemalloc_bytes': allocated,
+    }
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, max_ops: int = 50, max_seconds: float = 3.0, seed: int = 42,
+                   log: Callable[[str], None] = print) -> Dict:
+    """
+    Run the comparison at every catalog size.
+
+    Returns:
+        dict: 'environment', one 'snapshots' entry per size and one 'results' entry per (size, read)
+    """
+    original_database = database.DATABASE
+    original_setting = os.environ.get('LIBRARY_COLUMNAR_CATALOG')
+    original_catalog = columnar_catalog._catalog
+    results, snapshots = [], []
+    try:
+        for size in sizes:
+            with tempfile.TemporaryDirectory(prefix='library-bench-') as directory:
+                path = os.path.join(directory, 'bench.db')
+                data = seed_database(path, size, size, seed)
+
+                os.environ['LIBRARY_COLUMNAR_CATALOG'] = '1'
+                columnar_catalog._catalog = ColumnarCatalog()
+                snapshot = {'size': size, **measure_snapshot(path)}
+                snapshots.append(snapshot)
+                log(f"size {size:>9,}: snapshot built in {snapshot['build_ms']:.0f} ms, "
+                    f"{snapshot['memory']['total'] / 2**20:.1f} MiB "
+                    f"(tracemalloc {snapshot['tracemalloc_bytes'] / 2**20:.1f} MiB), "
+                    f"catch-up {snapshot['catch_up_ms']:.2f} ms")
+
+                for name, read in build_reads(data).items():
+                    os.environ['LIBRARY_COLUMNAR_CATALOG'] = '0'
+                    sqlite_ms = median_ms(read, max_ops, max_seconds)
+                    os.environ['LIBRARY_COLUMNAR_CATALOG'] = '1'
+                    columnar_ms = median_ms(read, max_ops, max_seconds)
+                    result = {'size': size, 'read': name, 'sqlite_p50_ms': sqlite_ms, 'columnar_p50_ms': columnar_ms,
+                              'speedup': round(sqlite_ms / columnar_ms, 2) if columnar_ms else None}
+                    results.append(result)
+                    log(f"  {name:<30} sqlite {sqlite_ms:>10.3f} ms   columnar {columnar_ms:>10.3f} ms   "
+                        f"x{result['speedup'] or 0:.1f}")
+    finally:
+        database.DATABASE = original_database
+        columnar_catalog._catalog = original_catalog
+        if original_setting is None:
+            os.environ.pop('LIBRARY_COLUMNAR_CATALOG', None)
+        else:
+            os.environ['LIBRARY_COLUMNAR_CATALOG'] = original_setting
+
+    return {
+        'environment': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'sqlite': sqlite3.sqlite_version,
+            'numpy': columnar_catalog.np.__version__ if columnar_catalog.np is not None else None,
+            'max_ops': max_ops,
+            'max_seconds': max_seconds,
+        },
+        'snapshots': snapshots,
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='comma-separated catalog sizes (default: %(default)s)')
+    parser.add_argument('--max-ops', type=int, default=50, help='calls per read and path (default: %(default)s)')
+    parser.add_argument('--max-seconds', type=float, default=3.0, help='time limit per read and path (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_columnar.json', help='JSON report path (default: %(default)s)')
+    args = parser.parse_args()
+
+    report = run_benchmarks(
+        sizes=[int(size) for size in args.sizes.split(',')],
+        max_ops=args.max_ops,
+        max_seconds=args.max_seconds,
+        seed=args.seed,
+    )
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+JSON serialization benchmark
+
+Compares Flask's default JSON provider with FastJSONProvider (with and without orjson)
+on a large search response and a large patron status response.
+
+Usage:
+    python -m benchmarks.bench_json [--books 10000] [--loans 5000] [--repeat 20]
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from json_provider import FastJSONProvider, orjson
+
+
+def make_search_response(book_count: int) -> dict:
+    """Build a search response shaped like /api/search with `book_count` results."""
+    books = [
+        {
+            'id': i,
+            'title': f'Synthetic Title {i}',
+            'author': f'Author {i % 997}',
+            'isbn': str(9780000000000 + i),
+            'total_copies': 3,
+            'available_copies': i % 4,
+        }
+        for i in range(book_count)
+    ]
+    return {'search_term': 'Synthetic', 'search_type': 'title', 'results': books, 'count': len(books)}
+
+
+def make_status_response(loan_count: int) -> dict:
+    """Build a patron status report shaped like /api/patron/<id>/status with `loan_count` loans."""
+    now = datetime.now()
+    borrowed = [
+        {
+            'book_id': i,
+            'title': f'Synthetic Title {i}',
+            'author': f'Author {i % 997}',
+            'borrow_date': now - timedelta(days=i % 30),
+            'due_date': now - timedelta(days=i % 30) + timedelta(days=14),
+            'is_overdue': i % 30 > 14,
+        }
+        for i in range(loan_count)
+    ]
+    return {'currently_borrowed': borrowed, 'total_fees_due': 0.0, 'books_overdue': 0}
+
+
+def time_response(app: Flask, payload: dict, repeat: int) -> float:
+    """Return the best time in seconds to build a JSON response for `payload`."""
+    best = float('inf')
+    with app.app_context():
+        for _ in range(repeat):
+            start = time.perf_counter()
+            app.json.response(payload).get_data()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=10000, help='number of search results')
+    parser.add_argument('--loans', type=int, default=5000, help='number of borrowed books in the status report')
+    parser.add_argument('--repeat', type=int, default=20, help='repetitions per measurement (best is reported)')
+    args = parser.parse_args()
+
+    providers = [('flask default', lambda app: DefaultJSONProvider(app))]
+    providers.append(('fast (stdlib)', lambda app: FastJSONProvider(app, use_orjson=False)))
+    if orjson is not None:
+        providers.append(('fast (orjson)', lambda app: FastJSONProvider(app)))
+
+    payloads = [
+        (f'search x{args.books}', make_search_response(args.books)),
+        (f'status x{args.loans}', make_status_response(args.loans)),
+    ]
+
+    print(f"{'payload':<16} {'provider':<16} {'best ms':>10} {'speedup':>8}")
+    for payload_name, payload in payloads:
+        baseline = None
+        for provider_name, factory in providers:
+            app = Flask(__name__)
+            app.json = factory(app)
+            seconds = time_response(app, payload, args.repeat)
+            baseline = baseline or seconds
+            print(f"{payload_name:<16} {provider_name:<16} {seconds * 1000:>10.2f} {baseline / seconds:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+Service function benchmark suite
+
+Builds a synthetic catalog and loan history (see benchmarks.datagen) at each requested
+size in a temporary database, then times the core service functions from services.library_service:
+
+    add_book_to_catalog, borrow_book_by_patron, return_book_by_patron,
+    calculate_late_fee_for_book, search_books_in_catalog, search_books_batch,
+    get_patron_status_report
+
+Each function is called repeatedly (up to --max-ops calls or --max-seconds per function)
+and its throughput and latency percentiles are written to a JSON report.
+
+Usage:
+    python -m benchmarks.bench_services [--sizes 10000,100000,1000000] [--output bench_services.json]
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import database
+from benchmarks.datagen import LAST_NAMES, MAX_PATRONS, TITLE_NOUNS, generate_dataset
+from services.library_service import (
+    add_book_to_catalog, borrow_book_by_patron, calculate_late_fee_for_book,
+    get_patron_status_report, return_book_by_patron, search_books_batch, search_books_in_catalog,
+)
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+
+
+def seed_database(path: str, book_count: int, loan_count: int, seed: int = 42) -> Dict:
+    """
+    Create a database at `path` with `book_count` books and `loan_count` loan records,
+    and point the service layer at it.
+
+    Returns:
+        dict: ISBNs, active loans and patron IDs the benchmarks draw their inputs from
+    """
+    generate_dataset(path, books=book_count, patrons=max(1, min(book_count // 5, MAX_PATRONS)),
+                     loans=loan_count, seed=seed, overwrite=True)
+    database.DATABASE = path
+
+    conn = sqlite3.connect(path)
+    step = max(1, book_count // 1000)
+    isbns = [row[0] for row in conn.execute('SELECT isbn FROM books WHERE id % ? = 0 LIMIT 1000', (step,))]
+    loans = conn.execute(
+        'SELECT patron_id, book_id FROM borrow_records WHERE return_date IS NULL ORDER BY id LIMIT 1000'
+    ).fetchall()
+    patrons = [row[0] for row in conn.execute('SELECT DISTINCT patron_id FROM borrow_records LIMIT 1000')]
+    conn.close()
+
+    return {
+        'book_count': book_count,
+        'isbns': isbns,
+        'loans': loans or [('100000', 1)],
+        'patrons': patrons or ['100000'],
+    }
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def measure(operation: Callable[[int], object], max_ops: int, max_seconds: float) -> Dict:
+    """Call operation(0), operation(1), ... until max_ops calls or max_seconds have elapsed."""
+    latencies = []
+    deadline = time.perf_counter() + max_seconds
+    for i in range(max_ops):
+        start = time.perf_counter()
+        operation(i)
+        end = time.perf_counter()
+        latencies.append(end - start)
+        if end > deadline:
+            break
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        'ops': len(latencies),
+        'ops_per_sec': round(len(latencies) / total, 2) if total else None,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 4),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 4),
+        'p90_ms': round(percentile(latencies, 0.90) * 1000, 4),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 4),
+        'max_ms': round(latencies[-1] * 1000, 4),
+    }
+
+
+def build_operations(data: Dict, rng: random.Random) -> Dict[str, Callable[[int], object]]:
+    """The benchmarked calls, each taking the iteration number."""
+    book_count = data['book_count']
+    borrowed = []
+
+    def add_book(i):
+        add_book_to_catalog(f"Benchmark Title {i}", "Benchmark Author", str(9790000000000 + i), 1)
+
+    def borrow(i):
+        # A fresh patron per call keeps every borrow under the 5-book limit
+        patron_id = str(900000 + i)
+        book_id = rng.randint(1, book_count)
+        if borrow_book_by_patron(patron_id, book_id)[0]:
+            borrowed.append((patron_id, book_id))
+
+    def return_book(i):
+        patron_id, book_id = borrowed[i % len(borrowed)] if borrowed else data['loans'][i % len(data['loans'])]
+        return_book_by_patron(patron_id, book_id)
+
+    def late_fee(i):
+        patron_id, book_id = data['loans'][i % len(data['loans'])]
+        calculate_late_fee_for_book(patron_id, book_id)
+
+    def search_title(i):
+        search_books_in_catalog(TITLE_NOUNS[i % len(TITLE_NOUNS)], 'title')
+
+    def search_author(i):
+        search_books_in_catalog(LAST_NAMES[i % len(LAST_NAMES)], 'author')
+
+    def search_isbn(i):
+        search_books_in_catalog(data['isbns'][i % len(data['isbns'])], 'isbn')
+
+    def search_isbn_prefix(i):
+        search_books_in_catalog(data['isbns'][i % len(data['isbns'])][:8], 'isbn')
+
+    def search_batch(i):
+        # A reading list: titles, authors and ISBNs resolved in one call
+        search_books_batch([(TITLE_NOUNS[(i + j) % len(TITLE_NOUNS)], 'title') for j in range(10)]
+                           + [(LAST_NAMES[(i + j) % len(LAST_NAMES)], 'author') for j in range(5)]
+                           + [(data['isbns'][(i + j) % len(data['isbns'])], 'isbn') for j in range(5)])
+
+    def status(i):
+        get_patron_status_report(data['patrons'][i % len(data['patrons'])])
+
+    return {
+        'add_book_to_catalog': add_book,
+        'borrow_book_by_patron': borrow,
+        'return_book_by_patron': return_book,
+        'calculate_late_fee_for_book': late_fee,
+        'search_books_in_catalog[title]': search_title,
+        'search_books_in_catalog[author]': search_author,
+        'search_books_in_catalog[isbn]': search_isbn,
+        'search_books_in_catalog[isbn_prefix]': search_isbn_prefix,
+        'search_books_batch[20]': search_batch,
+        'get_patron_status_report': status,
+    }
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, max_ops: int = 200, max_seconds: float = 5.0,
+                   loans_per_book: float = 2.0, functions: List[str] = None, seed: int = 42,
+                   log: Callable[[str], None] = print) -> Dict:
+    """
+    Run the suite at every catalog size.
+
+    Returns:
+        dict: 'environment' and one 'results' entry per (size, function)
+    """
+    original_database = database.DATABASE
+    results = []
+    try:
+        for size in sizes:
+            with tempfile.TemporaryDirectory(prefix='library-bench-') as directory:
+                path = os.path.join(directory, 'bench.db')
+                start = time.perf_counter()
+                data = seed_database(path, size, int(size * loans_per_book), seed)
+                log(f"size {size:>9,}: seeded in {time.perf_counter() - start:.1f}s")
+
+                operations = build_operations(data, random.Random(seed))
+                for name, operation in operations.items():
+                    if functions and name.split('[')[0] not in functions and name not in functions:
+                        continue
+                    result = {'size': size, 'function': name, **measure(operation, max_ops, max_seconds)}
+                    results.append(result)
+                    log(f"  {name:<34} {result['ops_per_sec'] or 0:>10.1f} ops/s   "
+                        f"p50 {result['p50_ms']:>9.3f} ms   p99 {result['p99_ms']:>9.3f} ms")
+    finally:
+        database.DATABASE = original_database
+
+    return {
+        'environment': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'max_ops': max_ops,
+            'max_seconds': max_seconds,
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='comma-separated catalog sizes (default: %(default)s)')
+    parser.add_argument('--max-ops', type=int, default=200, help='calls per function (default: %(default)s)')
+    parser.add_argument('--max-seconds', type=float, default=5.0, help='time limit per function (default: %(default)s)')
+    parser.add_argument('--loans-per-book', type=float, default=2.0, help='loan records per book (default: %(default)s)')
+    parser.add_argument('--functions', help='comma-separated subset of functions to run')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_services.json', help='JSON report path (default: %(default)s)')
+    args = parser.parse_args()
+
+    report = run_benchmarks(
+        sizes=[int(size) for size in args.sizes.split(',')],
+        max_ops=args.max_ops,
+        max_seconds=args.max_seconds,
+        loans_per_book=args.loans_per_book,
+        functions=args.functions.split(',') if args.functions else None,
+        seed=args.seed,
+    )
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
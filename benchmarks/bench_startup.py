@@ -0,0 +1,82 @@
+"""
+Application startup benchmark
+
+Measures, in fresh interpreter processes:
+- import time of the app module (and whether the payment stack was imported)
+- create_app() time with full and fast startup
+- latency of the first request served by a new app
+
+Usage:
+    python -m benchmarks.bench_startup [--runs 5] [--output startup.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child interpreter; prints one JSON object
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app(fast_startup={fast})
+created = time.perf_counter()
+response = application.test_client().get('/catalog')
+served = time.perf_counter()
+assert response.status_code == 200
+print(json.dumps({{
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'payment_stack_imported': 'services.payment_service' in sys.modules,
+}}))
+'''
+
+
+def run_probe(fast: bool) -> dict:
+    """Start a new interpreter, build the app and serve one request."""
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE.format(fast=fast)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(samples: list) -> dict:
+    return {
+        key: round(statistics.median(sample[key] for sample in samples), 2)
+        for key in ('import_ms', 'create_app_ms', 'first_request_ms')
+    } | {'payment_stack_imported': any(sample['payment_stack_imported'] for sample in samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per mode (median is reported)')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    # Make sure the schema exists so fast startup can take its shortcut
+    run_probe(fast=False)
+
+    results = {}
+    for mode, fast in (('full', False), ('fast', True)):
+        results[mode] = summarize([run_probe(fast) for _ in range(args.runs)])
+
+    print(f"{'mode':<6} {'import ms':>10} {'create_app ms':>14} {'first request ms':>17}  payment imported")
+    for mode, result in results.items():
+        print(f"{mode:<6} {result['import_ms']:>10.1f} {result['create_app_ms']:>14.1f} "
+              f"{result['first_request_ms']:>17.1f}  {result['payment_stack_imported']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""
+Performance regression gate
+
+Runs the service benchmarks (benchmarks.bench_services) several times, takes each function's
+median p50 latency across the runs with a confidence interval, and compares the result with a
+stored baseline. A function counts as regressed only when both of these hold:
+
+- its median is more than --threshold (default 25%) slower than the baseline median, and
+- the confidence intervals do not overlap (the current lower bound is above the baseline
+  upper bound), so run-to-run noise alone cannot explain the difference.
+
+The exit status is 1 if anything regressed and 0 otherwise. Baselines depend on the machine:
+record one on the machine the gate runs on, and commit it when a change is meant to move the numbers.
+
+Usage:
+    python -m benchmarks.compare                     # compare with benchmarks/baseline.json
+    python -m benchmarks.compare --update-baseline   # record a new baseline
+    python -m benchmarks.compare --runs 7 --threshold 0.15 --functions search_books_in_catalog
+"""
+
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+from typing import Dict, List, Tuple
+
+from benchmarks.bench_services import run_benchmarks
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_SETTINGS = {
+    'sizes': [10_000],
+    'runs': 5,
+    'max_ops': 50,
+    'max_seconds': 1.0,
+    'loans_per_book': 2.0,
+    'seed': 42,
+}
+
+
+def median_confidence_interval(values: List[float], confidence: float = 0.95) -> Tuple[float, float]:
+    """
+    Distribution-free confidence interval for the median, from the order statistics.
+
+    With n values the interval is [x(k), x(n-k+1)] for the largest k such that the binomial
+    probability of fewer than k values falling below the median is at most (1 - confidence) / 2.
+    Small samples get the full range.
+    """
+    ordered = sorted(values)
+    n = len(ordered)
+    tail = (1 - confidence) / 2
+    k, cumulative = 0, 0.0
+    while k < n // 2:
+        cumulative += math.comb(n, k) / 2 ** n
+        if cumulative > tail:
+            break
+        k += 1
+    k = max(k, 1)
+    return ordered[k - 1], ordered[n - k]
+
+
+def measure(settings: Dict, functions: List[str] = None, log=print) -> Dict[str, Dict]:
+    """
+    Run the benchmark set settings['runs'] times.
+
+    Returns:
+        dict: For each "size:function", the median, confidence bounds and per-run p50 latencies
+    """
+    runs = {}
+    for run in range(settings['runs']):
+        log(f"Run {run + 1}/{settings['runs']}")
+        report = run_benchmarks(sizes=settings['sizes'], max_ops=settings['max_ops'],
+                                max_seconds=settings['max_seconds'], loans_per_book=settings['loans_per_book'],
+                                functions=functions, seed=settings['seed'], log=lambda line: None)
+        for result in report['results']:
+            runs.setdefault(f"{result['size']}:{result['function']}", []).append(result['p50_ms'])
+
+    summary = {}
+    for key, values in runs.items():
+        low, high = median_confidence_interval(values)
+        summary[key] = {
+            'median_ms': round(statistics.median(values), 4),
+            'low_ms': round(low, 4),
+            'high_ms': round(high, 4),
+            'runs_ms': values,
+        }
+    return summary
+
+
+def compare(baseline: Dict[str, Dict], current: Dict[str, Dict], threshold: float = 0.25) -> List[Dict]:
+    """
+    Classify every benchmark as 'regressed', 'improved', 'unchanged', 'new' or 'missing'.
+
+    Returns:
+        list: One row per benchmark, regressions first
+    """
+    rows = []
+    for key in sorted(set(baseline) | set(current)):
+        before, after = baseline.get(key), current.get(key)
+        if before is None or after is None:
+            rows.append({'benchmark': key, 'verdict': 'new' if before is None else 'missing',
+                         'baseline_ms': before and before['median_ms'], 'current_ms': after and after['median_ms'],
+                         'change': None})
+            continue
+
+        change = after['median_ms'] / before['median_ms'] - 1 if before['median_ms'] else 0.0
+        if change > threshold and after['low_ms'] > before['high_ms']:
+            verdict = 'regressed'
+        elif change < -threshold and after['high_ms'] < before['low_ms']:
+            verdict = 'improved'
+        else:
+            verdict = 'unchanged'
+        rows.append({'benchmark': key, 'verdict': verdict, 'baseline_ms': before['median_ms'],
+                     'current_ms': after['median_ms'], 'change': round(change, 4)})
+
+    order = {'regressed': 0, 'missing': 1, 'improved': 2, 'new': 3, 'unchanged': 4}
+    rows.sort(key=lambda row: order[row['verdict']])
+    return rows
+
+
+def format_report(rows: List[Dict], threshold: float) -> str:
+    """Human-readable comparison table."""
+    lines = [f"{'benchmark':<48} {'baseline':>11} {'current':>11} {'change':>8}  verdict"]
+    for row in rows:
+        baseline = f"{row['baseline_ms']:.3f} ms" if row['baseline_ms'] is not None else '-'
+        current = f"{row['current_ms']:.3f} ms" if row['current_ms'] is not None else '-'
+        change = f"{row['change']:+.0%}" if row['change'] is not None else '-'
+        verdict = row['verdict'].upper() if row['verdict'] == 'regressed' else row['verdict']
+        lines.append(f"{row['benchmark']:<48} {baseline:>11} {current:>11} {change:>8}  {verdict}")
+
+    regressed = sum(row['verdict'] == 'regressed' for row in rows)
+    if regressed:
+        lines.append(f"\n{regressed} benchmark(s) regressed by more than {threshold:.0%} beyond run-to-run noise")
+    else:
+        lines.append(f"\nNo regressions (threshold {threshold:.0%})")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON file (default: benchmarks/baseline.json)')
+    parser.add_argument('--update-baseline', action='store_true', help='measure and write a new baseline instead of comparing')
+    parser.add_argument('--runs', type=int, help='benchmark runs (default: the baseline setting, else 5)')
+    parser.add_argument('--threshold', type=float, default=0.25, help='slowdown that counts as a regression (default: %(default)s)')
+    parser.add_argument('--functions', help='comma-separated subset of functions to run')
+    parser.add_argument('--output', help='also write the comparison as JSON to this file')
+    args = parser.parse_args()
+    functions = args.functions.split(',') if args.functions else None
+
+    if args.update_baseline:
+        settings = dict(DEFAULT_SETTINGS, runs=args.runs or DEFAULT_SETTINGS['runs'])
+        benchmarks = measure(settings, functions)
+        with open(args.baseline, 'w') as f:
+            json.dump({'settings': settings, 'benchmarks': benchmarks}, f, indent=2)
+            f.write('\n')
+        print(f"Wrote baseline with {len(benchmarks)} benchmarks to {args.baseline}")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    settings = dict(baseline['settings'])
+    if args.runs:
+        settings['runs'] = args.runs
+    expected = baseline['benchmarks']
+    if functions:
+        expected = {key: value for key, value in expected.items()
+                    if key.split(':', 1)[1] in functions or key.split(':', 1)[1].split('[')[0] in functions}
+
+    rows = compare(expected, measure(settings, functions), args.threshold)
+    print(format_report(rows, args.threshold))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'threshold': args.threshold, 'results': rows}, f, indent=2)
+
+    sys.exit(1 if any(row['verdict'] == 'regressed' for row in rows) else 0)
+
+
+if __name__ == '__main__':
+    main()
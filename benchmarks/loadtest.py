@@ -0,0 +1,356 @@
+"""
+Closed-loop HTTP load test
+
+Drives a running instance (--url) or the app in-process (--in-process) with many concurrent
+clients. Each client is a patron (ID 900000 + client number) that waits for every response
+before sending its next request, picking requests from a weighted mix of:
+
+    catalog   GET  /catalog
+    search    GET  /search?q=<word>&type=title|author
+    borrow    POST /borrow
+    return    POST /return (a book the client believes it holds)
+    status    GET  /api/patron/<id>/status (also resyncs the client's list of held books)
+
+The report gives throughput and p50/p90/p99 latency per request type, counts transport errors
+and 5xx responses, and checks the database afterwards for lost updates: every book's
+available_copies must equal total_copies minus its active loans and stay within 0..total_copies,
+and no patron may hold more than 5 books. The check reads the database directly, so it runs
+in-process or when --db points at the server's database file.
+
+Usage:
+    python -m benchmarks.loadtest --url http://127.0.0.1:5000 --db library.db [--clients 16] [--duration 30]
+    python -m benchmarks.loadtest --in-process [--mix catalog=5,search=30,borrow=25,return=25,status=15]
+
+Exits with status 1 if the consistency check fails.
+"""
+
+import argparse
+import http.client
+import json
+import random
+import sqlite3
+import threading
+import time
+import urllib.parse
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.bench_services import percentile
+from benchmarks.datagen import LAST_NAMES, TITLE_NOUNS
+
+DEFAULT_MIX = {'catalog': 5, 'search': 30, 'borrow': 25, 'return': 25, 'status': 15}
+FIRST_CLIENT_PATRON_ID = 900000
+MAX_BOOKS_PER_PATRON = 5
+
+
+class HttpTarget:
+    """Sends requests to a running server over one keep-alive connection per thread."""
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def request(self, method: str, path: str, form: Optional[Dict] = None) -> Tuple[int, bytes]:
+        body = urllib.parse.urlencode(form) if form is not None else None
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if form is not None else {}
+        conn = self._connection()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.read()
+        except Exception:
+            conn.close()
+            self._local.conn = None
+            raise
+
+
+class AppTarget:
+    """Sends requests to a Flask app in this process with one test client per thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method: str, path: str, form: Optional[Dict] = None) -> Tuple[int, bytes]:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, data=form)
+        return response.status_code, response.get_data()
+
+
+class LoadClient:
+    """One simulated patron choosing its next request from the mix."""
+
+    def __init__(self, number: int, mix: Dict[str, float], book_ids: List[int], rng: random.Random):
+        self.patron_id = str(FIRST_CLIENT_PATRON_ID + number)
+        self.operations = list(mix)
+        self.weights = list(mix.values())
+        self.book_ids = book_ids
+        self.rng = rng
+        self.held = []
+
+    def next_request(self) -> Tuple[str, str, str, Optional[Dict]]:
+        """(operation, method, path, form) of the next request."""
+        operation = self.rng.choices(self.operations, self.weights)[0]
+        if operation == 'borrow' and len(self.held) >= MAX_BOOKS_PER_PATRON:
+            operation = 'return'
+        if operation == 'return' and not self.held:
+            operation = 'borrow'
+
+        if operation == 'catalog':
+            return operation, 'GET', '/catalog', None
+        if operation == 'search':
+            search_type = self.rng.choice(('title', 'author'))
+            term = self.rng.choice(TITLE_NOUNS if search_type == 'title' else LAST_NAMES)
+            return operation, 'GET', f'/search?q={term}&type={search_type}', None
+        if operation == 'borrow':
+            book_id = self.rng.choice(self.book_ids)
+            self.held.append(book_id)
+            return operation, 'POST', '/borrow', {'patron_id': self.patron_id, 'book_id': book_id}
+        if operation == 'return':
+            book_id = self.held.pop(self.rng.randrange(len(self.held)))
+            return operation, 'POST', '/return', {'patron_id': self.patron_id, 'book_id': book_id}
+        return operation, 'GET', f'/api/patron/{self.patron_id}/status', None
+
+    def sync(self, status_body: bytes):
+        """Replace the held list with the books the status report says are on loan."""
+        try:
+            report = json.loads(status_body)
+        except ValueError:
+            return
+        self.held = [book['book_id'] for book in report.get('currently_borrowed', [])]
+
+
+def discover_book_ids(target, limit: int = 1000) -> List[int]:
+    """Up to `limit` book IDs, read from /api/books."""
+    book_ids, cursor = [], 0
+    while len(book_ids) < limit:
+        status, body = target.request('GET', f'/api/books?fields=id&limit={min(200, limit - len(book_ids))}&cursor={cursor}')
+        if status != 200:
+            raise RuntimeError(f"/api/books returned {status}")
+        page = json.loads(body)
+        book_ids.extend(book['id'] for book in page['books'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    if not book_ids:
+        raise RuntimeError("The catalog is empty")
+    return book_ids
+
+
+def run_load(target, clients: int = 16, duration: float = 10.0, mix: Dict[str, float] = None,
+             book_ids: List[int] = None, requests_per_client: int = None, seed: int = 42) -> Dict:
+    """
+    Run `clients` closed-loop clients against `target` for `duration` seconds
+    (or until each has sent `requests_per_client` requests).
+
+    Returns:
+        dict: Totals and per-operation throughput, latency percentiles and error counts
+    """
+    mix = mix or DEFAULT_MIX
+    book_ids = book_ids or discover_book_ids(target)
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+    errors = Counter()
+    error_samples = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(clients + 1)
+
+    def client_loop(number):
+        client = LoadClient(number, mix, book_ids, random.Random(seed * 1000 + number))
+        local_latencies = defaultdict(list)
+        local_statuses = defaultdict(Counter)
+        local_errors = Counter()
+        local_samples = []
+
+        # Start from the books this patron still holds from earlier runs
+        status, body = target.request('GET', f'/api/patron/{client.patron_id}/status')
+        if status == 200:
+            client.sync(body)
+
+        start_barrier.wait()
+        deadline = time.perf_counter() + duration
+        sent = 0
+        while time.perf_counter() < deadline and (requests_per_client is None or sent < requests_per_client):
+            operation, method, path, form = client.next_request()
+            started = time.perf_counter()
+            try:
+                status, body = target.request(method, path, form)
+            except Exception as e:
+                local_errors[operation] += 1
+                local_samples.append(f"{method} {path}: {e!r}")
+                continue
+            finally:
+                local_latencies[operation].append(time.perf_counter() - started)
+                sent += 1
+            local_statuses[operation][status] += 1
+            if status >= 500:
+                local_errors[operation] += 1
+                local_samples.append(f"{method} {path}: HTTP {status}")
+            elif operation == 'status' and status == 200:
+                client.sync(body)
+
+        with lock:
+            for operation, values in local_latencies.items():
+                latencies[operation].extend(values)
+            for operation, counts in local_statuses.items():
+                statuses[operation].update(counts)
+            errors.update(local_errors)
+            error_samples.extend(local_samples[:5])
+
+    threads = [threading.Thread(target=client_loop, args=(n,), daemon=True) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    operations = {}
+    for operation in sorted(latencies):
+        values = sorted(latencies[operation])
+        operations[operation] = {
+            'requests': len(values),
+            'requests_per_sec': round(len(values) / elapsed, 2),
+            'errors': errors[operation],
+            'statuses': {str(code): count for code, count in sorted(statuses[operation].items())},
+            'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+            'p90_ms': round(percentile(values, 0.90) * 1000, 3),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+        }
+    all_latencies = sorted(value for values in latencies.values() for value in values)
+    return {
+        'clients': clients,
+        'duration_s': round(elapsed, 3),
+        'mix': mix,
+        'requests': len(all_latencies),
+        'requests_per_sec': round(len(all_latencies) / elapsed, 2) if elapsed else None,
+        'errors': sum(errors.values()),
+        'error_samples': error_samples[:20],
+        'p50_ms': round(percentile(all_latencies, 0.50) * 1000, 3),
+        'p90_ms': round(percentile(all_latencies, 0.90) * 1000, 3),
+        'p99_ms': round(percentile(all_latencies, 0.99) * 1000, 3),
+        'operations': operations,
+    }
+
+
+def check_consistency(db_path: str) -> Dict:
+    """
+    Check the copy counts and loan limits the borrow and return paths must maintain.
+
+    Returns:
+        dict: 'ok' and lists of offending books and patrons (at most 20 of each)
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        books = conn.execute('''
+            SELECT b.id, b.total_copies, b.available_copies, COALESCE(l.active, 0)
+            FROM books b
+            LEFT JOIN (SELECT book_id, COUNT(*) AS active FROM borrow_records
+                       WHERE return_date IS NULL GROUP BY book_id) l ON l.book_id = b.id
+            WHERE b.available_copies != b.total_copies - COALESCE(l.active, 0)
+               OR b.available_copies < 0 OR b.available_copies > b.total_copies
+            LIMIT 20
+        ''').fetchall()
+        patrons = conn.execute('''
+            SELECT patron_id, COUNT(*) FROM borrow_records WHERE return_date IS NULL
+            GROUP BY patron_id HAVING COUNT(*) > ? LIMIT 20
+        ''', (MAX_BOOKS_PER_PATRON,)).fetchall()
+    finally:
+        conn.close()
+
+    return {
+        'ok': not books and not patrons,
+        'books': [{'id': book_id, 'total_copies': total, 'available_copies': available, 'active_loans': active}
+                  for book_id, total, available, active in books],
+        'patrons': [{'patron_id': patron_id, 'active_loans': active} for patron_id, active in patrons],
+    }
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """Parse 'catalog=5,search=30,...' into a weight mapping."""
+    mix = {}
+    for part in text.split(','):
+        operation, _, weight = part.partition('=')
+        operation = operation.strip()
+        if operation not in DEFAULT_MIX:
+            raise ValueError(f"Unknown operation '{operation}'. Choose from: {', '.join(DEFAULT_MIX)}")
+        mix[operation] = float(weight)
+    if not any(mix.values()):
+        raise ValueError("The mix needs at least one operation with a positive weight")
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument('--url', help='base URL of a running instance, e.g. http://127.0.0.1:5000')
+    where.add_argument('--in-process', action='store_true', help='serve requests from create_app() in this process')
+    parser.add_argument('--db', help='database file for the consistency check (default in-process: the app database)')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent clients (default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to run (default: %(default)s)')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='request weights (default: %s)' % ','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items()))
+    parser.add_argument('--book-pool', type=int, default=1000, help='books the clients borrow from (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args()
+
+    if args.in_process:
+        import database
+        from app import create_app
+        if args.db:
+            database.DATABASE = args.db
+        target = AppTarget(create_app())
+        db_path = database.DATABASE
+    else:
+        target = HttpTarget(args.url)
+        db_path = args.db
+
+    report = run_load(target, clients=args.clients, duration=args.duration, mix=args.mix,
+                      book_ids=discover_book_ids(target, args.book_pool), seed=args.seed)
+    report['consistency'] = check_consistency(db_path) if db_path else None
+
+    print(f"{report['clients']} clients, {report['duration_s']:.1f}s: {report['requests']:,} requests "
+          f"({report['requests_per_sec']:.1f}/s), {report['errors']} errors, "
+          f"p50 {report['p50_ms']:.1f} ms, p99 {report['p99_ms']:.1f} ms")
+    for operation, result in report['operations'].items():
+        print(f"  {operation:<8} {result['requests_per_sec']:>9.1f} req/s   p50 {result['p50_ms']:>8.1f} ms   "
+              f"p90 {result['p90_ms']:>8.1f} ms   p99 {result['p99_ms']:>8.1f} ms   errors {result['errors']}")
+    for sample in report['error_samples'][:5]:
+        print(f"  error: {sample}")
+
+    consistency = report['consistency']
+    if consistency is None:
+        print("Consistency check skipped (pass --db with the server's database file)")
+    elif consistency['ok']:
+        print("Consistency check passed")
+    else:
+        for book in consistency['books']:
+            print(f"  LOST UPDATE book {book['id']}: available_copies={book['available_copies']}, "
+                  f"total_copies={book['total_copies']}, active loans={book['active_loans']}")
+        for patron in consistency['patrons']:
+            print(f"  LIMIT EXCEEDED patron {patron['patron_id']}: {patron['active_loans']} active loans")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    if consistency is not None and not consistency['ok']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+Concurrency stress test for the borrow and return paths
+
+Creates a fresh database with a few "hot" titles of which only a few copies exist, then has
+many threads (optionally in several processes) borrow and return them for a small, shared
+set of patrons as fast as they can. Afterwards it checks the invariants the service layer
+must keep under any interleaving:
+
+- available_copies equals total_copies minus the book's active loans, within 0..total_copies
+- no patron holds more than 5 books
+- successful borrows minus successful returns equals the number of active loans
+
+Requests go straight to the service functions (--via service) or through the Flask routes
+with the request-scoped connection (--via app).
+
+Usage:
+    python -m benchmarks.stress [--processes 4] [--threads 8] [--operations 200] [--hot-books 3] [--copies 2]
+
+Exits with status 1 if an invariant is violated.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict
+
+import database
+from benchmarks.loadtest import check_consistency
+
+REJECTIONS = ('not available', 'maximum borrowing limit', 'not borrowed')
+
+
+def prepare_database(path: str, hot_books: int, copies: int):
+    """Create `path` with `hot_books` titles of `copies` copies each and no loans."""
+    original_database = database.DATABASE
+    database.DATABASE = path
+    try:
+        database.init_database()
+    finally:
+        database.DATABASE = original_database
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies, title_key, author_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(f"Hot Title {n}", "Stress Author", f"97800000{n:05d}", copies, copies,
+               database.search_key(f"Hot Title {n}"), database.search_key("Stress Author"))
+              for n in range(1, hot_books + 1)])
+    conn.close()
+
+
+def classify(success: bool, message: str) -> str:
+    """'ok', 'rejected' (a business rule said no) or 'error'."""
+    if success:
+        return 'ok'
+    if any(reason in message for reason in REJECTIONS):
+        return 'rejected'
+    return 'error'
+
+
+def _service_calls():
+    from services.library_service import borrow_book_by_patron, return_book_by_patron
+    return borrow_book_by_patron, return_book_by_patron
+
+
+def _app_calls():
+    from flask import message_flashed
+    from app import create_app
+
+    app = create_app(init_db=False)
+    local = threading.local()
+
+    # The routes report their outcome as a flashed message, sent in the requesting thread
+    def record_flash(sender, message, category, **extra):
+        local.flashed = (category == 'success', message)
+
+    message_flashed.connect(record_flash, app, weak=False)
+
+    def call(path, patron_id, book_id):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        local.flashed = (False, "No flash message")
+        response = client.post(path, data={'patron_id': patron_id, 'book_id': str(book_id)})
+        if response.status_code >= 500:
+            return False, f"HTTP {response.status_code}"
+        return local.flashed
+
+    return (lambda patron_id, book_id: call('/borrow', patron_id, book_id),
+            lambda patron_id, book_id: call('/return', patron_id, book_id))
+
+
+def run_worker(path: str, via: str, threads: int, operations: int, hot_books: int, patrons: int,
+               seed: int) -> Dict[str, int]:
+    """Run `threads` threads of `operations` random borrows and returns each; returns outcome counts."""
+    database.DATABASE = path
+    borrow, return_book = _app_calls() if via == 'app' else _service_calls()
+    outcomes = Counter()
+    lock = threading.Lock()
+
+    def hammer(number):
+        rng = random.Random(seed * 1000 + number)
+        local = Counter()
+        for _ in range(operations):
+            patron_id = str(500000 + rng.randrange(patrons))
+            book_id = rng.randint(1, hot_books)
+            if rng.random() < 0.5:
+                local[f"borrow_{classify(*borrow(patron_id, book_id))}"] += 1
+            else:
+                local[f"return_{classify(*return_book(patron_id, book_id))}"] += 1
+        with lock:
+            outcomes.update(local)
+
+    workers = [threading.Thread(target=hammer, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return dict(outcomes)
+
+
+def _run_worker_process(args):
+    return run_worker(*args)
+
+
+def run_stress(path: str, processes: int = 1, threads: int = 8, operations: int = 200, hot_books: int = 3,
+               copies: int = 2, patrons: int = 6, via: str = 'service', seed: int = 42) -> Dict:
+    """
+    Hammer borrow/return on a fresh database at `path` and check the invariants.
+
+    Returns:
+        dict: Outcome counts, throughput, and the invariant check ('ok', offending books and patrons)
+    """
+    if via not in ('service', 'app'):
+        raise ValueError("via must be 'service' or 'app'")
+    prepare_database(path, hot_books, copies)
+
+    start = time.perf_counter()
+    if processes <= 1:
+        results = [run_worker(path, via, threads, operations, hot_books, patrons, seed)]
+    else:
+        jobs = [(path, via, threads, operations, hot_books, patrons, seed + n) for n in range(processes)]
+        with multiprocessing.get_context('spawn').Pool(processes) as pool:
+            results = pool.map(_run_worker_process, jobs)
+    elapsed = time.perf_counter() - start
+
+    outcomes = Counter()
+    for result in results:
+        outcomes.update(result)
+
+    consistency = check_consistency(path)
+    conn = sqlite3.connect(path)
+    active_loans = conn.execute('SELECT COUNT(*) FROM borrow_records WHERE return_date IS NULL').fetchone()[0]
+    conn.close()
+    expected_loans = outcomes['borrow_ok'] - outcomes['return_ok']
+    total = sum(outcomes.values())
+
+    return {
+        'processes': max(1, processes),
+        'threads': threads,
+        'via': via,
+        'operations': total,
+        'seconds': round(elapsed, 3),
+        'operations_per_sec': round(total / elapsed, 1) if elapsed else None,
+        'outcomes': dict(sorted(outcomes.items())),
+        'active_loans': active_loans,
+        'expected_active_loans': expected_loans,
+        'books': consistency['books'],
+        'patrons': consistency['patrons'],
+        'ok': consistency['ok'] and active_loans == expected_loans,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=1, help='worker processes (default: %(default)s)')
+    parser.add_argument('--threads', type=int, default=8, help='threads per process (default: %(default)s)')
+    parser.add_argument('--operations', type=int, default=200, help='operations per thread (default: %(default)s)')
+    parser.add_argument('--hot-books', type=int, default=3, help='titles everyone competes for (default: %(default)s)')
+    parser.add_argument('--copies', type=int, default=2, help='copies of each title (default: %(default)s)')
+    parser.add_argument('--patrons', type=int, default=6, help='patrons shared by all threads (default: %(default)s)')
+    parser.add_argument('--via', choices=('service', 'app'), default='service')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='library-stress-') as directory:
+        report = run_stress(os.path.join(directory, 'stress.db'), processes=args.processes, threads=args.threads,
+                            operations=args.operations, hot_books=args.hot_books, copies=args.copies,
+                            patrons=args.patrons, via=args.via, seed=args.seed)
+
+    print(f"{report['processes']} process(es) x {report['threads']} threads via {report['via']}: "
+          f"{report['operations']:,} operations in {report['seconds']:.1f}s ({report['operations_per_sec']:.0f}/s)")
+    print("  " + ", ".join(f"{name}={count}" for name, count in report['outcomes'].items()))
+    for book in report['books']:
+        print(f"  VIOLATION book {book['id']}: available_copies={book['available_copies']}, "
+              f"total_copies={book['total_copies']}, active loans={book['active_loans']}")
+    for patron in report['patrons']:
+        print(f"  VIOLATION patron {patron['patron_id']}: {patron['active_loans']} active loans")
+    if report['active_loans'] != report['expected_active_loans']:
+        print(f"  VIOLATION {report['active_loans']} active loans, but successful borrows minus returns "
+              f"is {report['expected_active_loans']}")
+    print("Invariants hold" if report['ok'] else "Invariants violated")
+    if not report['ok']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -16,6 +16,21 @@ def clear_database():
             WHERE type='table' AND name NOT LIKE 'sqlite_%'
         """).fetchall()
         
+        # Skip virtual tables (the search index) and their shadow tables; the
+        # triggers on books keep the index in step as its rows are deleted
+        virtual_tables = [row[0] for row in conn.execute("""
+            SELECT name FROM sqlite_master
+            WHERE type='table' AND sql LIKE 'CREATE VIRTUAL TABLE%'
+        """).fetchall()]
+        tables = [
+            table for table in tables
+            if not any(table[0] == name or table[0].startswith(name + '_') for name in virtual_tables)
+        ]
+        
+        # Keep catalog_meta: its counters only ever grow, so caches of the catalog in
+        # other processes notice that the books were cleared
+        tables = [table for table in tables if table[0] != 'catalog_meta']
+        
         # Delete all data from each table
         for table in tables:
             table_name = table[0]
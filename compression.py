@@ -0,0 +1,156 @@
+"""
+Response compression for the Library Management System
+Compresses responses with brotli (when installed) or gzip based on the client's Accept-Encoding
+"""
+
+import gzip
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+DEFAULT_MIMETYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/json', 'application/x-ndjson', 'application/javascript', 'image/svg+xml',
+)
+
+
+class CompressedCache:
+    """Thread-safe LRU cache of compressed bodies keyed by encoding and body digest."""
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value: bytes):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def available_encodings() -> list:
+    """Encodings this server can produce, most preferred first."""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def choose_encoding(accept_encodings) -> Optional[str]:
+    """Pick the best supported encoding from a parsed Accept-Encoding header, or None."""
+    best, best_quality = None, 0
+    for encoding in available_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress_bytes(data: bytes, encoding: str, level: int) -> bytes:
+    """Compress a complete body."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str, level: int) -> Iterator[bytes]:
+    """Compress a body chunk by chunk, flushing after each chunk so clients see data as it is produced."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=min(level, 11))
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _add_vary(response):
+    vary = response.headers.get('Vary', '')
+    if 'accept-encoding' not in vary.lower():
+        response.headers['Vary'] = f'{vary}, Accept-Encoding' if vary else 'Accept-Encoding'
+
+
+def init_compression(app):
+    """
+    Register response compression on the Flask app.
+
+    Config:
+        COMPRESS_MIN_SIZE: Bodies smaller than this many bytes are sent as-is (default 500)
+        COMPRESS_LEVEL: Compression level (default 6)
+        COMPRESS_MIMETYPES: Mimetypes that are compressed
+        COMPRESS_CACHE_SIZE: Number of compressed GET bodies kept in memory (0 disables)
+    """
+    app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+    app.config.setdefault('COMPRESS_CACHE_SIZE', 128)
+
+    cache = CompressedCache(app.config['COMPRESS_CACHE_SIZE'])
+    app.extensions['compression_cache'] = cache
+
+    @app.after_request
+    def compress_response(response):
+        config = app.config
+        if (response.mimetype not in config['COMPRESS_MIMETYPES']
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.status_code < 200
+                or response.status_code in (204, 206, 304)
+                or request.method == 'HEAD'):
+            return response
+
+        _add_vary(response)
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        level = config['COMPRESS_LEVEL']
+
+        if response.is_streamed:
+            response.response = compress_stream(response.iter_encoded(), encoding, level)
+            response.headers.pop('Content-Length', None)
+            response.headers['Content-Encoding'] = encoding
+            return response
+
+        body = response.get_data()
+        if len(body) < config['COMPRESS_MIN_SIZE']:
+            return response
+
+        cacheable = (request.method == 'GET' and response.status_code == 200
+                     and config['COMPRESS_CACHE_SIZE'] > 0)
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest()) if cacheable else None
+        compressed = cache.get(key) if cacheable else None
+        if compressed is None:
+            compressed = compress_bytes(body, encoding, level)
+            if cacheable:
+                cache.put(key, compressed)
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,46 @@
+"""
+Test database isolation
+
+Every pytest process (the main process, or each pytest-xdist worker with `pytest -n auto`)
+builds a fully migrated, empty template database once in its own temporary directory.
+Each test then gets a fresh copy of the template: database.DATABASE and LIBRARY_DATABASE
+point at the copy for the duration of the test, so tests never share a file and
+library.db in the working directory is left alone.
+"""
+
+import os
+import shutil
+import tempfile
+
+import pytest
+
+import database
+
+_template = None
+
+
+def pytest_configure(config):
+    """Build this process's template database before test modules are imported."""
+    global _template
+    worker = os.environ.get('PYTEST_XDIST_WORKER', 'main')
+    directory = tempfile.mkdtemp(prefix=f'library-tests-{worker}-')
+    _template = os.path.join(directory, 'template.db')
+
+    database.DATABASE = _template
+    database.init_database()
+
+    # Module-level code run during collection (e.g. clear_database()) works on a scratch copy
+    scratch = os.path.join(directory, 'collection.db')
+    shutil.copyfile(_template, scratch)
+    database.DATABASE = os.environ['LIBRARY_DATABASE'] = scratch
+    config.add_cleanup(lambda: shutil.rmtree(directory, ignore_errors=True))
+
+
+@pytest.fixture(autouse=True)
+def library_database(tmp_path_factory, monkeypatch):
+    """A fresh copy of the template database for each test; yields its path."""
+    path = str(tmp_path_factory.mktemp('db') / 'library.db')
+    shutil.copyfile(_template, path)
+    monkeypatch.setattr(database, 'DATABASE', path)
+    monkeypatch.setenv('LIBRARY_DATABASE', path)
+    yield path
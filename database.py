@@ -3,22 +3,411 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import logging
+import os
 import sqlite3
+import sys
+import time
+import unicodedata
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
-# Database configuration
-DATABASE = 'library.db'
+from flask import current_app, g, has_app_context, has_request_context
 
-def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
+from metrics import DB_QUERIES, DB_QUERY_DURATION
+
+logger = logging.getLogger(__name__)
+
+# Database configuration: the process-wide default file (LIBRARY_DATABASE overrides it);
+# an app created with create_app(database=...) uses its own DATABASE config instead
+DATABASE = os.environ.get('LIBRARY_DATABASE', 'library.db')
+
+# Schema version recorded in PRAGMA user_version; bump when init_database changes the schema
+SCHEMA_VERSION = 5
+
+# Shortest term the trigram index can answer; shorter terms fall back to a scan
+MIN_TRIGRAM_TERM = 3
+
+# Most books an ISBN prefix search returns
+ISBN_PREFIX_LIMIT = 50
+
+# ISBN prefixes at least this long narrow a query more than the trigram index would
+ISBN_NARROW_PREFIX = 9
+
+# Columns of the books table that may be selected by callers
+BOOK_FIELDS = ('id', 'title', 'author', 'isbn', 'total_copies', 'available_copies')
+_BOOK_COLUMNS = ', '.join(BOOK_FIELDS)
+_BOOK_COLUMNS_B = ', '.join(f'b.{field}' for field in BOOK_FIELDS)
+
+# Fields with a normalized search key column (title -> title_key)
+SEARCH_KEY_FIELDS = ('title', 'author')
+
+def search_key(text: str) -> str:
+    """
+    Normalized form of a title, author or search term: case-folded, accents stripped and
+    whitespace collapsed, so 'Les  Misérables' and 'les miserables' have the same key.
+    """
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.split())
+
+class SqlTraceSettings:
+    """Runtime switches for SQL tracing (see enable_sql_trace)."""
+
+    def __init__(self):
+        self.enabled = os.environ.get('LIBRARY_SQL_TRACE', '').lower() in ('1', 'true', 'yes')
+        self.slow_query_ms = float(os.environ.get('LIBRARY_SLOW_QUERY_MS', 100))
+        self.log_statements = False
+
+SQL_TRACE_SETTINGS = SqlTraceSettings()
+
+# Most recent traced statements, newest last
+SQL_TRACE = deque(maxlen=1000)
+
+class QueryCount:
+    """Statements executed while a count_queries() block is active."""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def record(self, sql: str, helper: str):
+        self.statements.append((helper, ' '.join(sql.split())))
+
+# Counters of the enclosing count_queries() blocks in the current thread or task
+_QUERY_COUNTERS: ContextVar[Tuple[QueryCount, ...]] = ContextVar('query_counters', default=())
+
+@contextmanager
+def count_queries() -> Iterator[QueryCount]:
+    """Count the SQL statements executed inside the with-block (blocks may be nested)."""
+    counter = QueryCount()
+    token = _QUERY_COUNTERS.set(_QUERY_COUNTERS.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _QUERY_COUNTERS.reset(token)
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor returned by InstrumentedConnection.execute(). SQLite steps through a query's rows
+    as they are fetched, so the time spent in fetchone/fetchmany/fetchall and iteration is
+    added to the statement's, which is recorded once its rows run out or the cursor is
+    closed or released.
+    """
+
+    # (sql, parameters, helper, caller) of the statement still being timed
+    _statement = None
+    _duration = 0.0
+
+    def _run(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            self._duration += time.perf_counter() - start
+
+    def fetchone(self):
+        if self._statement is None:
+            return sqlite3.Cursor.fetchone(self)
+        row = self._run(sqlite3.Cursor.fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        if self._statement is None:
+            return sqlite3.Cursor.fetchmany(self, size)
+        rows = self._run(sqlite3.Cursor.fetchmany, size)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        if self._statement is None:
+            return sqlite3.Cursor.fetchall(self)
+        rows = self._run(sqlite3.Cursor.fetchall)
+        self._finish()
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._statement is None:
+            return sqlite3.Cursor.__next__(self)
+        try:
+            return self._run(sqlite3.Cursor.__next__)
+        except StopIteration:
+            self._finish()
+            raise
+
+    def close(self):
+        self._finish()
+        sqlite3.Cursor.close(self)
+
+    def __del__(self):
+        self._finish()
+
+    def _finish(self):
+        statement, self._statement = self._statement, None
+        if statement is not None:
+            sql, parameters, helper, caller = statement
+            DB_QUERY_DURATION.observe(self._duration, helper=helper)
+            if caller is not None:
+                _trace_statement(self.connection, sql, parameters, helper, caller, self._duration)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    Connection that times every statement, labelled by the calling function, from its
+    execution until its rows have been fetched (see TimedCursor).
+    Counts and latencies always go to the metrics registry; when tracing is
+    enabled each statement is also recorded in SQL_TRACE and slow ones are logged.
+    """
+
+    # Whether statements count towards count_queries() blocks, and so query budgets
+    counted = True
+
+    def execute(self, sql, parameters=()):
+        return self._timed(sqlite3.Cursor.execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(sqlite3.Cursor.executemany, sql, seq_of_parameters, many=True)
+
+    def _timed(self, method, sql, parameters, many=False):
+        frame = sys._getframe(2)
+        helper = frame.f_code.co_name
+        DB_QUERIES.inc(helper=helper)
+        if self.counted:
+            for counter in _QUERY_COUNTERS.get():
+                counter.record(sql, helper)
+
+        caller = None
+        if SQL_TRACE_SETTINGS.enabled:
+            caller = frame.f_back
+            caller = f"{os.path.basename(caller.f_code.co_filename)}:{caller.f_lineno} {caller.f_code.co_name}" if caller else ''
+        cursor = self.cursor(TimedCursor)
+        cursor._statement = (sql, None if many else parameters, helper, caller)
+        try:
+            cursor._run(method, sql, parameters)
+        except BaseException:
+            # The traceback keeps the cursor alive; closing it releases its statement,
+            # or the connection could not be closed
+            cursor.close()
+            raise
+        if cursor.description is None:
+            # No rows to fetch
+            cursor._finish()
+        return cursor
+
+def explain_query_plan(conn: sqlite3.Connection, sql: str, parameters=()) -> List[str]:
+    """Get the EXPLAIN QUERY PLAN lines for a statement (empty for statements that have no plan)."""
+    if sql.lstrip().split(None, 1)[0].upper() not in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'):
+        return []
+    try:
+        rows = sqlite3.Connection.execute(conn, 'EXPLAIN QUERY PLAN ' + sql, parameters or ()).fetchall()
+    except sqlite3.Error:
+        return []
+
+    # Indent each step under its parent
+    depth = {0: 0}
+    plan = []
+    for row in rows:
+        node_id, parent = row[0], row[1]
+        depth[node_id] = depth.get(parent, 0) + 1
+        plan.append('  ' * (depth[node_id] - 1) + row[3])
+    return plan
+
+def _trace_statement(conn, sql, parameters, helper, caller, duration):
+    entry = {
+        'sql': ' '.join(sql.split()),
+        'duration_ms': round(duration * 1000, 3),
+        'helper': helper,
+        'caller': caller,
+    }
+    SQL_TRACE.append(entry)
+
+    if SQL_TRACE_SETTINGS.log_statements:
+        logger.debug("SQL %.3f ms in %s (from %s): %s", entry['duration_ms'], helper, entry['caller'], entry['sql'])
+
+    slow_ms = SQL_TRACE_SETTINGS.slow_query_ms
+    if slow_ms is not None and entry['duration_ms'] >= slow_ms:
+        entry['plan'] = explain_query_plan(conn, sql, parameters)
+        logger.warning(
+            "Slow query: %.1f ms in %s (called from %s)\n%s\nQuery plan:\n%s",
+            entry['duration_ms'], helper, entry['caller'], entry['sql'], '\n'.join(entry['plan']) or '(none)'
+        )
+
+def enable_sql_trace(slow_query_ms: Optional[float] = 100.0, log_statements: bool = False):
+    """
+    Start tracing SQL statements on every connection.
+    
+    Args:
+        slow_query_ms: Log statements at or above this duration with their query plan (None disables)
+        log_statements: Also log every statement at DEBUG level
+    """
+    SQL_TRACE_SETTINGS.slow_query_ms = slow_query_ms
+    SQL_TRACE_SETTINGS.log_statements = log_statements
+    SQL_TRACE_SETTINGS.enabled = True
+
+def disable_sql_trace():
+    """Stop tracing SQL statements."""
+    SQL_TRACE_SETTINGS.enabled = False
+
+def get_sql_trace(clear: bool = False) -> List[Dict]:
+    """Get the most recently traced statements, oldest first."""
+    entries = list(SQL_TRACE)
+    if clear:
+        SQL_TRACE.clear()
+    return entries
+
+class RequestConnection(InstrumentedConnection):
+    """
+    Connection shared by every helper during a single request.
+    Helpers call commit() and close() as usual; both are deferred until the
+    request is torn down, so the whole request runs in one transaction.
+    """
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+    def release(self, commit: bool = True):
+        """Commit (or roll back) the request's transaction and close the connection."""
+        try:
+            if commit:
+                sqlite3.Connection.commit(self)
+            else:
+                self.rollback()
+        finally:
+            sqlite3.Connection.close(self)
+
+class CacheConnection(InstrumentedConnection):
+    """
+    Long-lived connection of an in-process catalog cache. Its statements are timed, counted
+    in the metrics and traced like any other, but left out of count_queries() blocks: a
+    cache rebuild is work a request triggers, not work it does, so it is not held to the
+    request's query budget.
+    """
+
+    counted = False
+
+def get_database_path() -> str:
+    """The database file of the current app if it configures one, else the process default."""
+    if has_app_context():
+        return current_app.config.get('DATABASE') or DATABASE
+    return DATABASE
+
+def _connect(factory=InstrumentedConnection):
+    conn = sqlite3.connect(get_database_path(), factory=factory)
     conn.row_factory = sqlite3.Row  # This enables column access by name
     return conn
 
+# Connection shared by the helpers inside a catalog_snapshot() block outside a request
+_SNAPSHOT_CONNECTION: ContextVar[Optional[sqlite3.Connection]] = ContextVar('snapshot_connection', default=None)
+
+def get_db_connection():
+    """
+    Get a database connection.
+    Inside a request this is the request's shared connection, opened on first use;
+    inside a catalog_snapshot() block it is the block's connection;
+    otherwise (scripts, tests) a new connection is returned.
+    """
+    conn = _SNAPSHOT_CONNECTION.get()
+    if conn is not None:
+        return conn
+    if has_request_context():
+        conn = g.get('_db_connection')
+        if conn is None:
+            conn = g._db_connection = _connect(RequestConnection)
+        return conn
+    return _connect()
+
+def close_request_connection(exception: Optional[BaseException] = None):
+    """Commit and close the request's connection, rolling back if the request failed."""
+    conn = g.pop('_db_connection', None)
+    if conn is not None:
+        conn.release(commit=exception is None)
+
+@contextmanager
+def catalog_snapshot() -> Iterator[sqlite3.Connection]:
+    """
+    Run the helpers called in the with-block on one connection and in one transaction, so they
+    all see the database as it was at the block's first query. Inside a request this is the
+    request's connection, whose transaction then lasts until the request is torn down.
+    """
+    if has_request_context() or _SNAPSHOT_CONNECTION.get() is not None:
+        conn = get_db_connection()
+        if not conn.in_transaction:
+            conn.execute('BEGIN')
+        yield conn
+        return
+
+    conn = _connect(RequestConnection)
+    token = _SNAPSHOT_CONNECTION.set(conn)
+    succeeded = False
+    try:
+        conn.execute('BEGIN')
+        yield conn
+        succeeded = True
+    finally:
+        _SNAPSHOT_CONNECTION.reset(token)
+        conn.release(commit=succeeded)
+
+def register_request_connection(app):
+    """Release the request-scoped connection when each request's context is torn down."""
+    app.teardown_appcontext(close_request_connection)
+
+def get_schema_version() -> int:
+    """Get the schema version recorded in the database (0 if it was never initialized)."""
+    conn = get_db_connection()
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    conn.close()
+    return version
+
+def schema_is_current() -> bool:
+    """Check whether the database has already been initialized with the current schema."""
+    return get_schema_version() >= SCHEMA_VERSION
+
+_SEARCH_INSERT_TRIGGER = '''
+    CREATE TRIGGER IF NOT EXISTS books_search_insert AFTER INSERT ON books BEGIN
+        INSERT INTO books_search (rowid, title_key, author_key) VALUES (new.id, new.title_key, new.author_key);
+    END
+'''
+
+_BUMP_CATALOG_VERSION = "UPDATE catalog_meta SET value = value + 1 WHERE name = 'catalog_version'"
+
+_VERSION_INSERT_TRIGGER = f'''
+    CREATE TRIGGER IF NOT EXISTS books_version_insert AFTER INSERT ON books BEGIN
+        {_BUMP_CATALOG_VERSION};
+    END
+'''
+
+# Bump the change counter and stamp the changed book with it
+_RECORD_CHANGE = '''
+        UPDATE catalog_meta SET value = value + 1 WHERE name = 'change_counter';
+        UPDATE books SET change_id = (SELECT value FROM catalog_meta WHERE name = 'change_counter')
+        WHERE id = new.id;
+'''
+
+_CHANGES_INSERT_TRIGGER = f'''
+    CREATE TRIGGER IF NOT EXISTS books_changes_insert AFTER INSERT ON books BEGIN
+        {_RECORD_CHANGE}
+    END
+'''
+
 def init_database():
-    """Initialize the database with required tables."""
+    """Initialize the database with required tables, migrating older schema versions."""
     conn = get_db_connection()
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
     
     # Create books table
     conn.execute('''
@@ -28,7 +417,10 @@ def init_database():
             author TEXT NOT NULL,
             isbn TEXT UNIQUE NOT NULL,
             total_copies INTEGER NOT NULL,
-            available_copies INTEGER NOT NULL
+            available_copies INTEGER NOT NULL,
+            title_key TEXT NOT NULL DEFAULT '',
+            author_key TEXT NOT NULL DEFAULT '',
+            change_id INTEGER NOT NULL DEFAULT 0
         )
     ''')
     
@@ -45,9 +437,93 @@ def init_database():
         )
     ''')
     
+    if version < 4:
+        _add_search_keys(conn)
+    
+    # Version 2: trigram index for substring search, kept in step with the books table by
+    # triggers (availability updates don't touch it); since version 4 it indexes the search keys
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_search USING fts5(
+            title_key, author_key, content='books', content_rowid='id', tokenize='trigram'
+        )
+    ''')
+    conn.execute(_SEARCH_INSERT_TRIGGER)
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_search_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_search (books_search, rowid, title_key, author_key)
+            VALUES ('delete', old.id, old.title_key, old.author_key);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_search_update AFTER UPDATE OF title_key, author_key ON books BEGIN
+            INSERT INTO books_search (books_search, rowid, title_key, author_key)
+            VALUES ('delete', old.id, old.title_key, old.author_key);
+            INSERT INTO books_search (rowid, title_key, author_key) VALUES (new.id, new.title_key, new.author_key);
+        END
+    ''')
+    if version < 4:
+        # Index the books that existed before the upgrade
+        conn.execute("INSERT INTO books_search (books_search) VALUES ('rebuild')")
+    
+    # Version 3: a counter bumped whenever a book is added, removed or renamed, so
+    # in-memory caches of the catalog (e.g. suggestions) can tell they are stale
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO catalog_meta (name, value) VALUES ('catalog_version', 0)")
+    conn.execute(_VERSION_INSERT_TRIGGER)
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS books_version_delete AFTER DELETE ON books BEGIN
+            {_BUMP_CATALOG_VERSION};
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS books_version_update AFTER UPDATE OF title, author ON books BEGIN
+            {_BUMP_CATALOG_VERSION};
+        END
+    ''')
+    
+    # Version 4: search keys are sorted and searched instead of the raw title and author
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_books_title_key ON books (title_key)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_books_author_key ON books (author_key)')
+    
+    # Version 5: every insert or update of a book bumps a second counter and stamps the book
+    # with it, so a snapshot of the books can fetch just the rows changed since it was taken
+    if 'change_id' not in {row[1] for row in conn.execute('PRAGMA table_info(books)')}:
+        conn.execute('ALTER TABLE books ADD COLUMN change_id INTEGER NOT NULL DEFAULT 0')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_books_change_id ON books (change_id)')
+    conn.execute("INSERT OR IGNORE INTO catalog_meta (name, value) VALUES ('change_counter', 0)")
+    conn.execute(_CHANGES_INSERT_TRIGGER)
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS books_changes_update
+        AFTER UPDATE OF title, author, isbn, total_copies, available_copies ON books BEGIN
+            {_RECORD_CHANGE}
+        END
+    ''')
+    
+    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
     conn.commit()
     conn.close()
 
+def _add_search_keys(conn: sqlite3.Connection):
+    """Version 4 migration: add title_key and author_key, fill them in, and drop the old search index."""
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(books)')}
+    for field in SEARCH_KEY_FIELDS:
+        if f'{field}_key' not in columns:
+            conn.execute(f"ALTER TABLE books ADD COLUMN {field}_key TEXT NOT NULL DEFAULT ''")
+    
+    # The version 2 index covered title and author; it is recreated over the keys
+    for trigger in ('books_search_insert', 'books_search_delete', 'books_search_update'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    conn.execute('DROP TABLE IF EXISTS books_search')
+    
+    books = conn.execute('SELECT id, title, author FROM books').fetchall()
+    conn.executemany('UPDATE books SET title_key = ?, author_key = ? WHERE id = ?',
+                     [(search_key(title), search_key(author), book_id) for book_id, title, author in books])
+
 def add_sample_data():
     """Add sample data to the database if it's empty."""
     conn = get_db_connection()
@@ -63,9 +539,9 @@ def add_sample_data():
         
         for title, author, isbn, copies in sample_books:
             conn.execute('''
-                INSERT INTO books (title, author, isbn, total_copies, available_copies)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (title, author, isbn, copies, copies))
+                INSERT INTO books (title, author, isbn, total_copies, available_copies, title_key, author_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (title, author, isbn, copies, copies, search_key(title), search_key(author)))
         
         # Make 1984 unavailable by adding a borrow record
         conn.execute('''
@@ -82,26 +558,342 @@ def add_sample_data():
     
     conn.close()
 
+@contextmanager
+def bulk_insert_books(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """
+    Insert many books on `conn` without indexing them one row at a time (the inserts must
+    set title_key and author_key with search_key()):
+    the search index and the secondary indexes on books are rebuilt and the catalog version
+    bumped once when the block ends (several times faster for bulk loads). The books are not
+    stamped with a change_id; the catalog version bump already makes every snapshot reload.
+
+    Everything runs in one transaction on `conn`, begun here unless one is open, which the
+    caller commits. If the block raises, the transaction is rolled back, restoring the
+    dropped indexes and triggers along with discarding the partial load.
+    """
+    if not conn.in_transaction:
+        # DDL does not open a transaction implicitly, so the drops would otherwise commit at once
+        conn.execute('BEGIN')
+    # The ISBN uniqueness index (created with the table, so it has no SQL) stays to enforce the constraint
+    indexes = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'books' AND sql IS NOT NULL"
+    ).fetchall()
+    for name, _ in indexes:
+        conn.execute(f'DROP INDEX {name}')
+    conn.execute('DROP TRIGGER IF EXISTS books_search_insert')
+    conn.execute('DROP TRIGGER IF EXISTS books_version_insert')
+    conn.execute('DROP TRIGGER IF EXISTS books_changes_insert')
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.execute(_SEARCH_INSERT_TRIGGER)
+    conn.execute(_VERSION_INSERT_TRIGGER)
+    conn.execute(_CHANGES_INSERT_TRIGGER)
+    for _, sql in indexes:
+        conn.execute(sql)
+    conn.execute("INSERT INTO books_search (books_search) VALUES ('rebuild')")
+    conn.execute(_BUMP_CATALOG_VERSION)
+
 # Helper Functions for Database Operations
 
 def get_all_books() -> List[Dict]:
     """Get all books from the database."""
     conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
+    books = conn.execute(f'SELECT {_BOOK_COLUMNS} FROM books ORDER BY title_key').fetchall()
+    conn.close()
+    return [dict(book) for book in books]
+
+def _fts_phrase(text: str) -> Optional[str]:
+    """
+    `text` quoted as an FTS5 phrase, which matches its trigrams in sequence, i.e. as a substring;
+    None if FTS5 can't read it quoted (a NUL character ends the string early), so callers scan instead.
+    """
+    if '\0' in text:
+        return None
+    return '"' + text.replace('"', '""') + '"'
+
+def _key_query(field: str, key: str, columns: str = _BOOK_COLUMNS_B) -> Tuple[str, List]:
+    """The SELECT (without ORDER BY) and parameters for search_books_by_key()."""
+    if field not in SEARCH_KEY_FIELDS:
+        raise ValueError(f"Unknown search field: {field}")
+    column = f'b.{field}_key'
+    phrase = _fts_phrase(key)
+    if len(key) < MIN_TRIGRAM_TERM or phrase is None:
+        return f'SELECT {columns} FROM books b WHERE instr({column}, ?) > 0', [key]
+    return (f'SELECT {columns} FROM books_search s JOIN books b ON b.id = s.rowid '
+            f'WHERE books_search MATCH ? AND instr({column}, ?) > 0'), [f'{field}_key : {phrase}', key]
+
+def search_books_by_key(field: str, key: str) -> List[Dict]:
+    """
+    Get the books whose title_key or author_key contains `key` (a search_key()), exact matches
+    first, then by title. Keys of MIN_TRIGRAM_TERM characters or more are looked up in the
+    trigram index; shorter ones are checked against every book.
+    """
+    query, parameters = _key_query(field, key)
+    conn = get_db_connection()
+    books = conn.execute(f'{query} ORDER BY b.{field}_key = ? DESC, b.title_key, b.id',
+                         parameters + [key]).fetchall()
+    conn.close()
+    return [dict(book) for book in books]
+
+def get_token_search_candidates(field: str, token_groups: List[List[str]]) -> List[Dict]:
+    """
+    Get the books whose title_key or author_key contains, for every group, at least one of its
+    tokens as a substring, using the trigram index. Groups with a token shorter than
+    MIN_TRIGRAM_TERM characters can't be looked up and are left out. The rows include
+    title_key and author_key so callers can re-check and sort the candidates by their own rule.
+    """
+    if field not in SEARCH_KEY_FIELDS:
+        raise ValueError(f"Unknown search field: {field}")
+    clauses = []
+    for tokens in token_groups:
+        phrases = [_fts_phrase(token) for token in tokens if len(token) >= MIN_TRIGRAM_TERM]
+        if len(phrases) == len(tokens) and None not in phrases:
+            clauses.append(f"{field}_key : ({' OR '.join(phrases)})")
+    conn = get_db_connection()
+    if clauses:
+        books = conn.execute(f'''
+            SELECT {_BOOK_COLUMNS_B}, b.title_key, b.author_key FROM books_search s JOIN books b ON b.id = s.rowid
+            WHERE books_search MATCH ?
+        ''', (' AND '.join(clauses),)).fetchall()
+    else:
+        books = conn.execute(f'SELECT {_BOOK_COLUMNS}, title_key, author_key FROM books').fetchall()
+    conn.close()
+    return [dict(book) for book in books]
+
+def get_books_by_isbn_prefix(prefix: str, limit: int = ISBN_PREFIX_LIMIT) -> List[Dict]:
+    """
+    Get up to `limit` books whose ISBN starts with `prefix`, in ISBN order.
+    The prefix becomes a range on the unique ISBN index, so only matching rows are read.
+    """
+    if not prefix:
+        return []
+    # Every string starting with the prefix sorts before the prefix with its last character incremented
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    conn = get_db_connection()
+    books = conn.execute(f'''
+        SELECT {_BOOK_COLUMNS} FROM books WHERE isbn >= ? AND isbn < ? ORDER BY isbn LIMIT ?
+    ''', (prefix, upper, limit)).fetchall()
+    conn.close()
+    return [dict(book) for book in books]
+
+def _matching_query(conditions: List[Tuple[str, str]], available: Optional[bool],
+                   columns: str = _BOOK_COLUMNS_B) -> Tuple[str, List]:
+    """The SELECT (without ORDER BY) and parameters for search_books_matching()."""
+    where, parameters, phrases = [], [], []
+    narrowed_by_isbn = False
+    for kind, value in conditions:
+        if kind in ('title', 'author', 'any'):
+            key_columns = ('title_key', 'author_key') if kind == 'any' else (f'{kind}_key',)
+            where.append('(' + ' OR '.join(f'instr(b.{column}, ?) > 0' for column in key_columns) + ')')
+            parameters.extend([value] * len(key_columns))
+            phrase = _fts_phrase(value)
+            if len(value) >= MIN_TRIGRAM_TERM and phrase is not None:
+                target = '{title_key author_key}' if kind == 'any' else f'{kind}_key'
+                phrases.append(f'{target} : {phrase}')
+        elif kind == 'isbn':
+            where.append('b.isbn = ?')
+            parameters.append(value)
+            narrowed_by_isbn = True
+        elif kind == 'isbn_prefix':
+            where.append('b.isbn >= ? AND b.isbn < ?')
+            parameters.extend([value, value[:-1] + chr(ord(value[-1]) + 1)])
+            narrowed_by_isbn = narrowed_by_isbn or len(value) >= ISBN_NARROW_PREFIX
+        else:
+            raise ValueError(f"Unknown condition: {kind}")
+    if available is True:
+        where.append('b.available_copies > 0')
+    elif available is False:
+        where.append('b.available_copies <= 0')
+
+    source = 'books b'
+    if phrases and not narrowed_by_isbn:
+        source = 'books_search s JOIN books b ON b.id = s.rowid'
+        where.insert(0, 'books_search MATCH ?')
+        parameters.insert(0, ' AND '.join(phrases))
+    query = f'SELECT {columns} FROM {source}'
+    if where:
+        query += ' WHERE ' + ' AND '.join(where)
+    return query, parameters
+
+def search_books_matching(conditions: List[Tuple[str, str]], available: Optional[bool] = None) -> List[Dict]:
+    """
+    Get the books meeting every condition (and the availability filter), ordered by title,
+    with one query.
+    
+    Conditions are (kind, value): 'title', 'author' or 'any' (title or author) with a
+    search_key() to find as a substring, 'isbn' with a whole ISBN, or 'isbn_prefix'.
+    Substrings of MIN_TRIGRAM_TERM characters or more are looked up in the trigram index,
+    unless an ISBN condition narrows the books down more cheaply through the ISBN index.
+    """
+    query, parameters = _matching_query(conditions, available)
+    conn = get_db_connection()
+    books = conn.execute(query + ' ORDER BY b.title_key, b.id', parameters).fetchall()
+    conn.close()
+    return [dict(book) for book in books]
+
+def _split_parts(rows: List[sqlite3.Row], count: int) -> List[List[Dict]]:
+    """Group the rows of a UNION ALL of `count` parts selecting the book columns, then the part number."""
+    results = [[] for _ in range(count)]
+    part = len(BOOK_FIELDS)
+    for row in rows:
+        results[row[part]].append(dict(zip(BOOK_FIELDS, row)))
+    return results
+
+def search_books_matching_many(queries: List[Tuple[List[Tuple[str, str]], Optional[bool]]]) -> List[List[Dict]]:
+    """
+    search_books_matching() for each (conditions, available) pair, all in one UNION ALL statement.
+    """
+    if not queries:
+        return []
+    parts, parameters = [], []
+    for part, (conditions, available) in enumerate(queries):
+        query, query_parameters = _matching_query(
+            conditions, available, f'{_BOOK_COLUMNS_B}, {part} AS part, b.title_key AS sort_key')
+        parts.append(query)
+        parameters.extend(query_parameters)
+    conn = get_db_connection()
+    rows = conn.execute(' UNION ALL '.join(parts) + ' ORDER BY part, sort_key, id', parameters).fetchall()
+    conn.close()
+    return _split_parts(rows, len(queries))
+
+def search_books_by_keys(searches: List[Tuple[str, str]]) -> List[List[Dict]]:
+    """search_books_by_key() for each (field, key) pair, all in one UNION ALL statement."""
+    if not searches:
+        return []
+    parts, parameters = [], []
+    for part, (field, key) in enumerate(searches):
+        query, query_parameters = _key_query(
+            field, key, f'{_BOOK_COLUMNS_B}, {part} AS part, b.{field}_key = ? AS exact, b.title_key AS sort_key')
+        parts.append(query)
+        parameters.extend([key] + query_parameters)
+    conn = get_db_connection()
+    rows = conn.execute(' UNION ALL '.join(parts) + ' ORDER BY part, exact DESC, sort_key, id',
+                        parameters).fetchall()
+    conn.close()
+    return _split_parts(rows, len(searches))
+
+def get_books_by_isbn_prefixes(prefixes: List[str], limit: int = ISBN_PREFIX_LIMIT) -> List[List[Dict]]:
+    """get_books_by_isbn_prefix() for each prefix, as one statement of index range scans."""
+    if not prefixes:
+        return []
+    parts, parameters = [], []
+    for part, prefix in enumerate(prefixes):
+        parts.append(f'''SELECT * FROM (
+            SELECT {_BOOK_COLUMNS}, {part} AS part FROM books WHERE isbn >= ? AND isbn < ? ORDER BY isbn LIMIT ?
+        )''')
+        parameters.extend([prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1), limit])
+    conn = get_db_connection()
+    rows = conn.execute(' UNION ALL '.join(parts) + ' ORDER BY part, isbn', parameters).fetchall()
+    conn.close()
+    return _split_parts(rows, len(prefixes))
+
+def get_catalog_version(conn: Optional[sqlite3.Connection] = None) -> int:
+    """
+    Get the counter that changes whenever a book is added, removed or renamed.
+    Caches that poll it often can pass their own long-lived connection to skip opening one.
+    """
+    if conn is not None:
+        row = conn.execute("SELECT value FROM catalog_meta WHERE name = 'catalog_version'").fetchone()
+        return row[0] if row else 0
+    conn = get_db_connection()
+    try:
+        return get_catalog_version(conn)
+    finally:
+        conn.close()
+
+def get_change_counter(conn: sqlite3.Connection) -> int:
+    """Get the counter that changes whenever a book is added or updated (read on the caller's connection)."""
+    row = conn.execute("SELECT value FROM catalog_meta WHERE name = 'change_counter'").fetchone()
+    return row[0] if row else 0
+
+# Columns read by in-memory snapshots of the books table, in this order
+SNAPSHOT_COLUMNS = BOOK_FIELDS + ('title_key', 'author_key')
+
+def get_snapshot_rows(conn: sqlite3.Connection, changed_since: Optional[int] = None) -> List[tuple]:
+    """
+    Get the SNAPSHOT_COLUMNS of every book ordered by ID, or with `changed_since` only of the
+    books stamped with a later change_id (in change order, through its index), as tuples read
+    on the caller's connection.
+    """
+    query = f'SELECT {", ".join(SNAPSHOT_COLUMNS)} FROM books'
+    if changed_since is None:
+        return conn.execute(query + ' ORDER BY id').fetchall()
+    return conn.execute(query + ' WHERE change_id > ? ORDER BY change_id', (changed_since,)).fetchall()
+
+def get_book_borrow_counts() -> Dict[int, int]:
+    """Get how many times each book has ever been borrowed, by book ID (books never borrowed are left out)."""
+    conn = get_db_connection()
+    rows = conn.execute('SELECT book_id, COUNT(*) FROM borrow_records GROUP BY book_id').fetchall()
+    conn.close()
+    return {book_id: count for book_id, count in rows}
+
+def iter_books(batch_size: int = 500) -> Iterator[Dict]:
+    """Yield every book ordered by ID, fetching rows from an open cursor in batches."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(f'SELECT {_BOOK_COLUMNS} FROM books ORDER BY id')
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    finally:
+        conn.close()
+
+def iter_search_keys(batch_size: int = 500, conn: Optional[sqlite3.Connection] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Yield the (title_key, author_key) of every book, fetching rows from an open cursor in batches.
+    Caches can pass their own long-lived connection, which is left open.
+    """
+    if conn is None:
+        conn = get_db_connection()
+        try:
+            yield from iter_search_keys(batch_size, conn)
+        finally:
+            conn.close()
+        return
+    cursor = conn.execute('SELECT title_key, author_key FROM books')
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for row in rows:
+            yield row[0], row[1]
+
+def get_books_page(fields: List[str], after_id: int = 0, limit: int = 50,
+                   available: Optional[bool] = None) -> List[Dict]:
+    """Get up to `limit` books with an ID greater than `after_id`, selecting only `fields`."""
+    columns = [field for field in BOOK_FIELDS if field in fields]
+    if not columns:
+        raise ValueError("At least one valid field is required.")
+
+    query = f'SELECT {", ".join(columns)} FROM books WHERE id > ?'
+    if available is True:
+        query += ' AND available_copies > 0'
+    elif available is False:
+        query += ' AND available_copies <= 0'
+    query += ' ORDER BY id LIMIT ?'
+
+    conn = get_db_connection()
+    books = conn.execute(query, (after_id, limit)).fetchall()
     conn.close()
     return [dict(book) for book in books]
 
 def get_book_by_id(book_id: int) -> Optional[Dict]:
     """Get a specific book by ID."""
     conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    book = conn.execute(f'SELECT {_BOOK_COLUMNS} FROM books WHERE id = ?', (book_id,)).fetchone()
     conn.close()
     return dict(book) if book else None
 
 def get_book_by_isbn(isbn: str) -> Optional[Dict]:
     """Get a specific book by ISBN."""
     conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
+    book = conn.execute(f'SELECT {_BOOK_COLUMNS} FROM books WHERE isbn = ?', (isbn,)).fetchone()
     conn.close()
     return dict(book) if book else None
 
@@ -145,74 +937,111 @@ def insert_book(title: str, author: str, isbn: str, total_copies: int, available
     conn = get_db_connection()
     try:
         conn.execute('''
-            INSERT INTO books (title, author, isbn, total_copies, available_copies)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (title, author, isbn, total_copies, available_copies))
+            INSERT INTO books (title, author, isbn, total_copies, available_copies, title_key, author_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (title, author, isbn, total_copies, available_copies, search_key(title), search_key(author)))
         conn.commit()
         conn.close()
         return True
-    except Exception as e:
+    except Exception:
+        logger.exception("insert_book failed")
         conn.close()
         return False
 
-def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
-    """Insert a new borrow record into the database."""
+def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime,
+                         max_active: Optional[int] = None) -> bool:
+    """
+    Insert a new borrow record into the database.
+    With max_active, the record is only inserted while the patron has fewer active loans;
+    the count is checked by the INSERT itself, so concurrent borrows cannot exceed it.
+    """
     conn = get_db_connection()
     try:
-        conn.execute('''
+        cursor = conn.execute('''
             INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-            VALUES (?, ?, ?, ?)
-        ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
+            SELECT ?, ?, ?, ?
+            WHERE ? IS NULL
+               OR (SELECT COUNT(*) FROM borrow_records WHERE patron_id = ? AND return_date IS NULL) < ?
+        ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat(), max_active, patron_id, max_active))
         conn.commit()
         conn.close()
-        return True
-    except Exception as e:
+        return cursor.rowcount == 1
+    except Exception:
+        logger.exception("insert_borrow_record failed")
         conn.close()
         return False
 
 def update_book_availability(book_id: int, change: int) -> bool:
-    """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
+    """
+    Update the available copies of a book by a given amount (+1 for return, -1 for borrow).
+    The change is only applied if the result stays between 0 and total_copies, checked in the
+    same statement so concurrent borrows and returns cannot over- or under-count.
+    """
     conn = get_db_connection()
     try:
-        conn.execute('''
-            UPDATE books SET available_copies = available_copies + ? WHERE id = ?
-        ''', (change, book_id))
+        cursor = conn.execute('''
+            UPDATE books SET available_copies = available_copies + ?
+            WHERE id = ? AND available_copies + ? BETWEEN 0 AND total_copies
+        ''', (change, book_id, change))
         conn.commit()
         conn.close()
-        return True
-    except Exception as e:
+        return cursor.rowcount == 1
+    except Exception:
+        logger.exception("update_book_availability failed")
         conn.close()
         return False
 
 def update_borrow_record_return_date(patron_id: str, book_id: int, due_date: datetime, return_date: datetime) -> bool:
-    """Update the return date for a borrow record."""
+    """
+    Update the return date for a borrow record.
+    Returns False if no matching loan is still open, e.g. because a concurrent return closed it first.
+    """
     conn = get_db_connection()
     try:
-        # First get the record with the earliest due date that hasn't been returned
-        record = conn.execute('''
-            SELECT id FROM borrow_records 
-            WHERE patron_id = ? 
-            AND book_id = ? 
-            AND due_date = ?
-            AND return_date IS NULL
-            ORDER BY due_date ASC
-            LIMIT 1
-        ''', (patron_id, book_id, due_date.isoformat())).fetchone() #GETTING SPECIFIC DUE DATE OF BOOK ID
-        
-        if not record:
-            conn.close()
-            return False
-            
-        # Update only this specific record
-        conn.execute('''
-            UPDATE borrow_records 
-            SET return_date = ? 
-            WHERE id = ?
-        ''', (return_date.isoformat(), record['id']))
-        
+        # Close the earliest matching open loan in one statement, so two returns can't both close it
+        cursor = conn.execute('''
+            UPDATE borrow_records
+            SET return_date = ?
+            WHERE return_date IS NULL AND id = (
+                SELECT id FROM borrow_records
+                WHERE patron_id = ?
+                AND book_id = ?
+                AND due_date = ?
+                AND return_date IS NULL
+                ORDER BY due_date ASC
+                LIMIT 1
+            )
+        ''', (return_date.isoformat(), patron_id, book_id, due_date.isoformat()))
+
         conn.commit()
         conn.close()
-        return True
-    except Exception as e:
+        return cursor.rowcount == 1
+    except Exception:
+        logger.exception("update_borrow_record_return_date failed")
+        conn.close()
+        return False
+
+def reopen_borrow_record(patron_id: str, book_id: int, due_date: datetime, return_date: datetime) -> bool:
+    """Undo update_borrow_record_return_date(): clear the return date it set on the loan."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('''
+            UPDATE borrow_records
+            SET return_date = NULL
+            WHERE id = (
+                SELECT id FROM borrow_records
+                WHERE patron_id = ?
+                AND book_id = ?
+                AND due_date = ?
+                AND return_date = ?
+                LIMIT 1
+            )
+        ''', (patron_id, book_id, due_date.isoformat(), return_date.isoformat()))
+
+        conn.commit()
+        conn.close()
+        return cursor.rowcount == 1
+    except Exception:
+        logger.exception("reopen_borrow_record failed")
         conn.close()
         return False
@@ -0,0 +1,79 @@
+"""
+JSON provider for the Library Management System
+Serializes API responses with orjson when it is installed, falling back to the standard library
+"""
+
+import dataclasses
+import decimal
+import uuid
+from datetime import date, datetime
+from typing import Any
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """Convert values the encoders do not handle natively into JSON types."""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that uses orjson when available.
+
+    Dates and datetimes are written as ISO 8601 strings by both encoders,
+    so output does not depend on whether orjson is installed.
+    """
+
+    default = staticmethod(_default)
+    ensure_ascii = False
+
+    def __init__(self, app, use_orjson: bool = True):
+        super().__init__(app)
+        self.use_orjson = use_orjson and orjson is not None
+
+    def _orjson_options(self, indent: bool = False) -> int:
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps_bytes(self, obj: Any, indent: bool = False) -> bytes:
+        """Serialize data as UTF-8 encoded JSON."""
+        if self.use_orjson:
+            return orjson.dumps(obj, default=self.default, option=self._orjson_options(indent))
+        return self.dumps(obj, **({'indent': 2} if indent else {'separators': (',', ':')})).encode('utf-8')
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if self.use_orjson and not kwargs:
+            return orjson.dumps(obj, default=self.default, option=self._orjson_options()).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        if self.use_orjson and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dumps_bytes(obj, indent) + b'\n', mimetype=self.mimetype)
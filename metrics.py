@@ -0,0 +1,280 @@
+"""
+Metrics for the Library Management System
+A small in-process registry of counters and histograms, exposed in the Prometheus text format at /metrics
+
+With several worker processes, set METRICS_DIR (or LIBRARY_METRICS_DIR) to a directory shared by
+the workers: each process writes its samples there and /metrics reports the sum over all processes.
+"""
+
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from flask import Response, g, request
+
+# Latency buckets in seconds, from sub-millisecond SQL statements to slow gateway calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Seconds between snapshot writes when running with several processes
+FLUSH_INTERVAL = 1.0
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            values = {json.dumps(key): self._copy(value) for key, value in self._values.items()}
+        return {'kind': self.kind, 'help': self.documentation, 'labelnames': list(self.labelnames), 'values': values}
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels."""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (e.g. latencies) in fixed buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket counts (last slot is +Inf), sum, count
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def snapshot(self) -> Dict:
+        data = super().snapshot()
+        data['buckets'] = list(self.buckets)
+        return data
+
+    @staticmethod
+    def _copy(value):
+        return [list(value[0]), value[1], value[2]]
+
+    def time(self, **labels):
+        """Decorator that observes the wall time of each call."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+            return wrapper
+        return decorator
+
+
+class Registry:
+    """Collection of metrics that can be rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.multiprocess_dir = None
+        self._last_flush = 0.0
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> Dict:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def reset(self):
+        for metric in self._metrics.values():
+            metric.reset()
+
+    def flush(self, force: bool = False):
+        """Write this process's samples to the shared directory (at most once per FLUSH_INTERVAL)."""
+        if not self.multiprocess_dir:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+        path = os.path.join(self.multiprocess_dir, f'metrics-{os.getpid()}.json')
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def collect(self) -> Dict:
+        """Samples of this process, or of every process when a shared directory is configured."""
+        if not self.multiprocess_dir:
+            return self.snapshot()
+
+        self.flush(force=True)
+        merged = {}
+        for filename in sorted(os.listdir(self.multiprocess_dir)):
+            if not (filename.startswith('metrics-') and filename.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(self.multiprocess_dir, filename)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            _merge(merged, snapshot)
+        return merged
+
+    def render(self) -> str:
+        return render_text(self.collect())
+
+
+def _merge(into: Dict, snapshot: Dict):
+    for name, metric in snapshot.items():
+        target = into.setdefault(name, {**metric, 'values': {}})
+        for key, value in metric['values'].items():
+            current = target['values'].get(key)
+            if current is None:
+                target['values'][key] = value
+            elif metric['kind'] == 'counter':
+                target['values'][key] = current + value
+            else:
+                target['values'][key] = [
+                    [a + b for a, b in zip(current[0], value[0])], current[1] + value[1], current[2] + value[2]
+                ]
+
+
+def _format_labels(labelnames, values, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_bound(bound: float) -> str:
+    return repr(float(bound))
+
+
+def render_text(snapshot: Dict) -> str:
+    """Render a registry snapshot in the Prometheus text exposition format."""
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        labelnames = metric['labelnames']
+        for key in sorted(metric['values']):
+            labels = json.loads(key)
+            value = metric['values'][key]
+            if metric['kind'] == 'counter':
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {value}")
+                continue
+            bucket_counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(metric['buckets'] + ['+Inf'], bucket_counts):
+                cumulative += bucket_count
+                le = bound if bound == '+Inf' else _format_bound(bound)
+                lines.append(f"{name}_bucket{_format_labels(labelnames, labels, ('le', le))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labelnames, labels)} {count}")
+    return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    'library_http_requests_total', 'HTTP requests handled.', ('blueprint', 'endpoint', 'method', 'status'))
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    'library_http_request_duration_seconds', 'HTTP request latency.', ('blueprint', 'endpoint'))
+DB_QUERIES = REGISTRY.counter(
+    'library_db_queries_total', 'SQL statements executed, by database helper.', ('helper',))
+DB_QUERY_DURATION = REGISTRY.histogram(
+    'library_db_query_duration_seconds', 'SQL statement latency including row fetching, by database helper.',
+    ('helper',))
+PAYMENT_GATEWAY_DURATION = REGISTRY.histogram(
+    'library_payment_gateway_duration_seconds', 'Payment gateway call latency.', ('operation',))
+
+
+def init_metrics(app, registry: Registry = REGISTRY):
+    """
+    Record request metrics for the Flask app and expose them at /metrics.
+
+    Config:
+        METRICS_DIR: Directory shared by worker processes (defaults to LIBRARY_METRICS_DIR)
+    """
+    metrics_dir = app.config.get('METRICS_DIR') or os.environ.get('LIBRARY_METRICS_DIR')
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+        registry.multiprocess_dir = metrics_dir
+
+    @app.before_request
+    def start_request_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            blueprint = request.blueprint or ''
+            endpoint = request.endpoint or 'unmatched'
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, blueprint=blueprint, endpoint=endpoint)
+            HTTP_REQUESTS.inc(blueprint=blueprint, endpoint=endpoint, method=request.method,
+                              status=response.status_code)
+            registry.flush()
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Expose all metrics in the Prometheus text format."""
+        return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
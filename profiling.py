@@ -0,0 +1,191 @@
+"""
+On-demand request profiler for the Library Management System
+Samples the stack of selected requests and writes collapsed stacks and speedscope JSON files
+
+A request is profiled when profiling is enabled and either carries the admin header
+(X-Profile: <PROFILE_ADMIN_TOKEN>) or is picked by PROFILE_SAMPLE_RATE. Profiles are listed
+at /admin/profiles and downloaded from /admin/profiles/<name>, both of which require the
+same token. When PROFILE_ENABLED is false no hooks are registered at all.
+"""
+
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from flask import abort, current_app, g, jsonify, request, send_from_directory
+
+PROFILE_HEADER = 'X-Profile'
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval from a background thread."""
+
+    def __init__(self, thread_id: int, interval: float = 0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='library-profiler', daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _run(self):
+        own_file = __file__
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename != own_file:
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+                self.sample_count += 1
+
+    def collapsed(self) -> str:
+        """Samples in the collapsed stack format used by flamegraph.pl and speedscope."""
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in self.samples.most_common())
+
+    def speedscope(self, name: str) -> Dict:
+        """Samples as a speedscope 'sampled' profile."""
+        frames, frame_index, samples, weights = [], {}, [], []
+        for stack, count in self.samples.items():
+            indexes = []
+            for frame_name in stack:
+                if frame_name not in frame_index:
+                    frame_index[frame_name] = len(frames)
+                    frames.append({'name': frame_name})
+                indexes.append(frame_index[frame_name])
+            samples.append(indexes)
+            weights.append(count * self.interval)
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': sum(weights),
+                'samples': samples,
+                'weights': weights,
+            }],
+            'name': name,
+            'exporter': 'library-profiler',
+        }
+
+
+def _authorized() -> bool:
+    token = current_app.config.get('PROFILE_ADMIN_TOKEN')
+    supplied = request.headers.get(PROFILE_HEADER, '')
+    return bool(token) and hmac.compare_digest(supplied, token)
+
+
+def list_profiles(directory: str, limit: int = 50) -> List[Dict]:
+    """Most recent profiles in `directory`, newest first."""
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for filename in os.listdir(directory):
+        if filename.endswith('.speedscope.json'):
+            path = os.path.join(directory, filename)
+            name = filename[:-len('.speedscope.json')]
+            profiles.append({
+                'name': name,
+                'created': os.path.getmtime(path),
+                'speedscope': filename,
+                'collapsed': f'{name}.collapsed.txt',
+            })
+    profiles.sort(key=lambda profile: profile['created'], reverse=True)
+    return profiles[:limit]
+
+
+def _write_profile(sampler: StackSampler, directory: str, endpoint: Optional[str]) -> str:
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{threading.get_ident() % 100000}-{endpoint or 'unmatched'}"
+    title = f"{request.method} {request.path} ({sampler.duration * 1000:.1f} ms, {sampler.sample_count} samples)"
+    with open(os.path.join(directory, f'{name}.collapsed.txt'), 'w') as f:
+        f.write(sampler.collapsed())
+    with open(os.path.join(directory, f'{name}.speedscope.json'), 'w') as f:
+        json.dump(sampler.speedscope(title), f)
+    return name
+
+
+def init_profiling(app):
+    """
+    Register the profiler on the Flask app if PROFILE_ENABLED is set.
+
+    Config:
+        PROFILE_ENABLED: Turn profiling on (defaults to LIBRARY_PROFILE)
+        PROFILE_ADMIN_TOKEN: Value of the X-Profile header that forces a profile and opens the admin endpoints
+        PROFILE_SAMPLE_RATE: Fraction of other requests to profile (default 0)
+        PROFILE_INTERVAL: Seconds between stack samples (default 0.001)
+        PROFILE_DIR: Directory the profiles are written to (default 'profiles')
+    """
+    app.config.setdefault('PROFILE_ENABLED', os.environ.get('LIBRARY_PROFILE', '').lower() in ('1', 'true', 'yes'))
+    app.config.setdefault('PROFILE_ADMIN_TOKEN', os.environ.get('LIBRARY_PROFILE_TOKEN'))
+    app.config.setdefault('PROFILE_SAMPLE_RATE', float(os.environ.get('LIBRARY_PROFILE_SAMPLE_RATE', 0)))
+    app.config.setdefault('PROFILE_INTERVAL', 0.001)
+    app.config.setdefault('PROFILE_DIR', os.environ.get('LIBRARY_PROFILE_DIR', 'profiles'))
+
+    if not app.config['PROFILE_ENABLED']:
+        return
+
+    @app.before_request
+    def start_profile():
+        if request.endpoint in ('admin_profiles', 'admin_profile_file'):
+            return
+        sample_rate = current_app.config['PROFILE_SAMPLE_RATE']
+        if _authorized() or (sample_rate > 0 and random.random() < sample_rate):
+            sampler = StackSampler(threading.get_ident(), current_app.config['PROFILE_INTERVAL'])
+            sampler.start()
+            g._profile_sampler = sampler
+
+    @app.after_request
+    def finish_profile(response):
+        sampler = g.pop('_profile_sampler', None)
+        if sampler is not None:
+            sampler.stop()
+            name = _write_profile(sampler, current_app.config['PROFILE_DIR'], request.endpoint)
+            response.headers['X-Profile-Name'] = name
+        return response
+
+    @app.teardown_request
+    def abandon_profile(exception=None):
+        # after_request is skipped when the request fails with an unhandled exception,
+        # but the sampler thread must still stop; the profile shows where it failed
+        sampler = g.pop('_profile_sampler', None)
+        if sampler is not None:
+            sampler.stop()
+            _write_profile(sampler, current_app.config['PROFILE_DIR'], request.endpoint)
+
+    @app.route('/admin/profiles')
+    def admin_profiles():
+        """List recent profiles."""
+        if not _authorized():
+            abort(403)
+        return jsonify({'profiles': list_profiles(current_app.config['PROFILE_DIR'])})
+
+    @app.route('/admin/profiles/<path:filename>')
+    def admin_profile_file(filename):
+        """Download a profile file."""
+        if not _authorized():
+            abort(403)
+        return send_from_directory(os.path.abspath(current_app.config['PROFILE_DIR']), filename)
@@ -0,0 +1,94 @@
+"""
+Query budgets for the Library Management System
+Caps the number of SQL statements a route or service call may execute, to catch N+1 regressions
+
+Routes declare their budget with the @query_budget(n) decorator. When QUERY_BUDGET_MODE
+(or LIBRARY_QUERY_BUDGET) is 'warn' the app logs requests that go over budget; when it is
+'raise' they fail with QueryBudgetExceeded. The default 'off' adds no per-request work.
+Statements the catalog caches run on their own CacheConnection to rebuild themselves are
+not counted.
+
+Tests can also wrap any service call:
+
+    with assert_max_queries(3):
+        borrow_book_by_patron("123456", 1)
+"""
+
+import logging
+import os
+from contextlib import contextmanager
+from typing import Iterator
+
+from flask import current_app, g, request
+
+from database import QueryCount, count_queries
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUDGET_MODES = ('off', 'warn', 'raise')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when more SQL statements were executed than the budget allows."""
+
+    def __init__(self, name: str, budget: int, counter: QueryCount):
+        self.budget = budget
+        self.counter = counter
+        statements = '\n'.join(f'  {helper}: {sql}' for helper, sql in counter.statements)
+        super().__init__(f"{name} executed {counter.count} SQL statements (budget {budget}):\n{statements}")
+
+
+def query_budget(max_queries: int):
+    """Declare the maximum number of SQL statements a view may execute per request."""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+@contextmanager
+def assert_max_queries(max_queries: int, name: str = 'Block') -> Iterator[QueryCount]:
+    """Fail with QueryBudgetExceeded if the with-block executes more than `max_queries` statements."""
+    with count_queries() as counter:
+        yield counter
+    if counter.count > max_queries:
+        raise QueryBudgetExceeded(name, max_queries, counter)
+
+
+def init_query_budgets(app):
+    """
+    Enforce the budgets declared with @query_budget on each request.
+
+    Config:
+        QUERY_BUDGET_MODE: 'off', 'warn' or 'raise' (defaults to LIBRARY_QUERY_BUDGET, else 'off')
+    """
+    app.config.setdefault('QUERY_BUDGET_MODE', os.environ.get('LIBRARY_QUERY_BUDGET', 'off').lower())
+
+    def budget_for_request():
+        if current_app.config['QUERY_BUDGET_MODE'] == 'off' or request.endpoint is None:
+            return None
+        return getattr(current_app.view_functions.get(request.endpoint), 'query_budget', None)
+
+    @app.before_request
+    def start_query_budget():
+        if budget_for_request() is not None:
+            g._query_budget_block = count_queries()
+            g._query_budget_counter = g._query_budget_block.__enter__()
+
+    @app.after_request
+    def check_query_budget(response):
+        counter = g.get('_query_budget_counter')
+        budget = budget_for_request()
+        if counter is not None and budget is not None and counter.count > budget:
+            error = QueryBudgetExceeded(f"{request.method} {request.endpoint}", budget, counter)
+            if current_app.config['QUERY_BUDGET_MODE'] == 'raise':
+                raise error
+            logger.warning("%s", error)
+        return response
+
+    @app.teardown_request
+    def end_query_budget(exception=None):
+        block = g.pop('_query_budget_block', None)
+        g.pop('_query_budget_counter', None)
+        if block is not None:
+            block.__exit__(None, None, None)
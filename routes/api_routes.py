@@ -2,12 +2,19 @@
 API Routes - JSON API endpoints
 """
 
-from flask import Blueprint, jsonify, request
-from services.library_service import calculate_late_fee_for_book, search_books_in_catalog
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from services.library_service import (
+    MAX_BATCH_SEARCHES, calculate_late_fee_for_book, get_catalog_page, search_books_batch, search_books_in_catalog,
+)
+from services.suggest_service import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS, SUGGEST_FIELDS, suggest_books
+from services.export_service import EXPORT_FORMATS, export_catalog, gzip_chunks
+from services.query_service import SearchQueryError
+from query_budget import query_budget
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
 @api_bp.route('/late_fee/<patron_id>/<int:book_id>')
+@query_budget(1)
 def get_late_fee(patron_id, book_id):
     """
     Calculate late fee for a specific book borrowed by a patron.
@@ -17,6 +24,7 @@ def get_late_fee(patron_id, book_id):
     return jsonify(result), 501 if 'not implemented' in result.get('status', '') else 200
 
 @api_bp.route('/search')
+@query_budget(2)
 def search_books_api():
     """
     Search for books via API endpoint.
@@ -24,16 +32,148 @@ def search_books_api():
     """
     search_term = request.args.get('q', '').strip()
     search_type = request.args.get('type', 'title')
+    fuzzy = request.args.get('fuzzy', '').strip().lower() in ('1', 'true', 'yes', 'on')
     
     if not search_term:
         return jsonify({'error': 'Search term is required'}), 400
     
     # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    try:
+        books = search_books_in_catalog(search_term, search_type, fuzzy)
+    except SearchQueryError as error:
+        return jsonify({'error': str(error)}), 400
     
     return jsonify({
         'search_term': search_term,
         'search_type': search_type,
+        'fuzzy': fuzzy,
         'results': books,
         'count': len(books)
     })
+
+@api_bp.route('/search/batch', methods=['POST'])
+@query_budget(4)
+def search_books_batch_api():
+    """
+    Run many searches in one request, e.g. to resolve a reading list.
+    Takes {"searches": [{"q": ..., "type": ...}, ...]} and returns the results keyed 'type:q'.
+    """
+    body = request.get_json(silent=True)
+    searches = body.get('searches') if isinstance(body, dict) else None
+    if not isinstance(searches, list) or not searches:
+        return jsonify({'error': 'Body must be JSON with a non-empty "searches" list'}), 400
+    if len(searches) > MAX_BATCH_SEARCHES:
+        return jsonify({'error': f'At most {MAX_BATCH_SEARCHES} searches per batch'}), 400
+
+    pairs = []
+    for search in searches:
+        if not isinstance(search, dict) or not isinstance(search.get('q'), str) or not search['q'].strip() \
+                or not isinstance(search.get('type', 'title'), str):
+            return jsonify({'error': 'Each search needs a "q" search term and an optional "type"'}), 400
+        pairs.append((search['q'], search.get('type', 'title')))
+
+    # Use business logic function
+    results = search_books_batch(pairs)
+
+    return jsonify({
+        'results': results,
+        'count': len(results)
+    })
+
+@api_bp.route('/suggest')
+@query_budget(3)
+def suggest_books_api():
+    """
+    Suggest titles or authors for a search box as the user types.
+    Matches the start of the title or author and ranks by how often it was borrowed.
+    """
+    prefix = request.args.get('q', '').strip()
+    field = request.args.get('type', 'title')
+
+    if not prefix:
+        return jsonify({'error': 'Search term is required'}), 400
+    if field not in SUGGEST_FIELDS:
+        return jsonify({'error': 'Type must be one of: ' + ', '.join(SUGGEST_FIELDS)}), 400
+
+    try:
+        limit = int(request.args.get('limit', DEFAULT_SUGGESTIONS))
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Limit must be an integer'}), 400
+    if not 1 <= limit <= MAX_SUGGESTIONS:
+        return jsonify({'error': f'Limit must be between 1 and {MAX_SUGGESTIONS}'}), 400
+
+    suggestions = suggest_books(prefix, field, limit)
+
+    return jsonify({
+        'query': prefix,
+        'type': field,
+        'suggestions': suggestions,
+        'count': len(suggestions)
+    })
+
+@api_bp.route('/books')
+@query_budget(1)
+def list_books_api():
+    """
+    List the catalog as JSON, one page at a time.
+    JSON equivalent of the catalog display with cursor pagination,
+    an availability filter and a field projection.
+    """
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+
+    try:
+        cursor = int(request.args.get('cursor', 0))
+        limit = int(request.args.get('limit', 50))
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Cursor and limit must be integers'}), 400
+
+    available_arg = request.args.get('available', '').strip().lower()
+    if available_arg in ('', 'all'):
+        available = None
+    elif available_arg in ('true', '1', 'yes'):
+        available = True
+    elif available_arg in ('false', '0', 'no'):
+        available = False
+    else:
+        return jsonify({'error': 'Available must be true or false'}), 400
+
+    # Use business logic function
+    page = get_catalog_page(fields, cursor, limit, available)
+    if 'error' in page:
+        return jsonify(page), 400
+
+    return jsonify({
+        'books': page['books'],
+        'count': len(page['books']),
+        'next_cursor': page['next_cursor']
+    })
+
+@api_bp.route('/books/export')
+def export_books():
+    """
+    Stream the whole catalog as NDJSON or CSV.
+    Rows are read from an open cursor and written as they are fetched,
+    so memory use does not grow with the catalog size.
+    """
+    export_format = request.args.get('format', 'ndjson').strip().lower()
+    use_gzip = request.args.get('gzip', '').strip().lower() in ('1', 'true', 'yes')
+
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'Format must be one of: ' + ', '.join(EXPORT_FORMATS)}), 400
+
+    # Keep the request context while the body streams, so rows come from this app's database
+    chunks = stream_with_context(export_catalog(export_format))
+    filename = f'catalog.{export_format}'
+
+    if use_gzip:
+        return Response(
+            gzip_chunks(chunks),
+            mimetype='application/gzip',
+            headers={'Content-Disposition': f'attachment; filename={filename}.gz'}
+        )
+
+    return Response(
+        chunks,
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
@@ -4,10 +4,12 @@ Borrowing Routes - Book borrowing and returning endpoints
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from services.library_service import borrow_book_by_patron, return_book_by_patron
+from query_budget import query_budget
 
 borrowing_bp = Blueprint('borrowing', __name__)
 
 @borrowing_bp.route('/borrow', methods=['POST'])
+@query_budget(4)
 def borrow_book():
     """
     Process book borrowing request.
@@ -28,6 +30,7 @@ def borrow_book():
     return redirect(url_for('catalog.catalog'))
 
 @borrowing_bp.route('/return', methods=['GET', 'POST'])
+@query_budget(6)
 def return_book():
     """
     Process book return.
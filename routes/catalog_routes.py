@@ -3,8 +3,8 @@ Catalog Routes - Book catalog related endpoints
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from database import get_all_books
-from services.library_service import add_book_to_catalog
+from services.library_service import add_book_to_catalog, get_catalog_books
+from query_budget import query_budget
 
 catalog_bp = Blueprint('catalog', __name__)
 
@@ -14,15 +14,17 @@ def index():
     return redirect(url_for('catalog.catalog'))
 
 @catalog_bp.route('/catalog')
+@query_budget(1)
 def catalog():
     """
     Display all books in the catalog.
     Implements R2: Book Catalog Display
     """
-    books = get_all_books()
+    books = get_catalog_books()
     return render_template('catalog.html', books=books)
 
 @catalog_bp.route('/add_book', methods=['GET', 'POST'])
+@query_budget(2)
 def add_book():
     """
     Add a new book to the catalog.
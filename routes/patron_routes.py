@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, render_template
 from services.library_service import get_patron_status_report
+from query_budget import query_budget
 
 #MY API ATTEMPT No.4!
 patron_bp = Blueprint('patron', __name__)
@@ -10,6 +11,7 @@ def patron_status_page():
     return render_template('patron_status.html')
 
 @patron_bp.route('/api/patron/<patron_id>/status', methods=['GET'])
+@query_budget(1)
 def get_patron_status(patron_id):
     """
     Get status information for a patron including:
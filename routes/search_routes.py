@@ -4,10 +4,13 @@ Search Routes - Book search functionality
 
 from flask import Blueprint, render_template, request, flash
 from services.library_service import search_books_in_catalog
+from services.query_service import SearchQueryError
+from query_budget import query_budget
 
 search_bp = Blueprint('search', __name__)
 
 @search_bp.route('/search')
+@query_budget(2)
 def search_books():
     """
     Search for books in the catalog.
@@ -15,14 +18,21 @@ def search_books():
     """
     search_term = request.args.get('q', '').strip()
     search_type = request.args.get('type', 'title')
+    fuzzy = request.args.get('fuzzy', '').strip().lower() in ('1', 'true', 'yes', 'on')
     
     if not search_term:
-        return render_template('search.html', books=[], search_term='', search_type=search_type)
+        return render_template('search.html', books=[], search_term='', search_type=search_type, fuzzy=fuzzy)
     
     # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    try:
+        books = search_books_in_catalog(search_term, search_type, fuzzy)
+    except SearchQueryError as error:
+        flash(str(error), 'error')
+        return render_template('search.html', books=[], search_term=search_term, search_type=search_type,
+                               fuzzy=fuzzy)
     
     if not books:
         flash('No books found matching.', 'error')
     
-    return render_template('search.html', books=books, search_term=search_term, search_type=search_type)
+    return render_template('search.html', books=books, search_term=search_term, search_type=search_type,
+                           fuzzy=fuzzy)
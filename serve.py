@@ -0,0 +1,255 @@
+"""
+Production server for the Library Management System
+
+Initializes the database once, opens the listening socket, then pre-forks worker
+processes that each serve requests from a bounded thread pool. Debug mode and the
+reloader are never enabled.
+
+Usage:
+    python serve.py [--host 0.0.0.0] [--port 5000] [--workers N] [--threads M] [--database library.db]
+
+Signals (POSIX):
+    SIGTERM / SIGINT  Graceful shutdown: workers finish in-flight requests, then exit
+    SIGHUP            Graceful reload: start fresh workers, then retire the old ones
+"""
+
+import argparse
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+import database
+from database import init_database, add_sample_data
+
+# Seconds a worker gets to finish in-flight requests before it is killed
+GRACEFUL_TIMEOUT = 30
+
+# Seconds an idle keep-alive connection may hold a request thread
+KEEPALIVE_TIMEOUT = 15
+
+
+class RequestHandler(WSGIRequestHandler):
+    """Request handler that drops idle connections so they cannot pin pool threads."""
+
+    timeout = KEEPALIVE_TIMEOUT
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server that handles requests on a fixed-size thread pool."""
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads: int = 4, **kwargs):
+        kwargs.setdefault('handler', RequestHandler)
+        super().__init__(host, port, app, **kwargs)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='library-request')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        # Wait for in-flight requests before closing the listening socket
+        # (BaseWSGIServer also calls this during __init__, before the pool exists)
+        pool = getattr(self, 'pool', None)
+        if pool is not None:
+            pool.shutdown(wait=True)
+        super().server_close()
+
+
+def create_listener(host: str, port: int, backlog: int = 1024) -> socket.socket:
+    """Bind the listening socket that all workers share."""
+    sock = socket.create_server((host, port), backlog=backlog, reuse_port=False)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(listener: socket.socket, host: str, port: int, threads: int):
+    """Serve requests in the current process until SIGTERM or SIGINT is received."""
+    # The app is imported here so that a reload picks up changes to routes and services
+    from app import create_app
+
+    app = create_app(init_db=False)
+    server = PooledWSGIServer(host, port, app, threads=threads, fd=listener.fileno())
+
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever() returns, so it cannot run in this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+class Arbiter:
+    """Parent process that keeps `workers` forked workers running."""
+
+    def __init__(self, listener: socket.socket, host: str, port: int, workers: int, threads: int):
+        self.listener = listener
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.pids = set()
+        self.stopping = False
+        self.reload_requested = False
+
+    def spawn_worker(self) -> int:
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                run_worker(self.listener, self.host, self.port, self.threads)
+            except Exception:
+                exit_code = 1
+                import traceback
+                traceback.print_exc()
+            finally:
+                os._exit(exit_code)
+        self.pids.add(pid)
+        return pid
+
+    def retire(self, pids, timeout: float = GRACEFUL_TIMEOUT):
+        """Ask workers to stop, killing any that have not exited after `timeout` seconds."""
+        for pid in pids:
+            self._signal(pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + timeout
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            self.reap(remaining)
+            time.sleep(0.05)
+
+        for pid in remaining:
+            self._signal(pid, signal.SIGKILL)
+            self._wait(pid)
+        self.pids -= set(pids)
+
+    def reap(self, watched=None) -> set:
+        """Collect exited workers without blocking; returns their PIDs."""
+        exited = set()
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            exited.add(pid)
+        self.pids -= exited
+        if watched is not None:
+            watched -= exited
+        return exited
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+
+        for _ in range(self.workers):
+            self.spawn_worker()
+        print(f"Serving on http://{self.host}:{self.port} with {self.workers} workers x {self.threads} threads "
+              f"(pid {os.getpid()})", flush=True)
+
+        while not self.stopping:
+            if self.reload_requested:
+                self.reload_requested = False
+                old = set(self.pids)
+                for _ in range(self.workers):
+                    self.spawn_worker()
+                self.retire(old)
+                print(f"Reloaded {self.workers} workers", flush=True)
+
+            # Replace workers that crashed, including any that retire() reaped during a reload
+            self.reap()
+            while not self.stopping and len(self.pids) < self.workers:
+                self.spawn_worker()
+            time.sleep(0.2)
+
+        self.retire(set(self.pids))
+        self.listener.close()
+        print("Shut down", flush=True)
+
+    def _handle_stop(self, signum, frame):
+        self.stopping = True
+
+    def _handle_reload(self, signum, frame):
+        self.reload_requested = True
+
+    @staticmethod
+    def _signal(pid: int, signum: int):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    @staticmethod
+    def _wait(pid: int):
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes (default: CPU count)')
+    parser.add_argument('--threads', type=int, default=4, help='request threads per worker (default: 4)')
+    parser.add_argument('--database', help='SQLite database file (default: LIBRARY_DATABASE or library.db)')
+    args = parser.parse_args(argv)
+
+    if args.database:
+        # Forked workers inherit the module setting; the environment covers anything they spawn
+        database.DATABASE = os.environ['LIBRARY_DATABASE'] = args.database
+
+    # Schema and sample data are set up once here instead of in every worker
+    init_database()
+    add_sample_data()
+
+    # Workers share their metrics through a directory so /metrics covers every process
+    metrics_dir = None
+    if not os.environ.get('LIBRARY_METRICS_DIR'):
+        metrics_dir = os.environ['LIBRARY_METRICS_DIR'] = tempfile.mkdtemp(prefix='library-metrics-')
+
+    try:
+        listener = create_listener(args.host, args.port)
+
+        if not hasattr(os, 'fork'):
+            # No fork() on this platform: serve from a single process
+            print(f"Serving on http://{args.host}:{args.port} with 1 worker x {args.threads} threads", flush=True)
+            run_worker(listener, args.host, args.port, args.threads)
+            return
+
+        Arbiter(listener, args.host, args.port, max(1, args.workers), max(1, args.threads)).run()
+    finally:
+        # Only the master gets here (workers leave through os._exit), after every worker has exited
+        if metrics_dir is not None:
+            os.environ.pop('LIBRARY_METRICS_DIR', None)
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
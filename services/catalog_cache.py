@@ -0,0 +1,88 @@
+"""
+Catalog Cache Module - Base for in-memory indexes of the book catalog
+Each process builds its indexes from the database once and keeps them in step with it:
+changes made by the process itself are applied in place, and changes made anywhere else
+(another server worker, a script, clear_database) are detected through the catalog version
+kept in the database, after which the index is rebuilt on next use.
+"""
+
+import sqlite3
+import threading
+from typing import List
+
+from database import CacheConnection, get_catalog_version, get_database_path
+
+# Every cache in this process, so the service layer can tell them all about its changes
+_caches: List['CatalogCache'] = []
+
+
+class CatalogCache:
+    """
+    An index of the catalog of the current database, rebuilt when the catalog changes elsewhere.
+
+    Subclasses implement load() and call sync() while holding self.lock before using the index.
+    They may override book_added() and book_borrowed(); a book_added() that applies the book
+    to the index calls local_change() under the lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = False
+        self._database = None
+        self._version = None
+        # Catalog changes made by this process since the version was read, already applied
+        self._local_changes = 0
+        # Long-lived connection for reading the catalog version on every use, and for load();
+        # its statements are in the metrics and traces but not in query budgets
+        self._probe = None
+        self._probe_database = None
+        _caches.append(self)
+
+    def load(self):
+        """Build the index from the current database."""
+        raise NotImplementedError
+
+    def book_added(self, title: str, author: str):
+        """Called after this process inserted a book."""
+
+    def book_borrowed(self, title: str, author: str):
+        """Called after this process recorded a borrow of a book."""
+
+    def _catalog_version(self, database: str) -> int:
+        if self._probe_database != database:
+            if self._probe is not None:
+                self._probe.close()
+            self._probe = sqlite3.connect(database, check_same_thread=False, factory=CacheConnection)
+            self._probe_database = database
+        return get_catalog_version(self._probe)
+
+    def sync(self):
+        """Rebuild the index unless it reflects the current catalog of the current database."""
+        database = get_database_path()
+        version = self._catalog_version(database)
+        if self.loaded and database == self._database and version == self._version + self._local_changes:
+            self._version, self._local_changes = version, 0
+            return
+
+        self.load()
+        self.loaded, self._database, self._version, self._local_changes = True, database, version, 0
+
+    def is_current(self) -> bool:
+        """Whether the index is built for the current database, so local changes should be applied to it."""
+        return self.loaded and get_database_path() == self._database
+
+    def local_change(self):
+        """Record that one catalog change made by this process has been applied to the index."""
+        self._local_changes += 1
+
+
+def notify_book_added(title: str, author: str):
+    """Tell every catalog cache in this process about a book it has just inserted."""
+    for cache in _caches:
+        cache.book_added(title, author)
+
+
+def notify_book_borrowed(title: str, author: str):
+    """Tell every catalog cache in this process about a borrow it has just recorded."""
+    for cache in _caches:
+        cache.book_borrowed(title, author)
@@ -0,0 +1,236 @@
+"""
+Columnar Catalog Module - Optional in-memory column snapshot of the books table
+For read-heavy deployments: the catalog display, title, author and ISBN searches and the
+availability-filtered catalog API pages are answered from memory instead of SQLite.
+
+Every column of the books table is held as one parallel array, row i being the book with the
+i-th smallest ID: the numeric columns as array.array, with zero-copy NumPy views of them when
+NumPy is installed so availability filters compare a whole slice at once, and each search key
+column also as a single string with one line per book, so a substring search is one str.find()
+pass over the column instead of a test per book. Title and ISBN orders are precomputed.
+
+The snapshot is brought up to date on every read. A new catalog version (see CatalogCache)
+rebuilds it when books are added, removed or renamed; otherwise the change counter tells
+whether any book was updated since, and only those books (stamped with a later change_id)
+are fetched and patched in place, e.g. copies borrowed or returned by any process.
+
+Enabled by the app's COLUMNAR_CATALOG config, else the LIBRARY_COLUMNAR_CATALOG environment
+variable. Borrowing and returning keep reading SQLite, so their checks never see a stale count.
+"""
+
+import os
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, islice
+from typing import Dict, List, Optional
+
+from flask import current_app, has_app_context
+
+from database import BOOK_FIELDS, ISBN_PREFIX_LIMIT, SNAPSHOT_COLUMNS, get_change_counter, get_snapshot_rows
+from services.catalog_cache import CatalogCache
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional
+    np = None
+
+# Rows compared at a time when filtering a catalog page by availability
+PAGE_SCAN_CHUNK = 1024
+
+
+def columnar_enabled() -> bool:
+    """Whether catalog reads are served from the snapshot (the COLUMNAR_CATALOG config, else LIBRARY_COLUMNAR_CATALOG)."""
+    if has_app_context() and current_app.config.get('COLUMNAR_CATALOG') is not None:
+        return bool(current_app.config['COLUMNAR_CATALOG'])
+    return os.environ.get('LIBRARY_COLUMNAR_CATALOG', '').lower() in ('1', 'true', 'yes')
+
+
+def _array_bytes(column: array) -> int:
+    return len(column) * column.itemsize
+
+
+def _list_bytes(values: list, shared: bool = False) -> int:
+    """Bytes of a list and, unless its items are `shared` with another column, of its items."""
+    size = sys.getsizeof(values)
+    if not shared:
+        size += sum(sys.getsizeof(value) for value in values)
+    return size
+
+
+class BookColumns:
+    """The books table as parallel columns, row i being the book with the i-th smallest ID."""
+
+    def __init__(self, rows: List[tuple]):
+        """Build the columns from get_snapshot_rows() tuples ordered by ID."""
+        columns = dict(zip(SNAPSHOT_COLUMNS, zip(*rows))) if rows else dict.fromkeys(SNAPSHOT_COLUMNS, ())
+        self.ids = array('q', columns['id'])
+        self.titles = list(columns['title'])
+        self.authors = list(columns['author'])
+        self.isbns = list(columns['isbn'])
+        self.total_copies = array('q', columns['total_copies'])
+        self.available_copies = array('q', columns['available_copies'])
+        # Shares the array's memory, so patched counts show in both
+        self._available_view = np.frombuffer(self.available_copies, dtype=np.int64) if np is not None else None
+        self.keys = {'title': list(columns['title_key']), 'author': list(columns['author_key'])}
+
+        # Each key column as one string, a line per book (keys never contain a newline),
+        # with the offset where each line starts (plus the end of the last one)
+        self._lines = {field: ''.join(key + '\n' for key in keys) for field, keys in self.keys.items()}
+        self._starts = {field: array('q', accumulate((len(key) + 1 for key in keys), initial=0))
+                        for field, keys in self.keys.items()}
+
+        # Rows ordered by title_key then ID (as ORDER BY title_key), and each row's place in that order
+        self.title_order = array('q', sorted(range(len(self.titles)), key=self.keys['title'].__getitem__))
+        self.title_rank = array('q', bytes(8 * len(self.titles)))
+        for position, row in enumerate(self.title_order):
+            self.title_rank[row] = position
+
+        # Rows ordered by ISBN, and the ISBNs in that order for bisection
+        self.isbn_order = array('q', sorted(range(len(self.isbns)), key=self.isbns.__getitem__))
+        self.sorted_isbns = [self.isbns[row] for row in self.isbn_order]
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def row_of(self, book_id: int) -> Optional[int]:
+        """The row of the book with this ID, or None."""
+        row = bisect_left(self.ids, book_id)
+        return row if row < len(self) and self.ids[row] == book_id else None
+
+    def book(self, row: int) -> Dict:
+        """The book in `row` as get_book_by_id() returns it."""
+        return {
+            'id': self.ids[row],
+            'title': self.titles[row],
+            'author': self.authors[row],
+            'isbn': self.isbns[row],
+            'total_copies': self.total_copies[row],
+            'available_copies': self.available_copies[row],
+        }
+
+    def all_books(self) -> List[Dict]:
+        """Every book ordered by title, as get_all_books() returns them."""
+        return [self.book(row) for row in self.title_order]
+
+    def search(self, field: str, key: str) -> List[Dict]:
+        """The books whose `field` key contains `key`, as search_books_by_key() returns them."""
+        keys, lines, starts = self.keys[field], self._lines[field], self._starts[field]
+        rows = []
+        position = lines.find(key)
+        while position >= 0:
+            row = bisect_right(starts, position) - 1
+            rows.append(row)
+            # Carry on from the next line, so each book is found once
+            position = lines.find(key, starts[row + 1])
+        rows.sort(key=lambda row: (keys[row] != key, self.title_rank[row]))
+        return [self.book(row) for row in rows]
+
+    def isbn_prefix(self, prefix: str, limit: int = ISBN_PREFIX_LIMIT) -> List[Dict]:
+        """Up to `limit` books whose ISBN starts with `prefix`, as get_books_by_isbn_prefix() returns them."""
+        if not prefix:
+            return []
+        lo = bisect_left(self.sorted_isbns, prefix)
+        hi = bisect_left(self.sorted_isbns, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo)
+        return [self.book(self.isbn_order[position]) for position in range(lo, min(hi, lo + limit))]
+
+    def page(self, fields: List[str], after_id: int = 0, limit: int = 50,
+             available: Optional[bool] = None) -> List[Dict]:
+        """Up to `limit` books with an ID greater than `after_id`, as get_books_page() returns them."""
+        columns = [field for field in BOOK_FIELDS if field in fields]
+        if not columns:
+            raise ValueError("At least one valid field is required.")
+
+        start = bisect_right(self.ids, after_id)
+        if available is None:
+            rows = range(start, min(start + limit, len(self)))
+        else:
+            rows = []
+            while start < len(self) and len(rows) < limit:
+                if self._available_view is not None:
+                    copies = self._available_view[start:start + PAGE_SCAN_CHUNK]
+                    found = np.flatnonzero(copies > 0 if available else copies <= 0) + start
+                    rows.extend(found[:limit - len(rows)].tolist())
+                else:
+                    copies = self.available_copies[start:start + PAGE_SCAN_CHUNK]
+                    found = (start + i for i, count in enumerate(copies) if (count > 0) == available)
+                    rows.extend(islice(found, limit - len(rows)))
+                start += PAGE_SCAN_CHUNK
+
+        books = []
+        for row in rows:
+            book = self.book(row)
+            books.append({field: book[field] for field in columns})
+        return books
+
+    def apply(self, changed: List[tuple]) -> bool:
+        """
+        Patch the copy counts of books changed since the snapshot was taken (get_snapshot_rows()
+        tuples). Returns False, changing nothing, if a change needs a rebuild: a book that is new
+        or has a new title, author or ISBN.
+        """
+        updates = []
+        for values in changed:
+            book = dict(zip(SNAPSHOT_COLUMNS, values))
+            row = self.row_of(book['id'])
+            if row is None or (self.titles[row], self.authors[row], self.isbns[row]) != (
+                    book['title'], book['author'], book['isbn']):
+                return False
+            updates.append((row, book['total_copies'], book['available_copies']))
+        for row, total_copies, available_copies in updates:
+            self.total_copies[row] = total_copies
+            self.available_copies[row] = available_copies
+        return True
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Approximate bytes held by each column and index, and their 'total'."""
+        usage = {
+            'id': _array_bytes(self.ids),
+            'title': _list_bytes(self.titles),
+            'author': _list_bytes(self.authors),
+            'isbn': _list_bytes(self.isbns),
+            'total_copies': _array_bytes(self.total_copies),
+            'available_copies': _array_bytes(self.available_copies),
+            'title_order': _array_bytes(self.title_order) + _array_bytes(self.title_rank),
+            # The sorted ISBNs are the same string objects as the isbn column
+            'isbn_order': _array_bytes(self.isbn_order) + _list_bytes(self.sorted_isbns, shared=True),
+        }
+        for field, keys in self.keys.items():
+            usage[f'{field}_key'] = (_list_bytes(keys) + sys.getsizeof(self._lines[field])
+                                     + _array_bytes(self._starts[field]))
+        usage['total'] = sum(usage.values())
+        return usage
+
+
+class ColumnarCatalog(CatalogCache):
+    """The BookColumns of the current database, patched from the change counter on every read."""
+
+    def __init__(self):
+        super().__init__()
+        self._columns: Optional[BookColumns] = None
+        # Change counter value the snapshot reflects
+        self._changes = 0
+
+    def load(self):
+        # The counter is read first, so books changed during the load are fetched again next time
+        self._changes = get_change_counter(self._probe)
+        self._columns = BookColumns(get_snapshot_rows(self._probe))
+
+    def columns(self) -> BookColumns:
+        with self.lock:
+            self.sync()
+            changes = get_change_counter(self._probe)
+            if changes != self._changes:
+                if self._columns.apply(get_snapshot_rows(self._probe, changed_since=self._changes)):
+                    self._changes = changes
+                else:
+                    self.load()
+            return self._columns
+
+
+_catalog = ColumnarCatalog()
+
+
+def catalog_columns() -> BookColumns:
+    """The column snapshot of the current database's books, brought up to date."""
+    return _catalog.columns()
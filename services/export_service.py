@@ -0,0 +1,95 @@
+"""
+Export Service Module - Streaming catalog exports
+Turns the book catalog into NDJSON or CSV chunks without materializing the whole table
+"""
+
+import csv
+import json
+import zlib
+from typing import Dict, Iterable, Iterator
+
+from database import iter_books
+
+EXPORT_FIELDS = ['id', 'title', 'author', 'isbn', 'total_copies', 'available_copies']
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Number of rows joined into a single chunk before it is handed to the server
+ROWS_PER_CHUNK = 500
+
+
+class _Echo:
+    """File-like object whose write() returns the value instead of storing it."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _ndjson_lines(books: Iterable[Dict]) -> Iterator[str]:
+    for book in books:
+        yield json.dumps({field: book[field] for field in EXPORT_FIELDS}, ensure_ascii=False) + '\n'
+
+
+def _csv_lines(books: Iterable[Dict]) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for book in books:
+        yield writer.writerow([book[field] for field in EXPORT_FIELDS])
+
+
+def _chunked(lines: Iterable[str], rows_per_chunk: int) -> Iterator[str]:
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= rows_per_chunk:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def gzip_chunks(chunks: Iterable[str]) -> Iterator[bytes]:
+    """
+    Gzip a stream of text chunks incrementally.
+
+    Args:
+        chunks: Text chunks to compress (encoded as UTF-8)
+
+    Returns:
+        iterator: Compressed byte chunks forming a single gzip member
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_catalog(export_format: str, books: Iterable[Dict] = None,
+                   rows_per_chunk: int = ROWS_PER_CHUNK) -> Iterator[str]:
+    """
+    Stream the catalog in the requested format.
+
+    Args:
+        export_format: 'ndjson' or 'csv'
+        books: Rows to export (defaults to streaming every book from the database)
+        rows_per_chunk: Number of rows per yielded chunk
+
+    Returns:
+        iterator: Text chunks of the export, in book ID order
+
+    Raises:
+        ValueError: If the export format is not supported
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+    if books is None:
+        books = iter_books()
+
+    lines = _ndjson_lines(books) if export_format == 'ndjson' else _csv_lines(books)
+    return _chunked(lines, rows_per_chunk)
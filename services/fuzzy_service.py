@@ -0,0 +1,216 @@
+"""
+Fuzzy Service Module - Typo-tolerant title and author search
+Finds books whose title or author words are within a small edit distance of the words
+searched for, so "Fitzgerld" finds Fitzgerald and "Orwel" finds Orwell.
+
+The distinct normalized words of every title and author are kept per field with a letter-pair
+index, which narrows the vocabulary to the few words that can be within distance k of a query
+word before any edit distance is computed. The books containing those words are then fetched
+through the trigram index over the search keys (get_token_search_candidates), so the catalog
+is never scanned and no per-book data is held in memory. The vocabulary is built from the
+stored title_key / author_key columns on the first fuzzy search and kept in step with the
+catalog by CatalogCache. Words too short to tolerate a typo give the trigram index nothing
+to look up, so a term made only of them finds nothing here (the substring search that
+search_books_in_catalog() runs alongside still matches it).
+"""
+
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from database import MIN_TRIGRAM_TERM, get_token_search_candidates, iter_search_keys, search_key
+from services.catalog_cache import CatalogCache
+
+FUZZY_FIELDS = ('title', 'author')
+
+_WORD = re.compile(r'\w+')
+
+
+def allowed_typos(word: str) -> int:
+    """Edit distance tolerated for a query word: none below 3 characters, 1 up to 5, then 2."""
+    if len(word) < 3:
+        return 0
+    return 1 if len(word) <= 5 else 2
+
+
+def edit_distance(a: str, b: str, limit: Optional[int] = None) -> int:
+    """
+    Number of typos between `a` and `b`: inserted, deleted or replaced characters, or two
+    neighbouring characters swapped (optimal string alignment distance).
+    With a `limit`, any distance above it is reported as limit + 1, and only the cells of the
+    table within `limit` of the diagonal are computed.
+    """
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is None:
+        limit = len(a)
+    elif len(a) - len(b) > limit:
+        return limit + 1
+    over = limit + 1
+
+    before_previous, previous = None, [min(j, over) for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        current = [over] * (len(b) + 1)
+        current[0] = min(i, over)
+        row_min = current[0]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            char_b = b[j - 1]
+            cost = previous[j - 1] + (char_a != char_b)
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b and before_previous[j - 2] + 1 < cost:
+                cost = before_previous[j - 2] + 1
+            current[j] = cost if cost < over else over
+            if cost < row_min:
+                row_min = cost
+        # Each row only depends on the two above it
+        if row_min >= over and min(previous) >= over:
+            return over
+        before_previous, previous = previous, current
+    return previous[-1]
+
+
+def _bigrams(word: str) -> set:
+    """The distinct letter pairs of `word`, with ^ and $ marking its start and end."""
+    padded = f'^{word}$'
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+class Vocabulary:
+    """
+    The distinct words of one field's search keys, with an inverted index from letter pairs to words.
+
+    One typo changes at most three of a word's letter pairs (a swap of two letters), so a word
+    within distance k of the query shares at least (query pairs - 3k) of them. Counting shared
+    pairs over the posting lists leaves a few candidates, and the edit distance is only computed
+    for those. Queries too short for that bound check every word of a suitable length.
+    """
+
+    def __init__(self):
+        self.words: List[str] = []
+        self.ids: Dict[str, int] = {}
+        # (word length, letter pair) -> IDs of the words of that length containing the pair;
+        # a word within distance k of the query is at most k letters longer or shorter
+        self.postings: Dict[Tuple[int, str], List[int]] = {}
+        self.by_length: Dict[int, List[int]] = {}
+
+    def add(self, word: str) -> bool:
+        """Add `word`; returns False if it was already known."""
+        if word in self.ids:
+            return False
+        word_id = self.ids[word] = len(self.words)
+        self.words.append(word)
+        self.by_length.setdefault(len(word), []).append(word_id)
+        for pair in _bigrams(word):
+            self.postings.setdefault((len(word), pair), []).append(word_id)
+        return True
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[int, str]]:
+        """All (distance, word) within `max_distance` of `word`."""
+        if max_distance == 0:
+            return [(0, word)] if word in self.ids else []
+        lengths = range(max(1, len(word) - max_distance), len(word) + max_distance + 1)
+        pairs = _bigrams(word)
+        needed = len(pairs) - 3 * max_distance
+        if needed > 0:
+            shared = Counter()
+            for length in lengths:
+                for pair in pairs:
+                    shared.update(self.postings.get((length, pair), ()))
+            candidates = [word_id for word_id, count in shared.items() if count >= needed]
+        else:
+            candidates = [word_id for length in lengths for word_id in self.by_length.get(length, ())]
+
+        matches = []
+        for word_id in candidates:
+            candidate = self.words[word_id]
+            distance = edit_distance(word, candidate, max_distance)
+            if distance <= max_distance:
+                matches.append((distance, candidate))
+        return matches
+
+
+class FuzzyIndex(CatalogCache):
+    """The title and author vocabularies of the current database."""
+
+    def __init__(self):
+        super().__init__()
+        self._vocabularies: Dict[str, Vocabulary] = {}
+
+    def load(self):
+        self._vocabularies = {field: Vocabulary() for field in FUZZY_FIELDS}
+        titles, authors = self._vocabularies['title'], self._vocabularies['author']
+        # Read on the cache's own connection: a rebuild is not part of the request that triggers it
+        for title_key, author_key in iter_search_keys(conn=self._probe):
+            for word in _WORD.findall(title_key):
+                titles.add(word)
+            for word in _WORD.findall(author_key):
+                authors.add(word)
+
+    def book_added(self, title: str, author: str):
+        with self.lock:
+            if self.is_current():
+                for field, text in (('title', title), ('author', author)):
+                    for word in _WORD.findall(search_key(text)):
+                        self._vocabularies[field].add(word)
+                self.local_change()
+
+    def variants(self, field: str, term: str) -> Optional[List[Dict[str, int]]]:
+        """
+        For each word of `term`, the catalog words close enough to it with their distances.
+        None if some word has no close match (so no book can match).
+        """
+        with self.lock:
+            self.sync()
+            query = []
+            for word in _WORD.findall(search_key(term)):
+                matches = self._vocabularies[field].search(word, allowed_typos(word))
+                if not matches:
+                    return None
+                query.append({match: distance for distance, match in matches})
+            return query
+
+
+_index = FuzzyIndex()
+
+
+def fuzzy_search_books(search_term: str, field: str) -> List[Dict]:
+    """
+    Find books whose title or author contains, for every word searched for, a word within
+    allowed_typos() edits of it. At least one of the words must have only close matches of
+    MIN_TRIGRAM_TERM characters or more.
+
+    Returns:
+        list: Matching books, closest first (sum of the edits over the words searched for),
+              then alphabetically by title; empty for an unknown field
+    """
+    if field not in FUZZY_FIELDS:
+        return []
+    query = _index.variants(field, search_term)
+    if not query:
+        return []
+    token_groups = [sorted(close) for close in query]
+    # Without a word whose close matches can all be looked up by trigram, the candidates
+    # would be the whole catalog
+    if not any(min(map(len, tokens)) >= MIN_TRIGRAM_TERM for tokens in token_groups):
+        return []
+
+    results = []
+    for book in get_token_search_candidates(field, token_groups):
+        title_key, author_key = book.pop('title_key'), book.pop('author_key')
+        words = set(_WORD.findall(title_key if field == 'title' else author_key))
+        total = 0
+        for close in query:
+            distance = min((close[word] for word in words if word in close), default=None)
+            if distance is None:
+                break
+            total += distance
+        else:
+            results.append((total, title_key, book['id'], book))
+
+    results.sort(key=lambda result: result[:3])
+    return [book for _, _, _, book in results]
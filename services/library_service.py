@@ -4,14 +4,28 @@ Contains all the core business logic for the Library Management System
 """
 
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 from database import (
     get_all_books, get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
     insert_book, insert_borrow_record, update_book_availability, get_patron_borrowed_books,
-    update_borrow_record_return_date,
+    update_borrow_record_return_date, reopen_borrow_record, get_books_page, search_books_by_key, search_key,
+    get_books_by_isbn_prefix, BOOK_FIELDS, catalog_snapshot, search_books_by_keys, get_books_by_isbn_prefixes,
+    search_books_matching, search_books_matching_many,
 )
+from services.catalog_cache import notify_book_added, notify_book_borrowed
+from services.columnar_catalog import catalog_columns, columnar_enabled
+from services.fuzzy_service import fuzzy_search_books
+from services.query_service import SearchQueryError, parse_search_query
 
-from services.payment_service import PaymentGateway
+if TYPE_CHECKING:
+    # The payment stack (and its HTTP client) is only imported when a payment is made
+    from services.payment_service import PaymentGateway
+
+# Largest page the JSON catalog API will return
+MAX_PAGE_SIZE = 200
+
+# Most searches one search_books_batch() call runs
+MAX_BATCH_SEARCHES = 100
 
 def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
     """
@@ -62,6 +76,7 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
     # Insert new book
     success = insert_book(title.strip(), author.strip(), isbn, total_copies, total_copies)
     if success:
+        notify_book_added(title.strip(), author.strip())
         return True, f'Book "{title.strip()}" has been successfully added to the catalog.'
     else:
         return False, "Database error occurred while adding the book."
@@ -100,15 +115,21 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     borrow_date = datetime.now()
     due_date = borrow_date + timedelta(days=14)
     
-    # Insert borrow record and update availability
-    borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
-    if not borrow_success:
-        return False, "Database error occurred while creating borrow record."
-    
+    # Reserve a copy first: the decrement only applies while a copy is left, so concurrent
+    # borrows of the last copy cannot both succeed
     availability_success = update_book_availability(book_id, -1)
     if not availability_success:
-        return False, "Database error occurred while updating book availability."
+        return False, "This book is currently not available."
     
+    # The insert re-checks the borrowing limit in the same statement; give the copy back if it fails
+    borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date, max_active=5)
+    if not borrow_success:
+        update_book_availability(book_id, +1)
+        if get_patron_borrow_count(patron_id) >= 5:
+            return False, "You have reached the maximum borrowing limit of 5 books."
+        return False, "Database error occurred while creating borrow record."
+    
+    notify_book_borrowed(book['title'], book['author'])
     return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
 
 
@@ -158,16 +179,15 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     # Calculate late fees 
     late_fee_info = calculate_late_fee_for_book(patron_id, book_id)
     
-    # update patron list to mark that one book as returned
-    update_borrow_record_return_date(patron_id, book_id, due_date, datetime.now())
+    # update patron list to mark that one book as returned; fails if a concurrent return closed it first
+    return_date = datetime.now()
+    if not update_borrow_record_return_date(patron_id, book_id, due_date, return_date):
+        return False, "This book was not borrowed."
 
-    # Increase book availability
+    # Increase book availability (refused if it would exceed total copies); reopen the loan if it fails
     availability_success = update_book_availability(book_id, +1)
     if not availability_success:
-        return False, "Database error occurred while updating book availability."
-    
-    #availabile books is not more
-    if book['available_copies'] + 1 > book['total_copies']:
+        reopen_borrow_record(patron_id, book_id, due_date, return_date)
         return False, "Database error: Available copies exceed total copies after return."
     
 
@@ -201,6 +221,47 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
 
 
 
+def calculate_late_fee_for_due_date(due_date: datetime) -> Dict:
+    """
+    Calculate the late fee for a borrow with the given due date, as of now.
+    Used by calculate_late_fee_for_book and by reports that already have the borrow records.
+    
+    Args:
+        due_date: Due date of the borrow
+    
+    Returns:
+        dict: Contains fee amount and days overdue info (same format as calculate_late_fee_for_book)
+    """
+    current_date = datetime.now()
+    
+    # Calculate days overdue
+    if current_date <= due_date:
+        return {'fee_amount': 0.00, 'days_overdue': 0, 'status': 'No late fee. Book is not overdue.'}
+
+    days_overdue = (current_date - due_date).days
+    fee_amount = 0.0
+    
+    # Calculate fee based on overdue days
+    if days_overdue <= 7:
+        # First 7 days: $0.50 per day
+        fee_amount = days_overdue * 0.50
+    else:
+        # First 7 days at $0.50/day
+        fee_amount = 7 * 0.50
+        # Additional days at $1.00/day
+        fee_amount += (days_overdue - 7) * 1.00
+    
+    # Cap fee at maximum $15.00
+    if (fee_amount > 15.00):
+        fee_amount = 15.00
+    
+    return {
+        'fee_amount': round(fee_amount, 2),
+        'days_overdue': days_overdue,
+        'status': 'Late fee calculated, '
+    }
+
+
 def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
     """
     Calculate late fees for a specific book.
@@ -240,35 +301,7 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
     most_recent_borrow = active_borrows[0]
     due_date = most_recent_borrow['due_date']
     
-    current_date = datetime.now()
-  
-    
-    # Calculate days overdue
-    if current_date <= due_date:
-        return {'fee_amount': 0.00, 'days_overdue': 0, 'status': 'No late fee. Book is not overdue.'}
-
-    days_overdue = (current_date - due_date).days
-    fee_amount = 0.0
-    
-    # Calculate fee based on overdue days
-    if days_overdue <= 7:
-        # First 7 days: $0.50 per day
-        fee_amount = days_overdue * 0.50
-    else:
-        # First 7 days at $0.50/day
-        fee_amount = 7 * 0.50
-        # Additional days at $1.00/day
-        fee_amount += (days_overdue - 7) * 1.00
-    
-    # Cap fee at maximum $15.00
-    if (fee_amount > 15.00):
-        fee_amount = 15.00
-    
-    return {
-        'fee_amount': round(fee_amount, 2),
-        'days_overdue': days_overdue,
-        'status': 'Late fee calculated, '
-    }
+    return calculate_late_fee_for_due_date(due_date)
 
 
 
@@ -279,71 +312,195 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
 
 
 
-def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
+def search_books_in_catalog(search_term: str, search_type: str, fuzzy: bool = False) -> List[Dict]:
     """
     Search for books in the catalog.
     Implements R6: Book Search
     
     Args:
         search_term ('q'): The term to search for
-        search_type ('type'): Type of search ('title' or 'author' or 'isbn)
+        search_type ('type'): Type of search ('title' or 'author' or 'isbn' or 'query')
+        fuzzy ('fuzzy'): Tolerate typos in title and author searches
         
     Returns:
         list: List of matching books with their details and availability,
              including books that exist but might not be available for borrowing.
-             Books are sorted with exact matches first, then alphabetically by title.
+             Books are sorted with exact matches first, then alphabetically by title;
+             ISBN results are in ISBN order and capped at ISBN_PREFIX_LIMIT books;
+             fuzzy searches list the substring matches first, then the books
+             only found with typos, sorted by number of typos, then by title;
+             query results are sorted by title.
+    
+    Raises:
+        SearchQueryError: For a 'query' search that cannot be parsed
              
     Search types supported:
-    - Title: Case-insensitive substring match
-    - Author: Case-insensitive substring match
-    - ISBN: Exact prefix match from start of ISBN
+    - Title: Substring match ignoring case, accents and repeated spaces
+    - Author: Substring match ignoring case, accents and repeated spaces
+    - ISBN: Prefix match from the start of the ISBN (1 to 13 digits)
+    - Fuzzy title/author: The substring matches, plus the books where every word matches a
+      word of the title or author with at most 1 typo (words of 3-5 letters) or 2 typos
+      (longer words); a typo is a missing, extra, wrong or swapped letter
+    - Query: Fielded terms that must all match, e.g. title:gatsby author:"scott fitz"
+      available:true isbn:978074* (see services.query_service)
     """
-    if not search_term or not search_term.strip():
+    plan = _plan_search(search_term, search_type)
+    if plan is None:
         return []
-        
-    # Get all books from catalog
-    all_books = get_all_books() # List to hold search results
+    
+    kind, argument = plan
+    if kind == 'key':
+        field, key = argument
+        if columnar_enabled():
+            books = catalog_columns().search(field, key)
+        else:
+            books = search_books_by_key(field, key)
+        if fuzzy:
+            # Allowing typos adds books to the substring matches, it never drops any
+            found = {book['id'] for book in books}
+            books += [book for book in fuzzy_search_books(search_term.strip(), field) if book['id'] not in found]
+        return books
+    if kind == 'isbn':
+        if columnar_enabled():
+            return catalog_columns().isbn_prefix(argument)
+        return get_books_by_isbn_prefix(argument)
+    return search_books_matching(argument.conditions, argument.available)
+
+
+def _plan_search(search_term: str, search_type: str) -> Optional[Tuple[str, object]]:
+    """
+    Validate a search and reduce it to what the database helpers need: ('key', (field, key))
+    for a title or author search, ('isbn', prefix), or ('query', SearchQuery).
+    None if the search cannot match anything; SearchQueryError for an invalid query.
+    """
+    if not search_term or not search_term.strip():
+        return None
     
     # Clean up search term for each new search when selected
     search_term = search_term.strip()
-    results = []
-    
-    for book in all_books:
-        if search_type == 'title':
-            # Case-insensitive substring match for title
-            if search_term.lower() in book['title'].lower() and len(search_term) <= 200:
-                results.append(book)
-        elif search_type == 'author':
-            # Case-insensitive substring match for author
-            if search_term.lower() in book['author'].lower() and len(search_term) <= 100:
-                results.append(book)
-        elif search_type == 'isbn':
-            # Exact match from start for ISBN
-            if book['isbn'] == search_term and len(search_term) == 13 and search_term.isdigit():
-                results.append(book)
-            
-    # First sort alphabetically by title
-    results.sort(key=lambda x: x['title'].lower())
-    
-    # Then move exact matches to the front
-    if search_type in ['title', 'author']:
-        # For title/author searches, check for exact match in the respective field
-        matches = []
-        field_name = 'title' if search_type == 'title' else 'author'
+    
+    if search_type in ('title', 'author'):
+        if len(search_term) > (200 if search_type == 'title' else 100):
+            return None
         
-        for book in results:
-            if book[field_name].lower() in search_term.lower():
-                matches.append(book)
+        # Compare the normalized term with the stored title_key / author_key
+        key = search_key(search_term)
+        return ('key', (search_type, key)) if key else None
+    
+    if search_type == 'isbn':
+        # Prefix of a 13-digit ISBN, e.g. a partial barcode scan
+        if len(search_term) > 13 or not search_term.isdigit():
+            return None
+        return ('isbn', search_term)
+    
+    if search_type == 'query':
+        return ('query', parse_search_query(search_term))
+    
+    return None
+
+
+def search_books_batch(searches: List[Tuple[str, str]]) -> Dict[str, Dict]:
+    """
+    Run many searches at once, e.g. to resolve a reading list.
+    
+    Each search gives the same books as search_books_in_catalog(q, type) without fuzzy
+    matching, but all of them run in one transaction on one connection, so they read the same
+    snapshot of the catalog. Each search still runs its own lookup; the title and author
+    searches, the ISBN searches and the query searches are sent as one UNION ALL statement each.
+    
+    Args:
+        searches: (q, type) pairs, at most MAX_BATCH_SEARCHES
+        
+    Returns:
+        dict: For each distinct search, keyed 'type:q' (q stripped) in the order given,
+              {'results': books, 'count': n}, or {'error': message} for an invalid query
+    """
+    results = {}
+    batches = {'key': [], 'isbn': [], 'query': []}
+    for search_term, search_type in searches:
+        name = f'{search_type}:{(search_term or "").strip()}'
+        if name in results:
+            continue
+        results[name] = {'results': [], 'count': 0}
+        try:
+            plan = _plan_search(search_term, search_type)
+        except SearchQueryError as error:
+            results[name] = {'error': str(error)}
+            continue
+        if plan is not None:
+            kind, argument = plan
+            if kind == 'query':
+                argument = (argument.conditions, argument.available)
+            batches[kind].append((name, argument))
+    
+    with catalog_snapshot():
+        for kind, helper in (('key', search_books_by_keys), ('isbn', get_books_by_isbn_prefixes),
+                             ('query', search_books_matching_many)):
+            names = [name for name, _ in batches[kind]]
+            for name, books in zip(names, helper([argument for _, argument in batches[kind]])):
+                results[name] = {'results': books, 'count': len(books)}
+    return results
+
+
+def get_catalog_books() -> List[Dict]:
+    """
+    Get every book for the catalog display, ordered by title.
+    Implements R2: Book Catalog Display
+    
+    Returns:
+        list: All books, from the columnar snapshot when it is enabled
+    """
+    if columnar_enabled():
+        return catalog_columns().all_books()
+    return get_all_books()
 
 
-    elif search_type == 'isbn':
-        # For ISBN searches, check for exact ISBN match
-        matches = []
-        for book in results:
-            if book['isbn'] == search_term:
-                matches.append(book)
+def get_catalog_page(fields: Optional[List[str]] = None, cursor: int = 0, limit: int = 50,
+                     available: Optional[bool] = None) -> Dict:
+    """
+    Get one page of the catalog for the JSON API.
+    Pages are ordered by book ID and continue from the ID given as the cursor.
     
-    return matches
+    Args:
+        fields: Book columns to return (all columns if empty)
+        cursor: ID of the last book on the previous page (0 for the first page)
+        limit: Page size (1-200)
+        available: True for available books only, False for unavailable only, None for all
+        
+    Returns:
+        dict: 
+            books: list of books containing only the requested fields
+            next_cursor: cursor for the next page, or None on the last page
+            error: present instead of books if the request is invalid
+    """
+    if not fields:
+        fields = list(BOOK_FIELDS)
+
+    unknown = [field for field in fields if field not in BOOK_FIELDS]
+    if unknown:
+        return {'error': f"Unknown field(s): {', '.join(unknown)}."}
+
+    if not isinstance(limit, int) or limit < 1 or limit > MAX_PAGE_SIZE:
+        return {'error': f"Limit must be between 1 and {MAX_PAGE_SIZE}."}
+
+    if not isinstance(cursor, int) or cursor < 0:
+        return {'error': "Invalid cursor."}
+
+    # The ID is always selected so the next cursor can be computed,
+    # and one extra row tells us whether another page exists
+    if columnar_enabled():
+        books = catalog_columns().page(['id'] + fields, cursor, limit + 1, available)
+    else:
+        books = get_books_page(['id'] + fields, cursor, limit + 1, available)
+    has_more = len(books) > limit
+    books = books[:limit]
+    next_cursor = books[-1]['id'] if has_more else None
+
+    if 'id' not in fields:
+        for book in books:
+            del book['id']
+
+    return {'books': books, 'next_cursor': next_cursor}
 
 
 
@@ -381,9 +538,15 @@ def get_patron_status_report(patron_id: str) -> Dict:
     total_fees = 0.00
     overdue_count = 0
     
+    # Fees are charged on the most recent borrow of each book (as in calculate_late_fee_for_book),
+    # computed from the records already loaded instead of querying again for every book
+    latest_due_dates = {}
+    for book in sorted(current_borrows, key=lambda x: x['borrow_date']):
+        latest_due_dates[book['book_id']] = book['due_date']
+
     for book in current_borrows:
         # Calculate late fee for each book
-        fee_info = calculate_late_fee_for_book(patron_id, book['book_id'])
+        fee_info = calculate_late_fee_for_due_date(latest_due_dates[book['book_id']])
         if fee_info['days_overdue'] > 0:
             overdue_count += 1
             total_fees += fee_info['fee_amount']
@@ -398,7 +561,7 @@ def get_patron_status_report(patron_id: str) -> Dict:
 
 
 
-def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway = None) -> Tuple[bool, str, Optional[str]]:
+def pay_late_fees(patron_id: str, book_id: int, payment_gateway: 'PaymentGateway' = None) -> Tuple[bool, str, Optional[str]]:
     """
     Process payment for late fees using external payment gateway.
     
@@ -442,6 +605,7 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
     
     # Use provided gateway or create new one
     if payment_gateway is None:
+        from services.payment_service import PaymentGateway
         payment_gateway = PaymentGateway()
     
     # Process payment through external gateway
@@ -463,7 +627,7 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
         return False, f"Payment processing error: {str(e)}", None
 
 
-def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway = None) -> Tuple[bool, str]:
+def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: 'PaymentGateway' = None) -> Tuple[bool, str]:
     """
     Refund a late fee payment (e.g., if book was returned on time but fees were charged in error).
     
@@ -489,6 +653,7 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
     
     # Use provided gateway or create new one
     if payment_gateway is None:
+        from services.payment_service import PaymentGateway
         payment_gateway = PaymentGateway()
     
     # Process refund through external gateway
@@ -10,6 +10,8 @@ import requests
 from typing import Dict, Tuple
 import time
 
+from metrics import PAYMENT_GATEWAY_DURATION
+
 
 class PaymentGateway:
     """
@@ -32,6 +34,7 @@ class PaymentGateway:
         self.api_key = api_key
         self.base_url = "https://api.payment-gateway.example.com"
     
+    @PAYMENT_GATEWAY_DURATION.time(operation='process_payment')
     def process_payment(self, patron_id: str, amount: float, description: str = "") -> Tuple[bool, str, str]:
         """
         Process a payment through the external gateway.
@@ -82,6 +85,7 @@ class PaymentGateway:
         transaction_id = f"txn_{patron_id}_{int(time.time())}"
         return True, transaction_id, f"Payment of ${amount:.2f} processed successfully"
     
+    @PAYMENT_GATEWAY_DURATION.time(operation='refund_payment')
     def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
         """
         Refund a previous payment.
@@ -107,6 +111,7 @@ class PaymentGateway:
         refund_id = f"refund_{transaction_id}_{int(time.time())}"
         return True, f"Refund of ${amount:.2f} processed successfully. Refund ID: {refund_id}"
     
+    @PAYMENT_GATEWAY_DURATION.time(operation='verify_payment_status')
     def verify_payment_status(self, transaction_id: str) -> Dict:
         """
         Check the status of a payment transaction.
@@ -0,0 +1,114 @@
+"""
+Query Service Module - Fielded search queries
+Parses queries such as `title:gatsby author:"scott fitz" available:true isbn:978074*` once,
+validates them and reduces them to the conditions of search_books_matching(), which answers
+the whole query with one parameterized SQL statement over the trigram and ISBN indexes.
+
+Syntax: space-separated terms, all of which must match.
+- title:WORDS / author:WORDS - substring of the title / author (ignoring case, accents and spaces)
+- isbn:DIGITS - the whole 13-digit ISBN; isbn:DIGITS* - ISBNs starting with DIGITS
+- available:true / available:false - books with / without a copy on the shelf
+- WORDS - substring of the title or the author
+Values containing spaces are quoted: title:"great gatsby".
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+from database import search_key
+
+QUERY_FIELDS = ('title', 'author', 'isbn', 'available')
+
+MAX_QUERY_LENGTH = 500
+MAX_QUERY_TERMS = 10
+
+# Longest title / author values, as for title and author searches
+_VALUE_LIMITS = {'title': 200, 'author': 100, None: 200}
+
+_AVAILABLE_VALUES = {'true': True, 'yes': True, '1': True, 'false': False, 'no': False, '0': False}
+
+# An optional "field:" followed by a quoted or unquoted value
+_TERM = re.compile(r'(?:(\w+):)?(?:"([^"]*)"|(\S+))')
+
+
+class SearchQueryError(ValueError):
+    """A search query that cannot be parsed; the message is meant for the user."""
+
+
+class SearchQuery:
+    """A parsed query: (kind, value) conditions for search_books_matching() and the availability filter."""
+
+    def __init__(self, conditions: List[Tuple[str, str]], available: Optional[bool] = None):
+        self.conditions = conditions
+        self.available = available
+
+
+def parse_search_query(query: str) -> SearchQuery:
+    """
+    Parse a fielded search query.
+
+    Raises:
+        SearchQueryError: With a message saying what is wrong with the query
+    """
+    query = (query or '').strip()
+    if not query:
+        raise SearchQueryError("Search query is empty.")
+    if len(query) > MAX_QUERY_LENGTH:
+        raise SearchQueryError(f"Search query must be at most {MAX_QUERY_LENGTH} characters.")
+
+    terms = []
+    position = 0
+    while position < len(query):
+        if query[position].isspace():
+            position += 1
+            continue
+        match = _TERM.match(query, position)
+        if match is None or match.end() < len(query) and not query[match.end()].isspace():
+            raise SearchQueryError(f"Cannot read the search query from: {query[position:]}")
+        terms.append(match)
+        position = match.end()
+    if len(terms) > MAX_QUERY_TERMS:
+        raise SearchQueryError(f"Search query can have at most {MAX_QUERY_TERMS} terms.")
+
+    conditions, available = [], None
+    for term in terms:
+        field, quoted, bare = term.group(1), term.group(2), term.group(3)
+        value = quoted if quoted is not None else bare
+        if field is None and quoted is None and bare.endswith(':') and bare[:-1].isalnum():
+            raise SearchQueryError(f"No value given for '{bare[:-1]}'.")
+        if field is not None:
+            field = field.lower()
+            if field not in QUERY_FIELDS:
+                raise SearchQueryError(
+                    f"Unknown search field '{field}'. Use one of: {', '.join(QUERY_FIELDS)}.")
+        value = value.strip()
+        if not value:
+            raise SearchQueryError(f"No value given for '{field}'." if field else "Empty quoted search term.")
+
+        if field == 'isbn':
+            digits = value[:-1] if value.endswith('*') else value
+            if not digits.isdigit() or len(digits) > 13:
+                raise SearchQueryError("ISBN must be up to 13 digits, optionally ending with * for a prefix.")
+            if value.endswith('*'):
+                conditions.append(('isbn_prefix', digits))
+            elif len(digits) != 13:
+                raise SearchQueryError(f"ISBN {digits} is not 13 digits; search isbn:{digits}* for a prefix.")
+            else:
+                conditions.append(('isbn', digits))
+        elif field == 'available':
+            flag = _AVAILABLE_VALUES.get(value.lower())
+            if flag is None:
+                raise SearchQueryError("available must be true or false.")
+            if available is not None and available != flag:
+                raise SearchQueryError("available cannot be both true and false.")
+            available = flag
+        else:
+            if len(value) > _VALUE_LIMITS[field]:
+                raise SearchQueryError(
+                    f"{(field or 'search term').capitalize()} must be at most {_VALUE_LIMITS[field]} characters.")
+            key = search_key(value)
+            if not key:
+                raise SearchQueryError(f"No value given for '{field}'." if field else "Empty quoted search term.")
+            conditions.append((field or 'any', key))
+
+    return SearchQuery(conditions, available)
@@ -0,0 +1,155 @@
+"""
+Suggest Service Module - Typeahead suggestions for titles and authors
+Keeps the normalized titles and authors in sorted in-memory arrays, so a prefix is two
+bisections instead of a catalog scan, and ranks matches by popularity (times borrowed).
+
+The index is built once per process (at app startup, or on the first request) and kept in
+step with the catalog by CatalogCache; borrows are counted in place when this process records
+them, while borrows made by other processes only reach the ranking with the next rebuild.
+"""
+
+import heapq
+from bisect import bisect_left, insort
+from typing import Dict, List
+
+from database import get_all_books, get_book_borrow_counts, search_key
+from services.catalog_cache import CatalogCache
+
+SUGGEST_FIELDS = ('title', 'author')
+
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 20
+
+# Prefixes matching more entries than this keep a cached top list instead of scanning them
+SCAN_LIMIT = 256
+
+# Sorts after every character, so prefix + _HIGHEST bounds the keys starting with prefix
+_HIGHEST = '\U0010ffff'
+
+
+class PrefixIndex:
+    """The distinct values of one field, sorted by normalized key, with their popularity."""
+
+    def __init__(self):
+        self.keys: List[str] = []
+        # key -> [display text, popularity]
+        self.entries: Dict[str, list] = {}
+        # prefix -> its MAX_SUGGESTIONS best keys, for prefixes with more than SCAN_LIMIT matches
+        self.top: Dict[str, List[str]] = {}
+
+    def load(self, values: Dict[str, int]):
+        """Replace the contents with display text -> popularity."""
+        self.entries = {}
+        for text, popularity in values.items():
+            key = search_key(text)
+            if key:
+                entry = self.entries.setdefault(key, [text.strip(), 0])
+                entry[1] += popularity
+        self.keys = sorted(self.entries)
+        self.top = {}
+
+    def _rank(self, key: str):
+        return -self.entries[key][1], key
+
+    def suggest(self, prefix: str, limit: int) -> List[Dict]:
+        """The `limit` most popular entries starting with the normalized `prefix`."""
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + _HIGHEST, lo)
+        if hi - lo > SCAN_LIMIT:
+            best = self.top.get(prefix)
+            if best is None:
+                best = self.top[prefix] = heapq.nsmallest(MAX_SUGGESTIONS, self.keys[lo:hi], key=self._rank)
+        else:
+            best = heapq.nsmallest(limit, self.keys[lo:hi], key=self._rank)
+        return [{'text': self.entries[key][0], 'popularity': self.entries[key][1]} for key in best[:limit]]
+
+    def add(self, text: str, popularity: int = 0):
+        """Add `popularity` to an entry, creating it if needed."""
+        key = search_key(text)
+        if not key:
+            return
+        entry = self.entries.get(key)
+        if entry is None:
+            self.entries[key] = [text.strip(), popularity]
+            insort(self.keys, key)
+        elif popularity:
+            entry[1] += popularity
+        else:
+            return
+
+        # Popularity only grows, so the new top lists are the old ones plus this key
+        for end in range(1, len(key) + 1):
+            best = self.top.get(key[:end])
+            if best is not None:
+                if key not in best:
+                    best.append(key)
+                best.sort(key=self._rank)
+                del best[MAX_SUGGESTIONS:]
+
+
+class CatalogSuggester(CatalogCache):
+    """Title and author prefix indexes for the current database, kept in step with the catalog."""
+
+    def __init__(self):
+        super().__init__()
+        self._indexes: Dict[str, PrefixIndex] = {}
+
+    def load(self):
+        borrows = get_book_borrow_counts()
+        values = {field: {} for field in SUGGEST_FIELDS}
+        for book in get_all_books():
+            for field in SUGGEST_FIELDS:
+                values[field][book[field]] = values[field].get(book[field], 0) + borrows.get(book['id'], 0)
+        indexes = {field: PrefixIndex() for field in SUGGEST_FIELDS}
+        for field in SUGGEST_FIELDS:
+            indexes[field].load(values[field])
+        self._indexes = indexes
+
+    def build(self):
+        with self.lock:
+            self.sync()
+
+    def suggest(self, prefix: str, field: str, limit: int) -> List[Dict]:
+        with self.lock:
+            self.sync()
+            return self._indexes[field].suggest(prefix, limit)
+
+    def book_added(self, title: str, author: str):
+        with self.lock:
+            if self.is_current():
+                self._indexes['title'].add(title)
+                self._indexes['author'].add(author)
+                self.local_change()
+
+    def book_borrowed(self, title: str, author: str):
+        with self.lock:
+            if self.is_current():
+                self._indexes['title'].add(title, 1)
+                self._indexes['author'].add(author, 1)
+
+
+_suggester = CatalogSuggester()
+
+
+def build_suggestions():
+    """Build the suggestion index for the current database now instead of on the first request."""
+    _suggester.build()
+
+
+def suggest_books(prefix: str, field: str = 'title', limit: int = DEFAULT_SUGGESTIONS) -> List[Dict]:
+    """
+    Suggest titles or authors starting with `prefix`, most borrowed first.
+
+    Args:
+        prefix: What the user has typed so far (matched by search_key, ignoring case, accents and extra spaces)
+        field: 'title' or 'author'
+        limit: Number of suggestions, at most MAX_SUGGESTIONS
+
+    Returns:
+        list: Dicts with the suggestion 'text' and its 'popularity'; empty for an unknown field
+    """
+    key = search_key(prefix or '')
+    if not key or field not in SUGGEST_FIELDS:
+        return []
+    return _suggester.suggest(key, field, max(1, min(limit, MAX_SUGGESTIONS)))
+
@@ -0,0 +1,144 @@
+import sqlite3
+
+import pytest
+
+from benchmarks import bench_columnar
+from benchmarks.bench_services import percentile, run_benchmarks
+from app import create_app
+from benchmarks.compare import compare, median_confidence_interval
+from benchmarks.datagen import generate_dataset
+from benchmarks.loadtest import AppTarget, check_consistency, parse_mix, run_load
+from clearDB import clear_database
+import database
+
+
+def test_percentile_nearest_rank():
+    """Test nearest-rank percentiles on a sorted list"""
+    values = [float(n) for n in range(1, 101)]
+    assert percentile(values, 0.50) == 50.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([], 0.5) == 0.0
+
+
+def test_service_benchmarks_report_every_function():
+    """Test that a small benchmark run reports each service function and restores the database path"""
+    original = database.DATABASE
+    report = run_benchmarks(sizes=[200], max_ops=3, max_seconds=1, log=lambda line: None)
+
+    functions = {result['function'] for result in report['results']}
+    assert 'borrow_book_by_patron' in functions
+    assert 'search_books_in_catalog[title]' in functions
+    assert all(result['size'] == 200 and result['ops'] == 3 for result in report['results'])
+    assert report['environment']['sqlite']
+    assert database.DATABASE == original
+
+
+def test_columnar_benchmark_compares_each_read():
+    """Test that a small columnar run times every read on both paths and restores the settings"""
+    original = database.DATABASE
+    report = bench_columnar.run_benchmarks(sizes=[200], max_ops=2, max_seconds=1, log=lambda line: None)
+
+    reads = {result['read'] for result in report['results']}
+    assert {'get_catalog_books', 'search[title]', 'get_catalog_page[available]'} <= reads
+    assert all(result['sqlite_p50_ms'] > 0 and result['columnar_p50_ms'] > 0 for result in report['results'])
+    snapshot = report['snapshots'][0]
+    assert snapshot['size'] == 200 and snapshot['memory']['total'] > 0
+    assert database.DATABASE == original
+
+
+def test_datagen_is_deterministic_and_consistent(tmp_path):
+    """Test that the generator is reproducible and keeps available copies in line with active loans"""
+    first = generate_dataset(str(tmp_path / 'a.db'), books=500, patrons=50, loans=2000, seed=7)
+    generate_dataset(str(tmp_path / 'b.db'), books=500, patrons=50, loans=2000, seed=7)
+
+    def dump(name):
+        conn = sqlite3.connect(str(tmp_path / name))
+        rows = conn.execute('SELECT * FROM books ORDER BY id').fetchall()
+        conn.close()
+        return rows
+
+    assert dump('a.db') == dump('b.db')
+    assert first['books'] == 500 and first['loans'] == 2000
+
+    conn = sqlite3.connect(str(tmp_path / 'a.db'))
+    mismatched = conn.execute('''
+        SELECT COUNT(*) FROM books b
+        WHERE b.available_copies != b.total_copies -
+              (SELECT COUNT(*) FROM borrow_records r WHERE r.book_id = b.id AND r.return_date IS NULL)
+           OR b.available_copies < 0
+    ''').fetchone()[0]
+    max_active = conn.execute('''
+        SELECT MAX(n) FROM (SELECT COUNT(*) AS n FROM borrow_records WHERE return_date IS NULL GROUP BY patron_id)
+    ''').fetchone()[0]
+    conn.close()
+    assert mismatched == 0
+    assert max_active <= 5
+
+
+def test_datagen_refuses_to_overwrite(tmp_path):
+    """Test that an existing database is only replaced when asked to"""
+    path = str(tmp_path / 'library.db')
+    generate_dataset(path, books=10, patrons=5, loans=10)
+    with pytest.raises(FileExistsError):
+        generate_dataset(path, books=10, patrons=5, loans=10)
+    assert generate_dataset(path, books=20, patrons=5, loans=10, overwrite=True)['books'] == 20
+
+
+def test_load_test_in_process_reports_each_operation():
+    """Test that a short in-process load run reports every request type and passes the consistency check"""
+    app = create_app()
+    try:
+        report = run_load(AppTarget(app), clients=3, requests_per_client=15, duration=30,
+                          mix={'borrow': 3, 'return': 2, 'status': 1, 'search': 1})
+        assert report['requests'] == 45
+        assert report['errors'] == 0
+        assert set(report['operations']) <= {'borrow', 'return', 'status', 'search'}
+        assert report['operations']['borrow']['statuses'] == {'302': report['operations']['borrow']['requests']}
+        assert check_consistency(database.DATABASE)['ok']
+    finally:
+        clear_database()
+
+
+def test_consistency_check_flags_lost_updates(tmp_path):
+    """Test that a copy count out of line with the active loans is reported"""
+    path = str(tmp_path / 'library.db')
+    generate_dataset(path, books=50, patrons=10, loans=100)
+    assert check_consistency(path)['ok']
+
+    conn = sqlite3.connect(path)
+    conn.execute('UPDATE books SET available_copies = available_copies - 1 WHERE id = 7')
+    conn.commit()
+    conn.close()
+
+    result = check_consistency(path)
+    assert not result['ok']
+    assert [book['id'] for book in result['books']] == [7]
+
+
+def test_parse_mix_rejects_unknown_operations():
+    """Test parsing of the request mix"""
+    assert parse_mix('borrow=3,return=1') == {'borrow': 3.0, 'return': 1.0}
+    with pytest.raises(ValueError):
+        parse_mix('delete=1')
+
+
+def test_median_confidence_interval_uses_order_statistics():
+    """Test the distribution-free median interval for small and larger samples"""
+    assert median_confidence_interval([5, 1, 3, 2, 4]) == (1, 5)
+    assert median_confidence_interval(list(range(1, 11))) == (2, 9)
+
+
+def test_compare_needs_slowdown_beyond_noise():
+    """Test that only slowdowns above the threshold with non-overlapping intervals count as regressions"""
+    baseline = {
+        'search': {'median_ms': 10.0, 'low_ms': 9.0, 'high_ms': 11.0},
+        'borrow': {'median_ms': 2.0, 'low_ms': 1.0, 'high_ms': 4.0},
+        'status': {'median_ms': 1.0, 'low_ms': 0.9, 'high_ms': 1.1},
+    }
+    current = {
+        'search': {'median_ms': 30.0, 'low_ms': 28.0, 'high_ms': 33.0},
+        'borrow': {'median_ms': 3.0, 'low_ms': 2.0, 'high_ms': 5.0},
+        'return': {'median_ms': 1.0, 'low_ms': 0.9, 'high_ms': 1.1},
+    }
+    verdicts = {row['benchmark']: row['verdict'] for row in compare(baseline, current, threshold=0.25)}
+    assert verdicts == {'search': 'regressed', 'borrow': 'unchanged', 'status': 'missing', 'return': 'new'}
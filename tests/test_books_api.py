@@ -0,0 +1,60 @@
+import pytest
+
+from app import create_app
+from clearDB import clear_database
+from services.library_service import add_book_to_catalog, borrow_book_by_patron, get_catalog_page
+
+
+@pytest.fixture
+def client():
+    app = create_app()
+    clear_database()
+    for i in range(1, 6):
+        add_book_to_catalog(f"Page Book {i}", "Page Author", f"100000000000{i}", 1)
+    borrow_book_by_patron("123456", 2)  # book 2 is now unavailable
+    yield app.test_client()
+    clear_database()
+
+
+def test_first_page_and_cursor(client):
+    """Test that pages follow each other through the cursor without gaps"""
+    first = client.get('/api/books?limit=2').get_json()
+    assert [book['id'] for book in first['books']] == [1, 2]
+    assert first['next_cursor'] == 2
+
+    second = client.get(f"/api/books?limit=2&cursor={first['next_cursor']}").get_json()
+    assert [book['id'] for book in second['books']] == [3, 4]
+
+    last = client.get(f"/api/books?limit=2&cursor={second['next_cursor']}").get_json()
+    assert [book['id'] for book in last['books']] == [5]
+    assert last['next_cursor'] is None
+
+
+def test_fields_projection(client):
+    """Test that only the requested fields are returned"""
+    data = client.get('/api/books?fields=title,isbn').get_json()
+    assert data['count'] == 5
+    assert set(data['books'][0]) == {'title', 'isbn'}
+
+
+def test_available_filter(client):
+    """Test filtering by availability"""
+    available = client.get('/api/books?available=true&fields=id').get_json()
+    assert [book['id'] for book in available['books']] == [1, 3, 4, 5]
+
+    unavailable = client.get('/api/books?available=false&fields=id').get_json()
+    assert [book['id'] for book in unavailable['books']] == [2]
+
+
+def test_invalid_parameters(client):
+    """Test rejecting unknown fields, bad limits and bad filters"""
+    assert client.get('/api/books?fields=title,password').status_code == 400
+    assert client.get('/api/books?limit=0').status_code == 400
+    assert client.get('/api/books?limit=abc').status_code == 400
+    assert client.get('/api/books?available=maybe').status_code == 400
+
+
+def test_get_catalog_page_limit_too_large():
+    """Test that the service rejects page sizes above the maximum"""
+    page = get_catalog_page(limit=10000)
+    assert 'error' in page
@@ -0,0 +1,139 @@
+import sqlite3
+
+import pytest
+
+import database
+from app import create_app
+from metrics import DB_QUERIES, REGISTRY
+from query_budget import assert_max_queries
+from services import columnar_catalog
+from services.columnar_catalog import ColumnarCatalog, catalog_columns
+from services.library_service import (
+    add_book_to_catalog, borrow_book_by_patron, get_catalog_books, get_catalog_page, return_book_by_patron,
+    search_books_in_catalog,
+)
+
+
+@pytest.fixture(params=['numpy', 'array'])
+def columnar(request, monkeypatch):
+    """The columnar snapshot enabled, with NumPy columns or with array.array columns"""
+    if request.param == 'numpy' and columnar_catalog.np is None:
+        pytest.skip("numpy is not installed")
+    if request.param == 'array':
+        monkeypatch.setattr(columnar_catalog, 'np', None)
+    monkeypatch.setenv('LIBRARY_COLUMNAR_CATALOG', '1')
+    # Rebuild for this test's database and column type
+    monkeypatch.setattr(columnar_catalog, '_catalog', ColumnarCatalog())
+
+
+@pytest.fixture
+def catalog():
+    for i, (title, author) in enumerate([
+        ("The Great Gatsby", "F. Scott Fitzgerald"), ("Great", "Anonymous"), ("Émile", "Jean-Jacques Rousseau"),
+        ("Great Expectations", "Charles Dickens"), ("Bleak House", "Charles Dickens"), ("Mock", "Ann Mock"),
+        ("To Kill a Mockingbird", "Harper Lee"), ("great", "Anonymous"),
+    ]):
+        add_book_to_catalog(title, author, f"97800000000{i:02d}", 1 + i % 2)
+    for book_id in (1, 4, 5):
+        assert borrow_book_by_patron("123456", book_id)[0]
+
+
+READS = [
+    lambda: get_catalog_books(),
+    lambda: search_books_in_catalog("great", "title"),
+    lambda: search_books_in_catalog("GREAT", "title"),
+    lambda: search_books_in_catalog("ck", "title"),
+    lambda: search_books_in_catalog("Charles", "author"),
+    lambda: search_books_in_catalog("emile", "title"),
+    lambda: search_books_in_catalog("nothing", "author"),
+    lambda: search_books_in_catalog("978000000000", "isbn"),
+    lambda: search_books_in_catalog("97800000000", "isbn"),
+    lambda: get_catalog_page(limit=3, cursor=2),
+    lambda: get_catalog_page(fields=['title', 'available_copies'], limit=3, available=True),
+    lambda: get_catalog_page(limit=2, cursor=1, available=False),
+    lambda: get_catalog_page(limit=200, available=True),
+]
+
+
+def test_snapshot_matches_sqlite(catalog, columnar, monkeypatch):
+    """Test that every read served from the snapshot returns exactly what SQLite returns"""
+    from_snapshot = [read() for read in READS]
+    monkeypatch.setenv('LIBRARY_COLUMNAR_CATALOG', '0')
+    assert from_snapshot == [read() for read in READS]
+    assert [book['title'] for book in from_snapshot[1]] == [
+        "Great", "great", "Great Expectations", "The Great Gatsby"]
+
+
+def test_copy_changes_are_patched_in_place(catalog, columnar, mocker):
+    """Test that borrows, returns and updates from other connections are applied without a rebuild"""
+    catalog_columns()
+    load = mocker.spy(ColumnarCatalog, 'load')
+
+    assert borrow_book_by_patron("234567", 2)[0]
+    assert return_book_by_patron("123456", 1)[0]
+    conn = sqlite3.connect(database.DATABASE)
+    conn.execute("UPDATE books SET total_copies = 5, available_copies = 4 WHERE id = 6")
+    conn.commit()
+    conn.close()
+
+    books = {book['id']: book for book in get_catalog_books()}
+    assert books[2]['available_copies'] == 1
+    assert books[1]['available_copies'] == 1
+    assert (books[6]['total_copies'], books[6]['available_copies']) == (5, 4)
+    assert load.call_count == 0
+
+
+def test_new_and_renamed_books_rebuild(catalog, columnar, mocker):
+    """Test that additions and renames, which change the columns' order, rebuild the snapshot"""
+    catalog_columns()
+    load = mocker.spy(ColumnarCatalog, 'load')
+
+    assert add_book_to_catalog("Great Circle", "Maggie Shipstead", "9780000000099", 1)[0]
+    assert [book['title'] for book in search_books_in_catalog("great c", "title")] == ["Great Circle"]
+    assert load.call_count == 1
+
+    conn = sqlite3.connect(database.DATABASE)
+    conn.execute("UPDATE books SET title = 'Hard Times', title_key = 'hard times' WHERE id = 5")
+    conn.commit()
+    conn.close()
+    assert [book['id'] for book in search_books_in_catalog("hard", "title")] == [5]
+    assert load.call_count == 2
+
+
+def test_reads_skip_sqlite_and_memory_is_accounted(catalog, columnar):
+    """Test that snapshot reads run no counted SQL statements, and the memory report"""
+    catalog_columns()
+    with assert_max_queries(0):
+        assert len(get_catalog_books()) == 8
+        assert search_books_in_catalog("mock", "title")[0]['title'] == "Mock"
+
+    usage = catalog_columns().memory_usage()
+    assert usage['total'] == sum(size for column, size in usage.items() if column != 'total')
+    assert usage['title_key'] > 0 and usage['available_copies'] >= 8 * 8
+
+
+def test_snapshot_statements_are_measured_but_not_budgeted(catalog, columnar):
+    """Test that loading the snapshot shows up in the metrics and the SQL trace, outside query budgets"""
+    REGISTRY.reset()
+    database.get_sql_trace(clear=True)
+    database.enable_sql_trace(slow_query_ms=None)
+    try:
+        with assert_max_queries(0):
+            assert len(get_catalog_books()) == 8
+    finally:
+        database.disable_sql_trace()
+    assert DB_QUERIES.value(helper='get_catalog_version') == 1
+    assert DB_QUERIES.value(helper='get_snapshot_rows') == 1
+    assert {entry['helper'] for entry in database.get_sql_trace(clear=True)} >= {
+        'get_catalog_version', 'get_change_counter', 'get_snapshot_rows'}
+
+
+def test_catalog_routes_use_snapshot(catalog, columnar):
+    """Test the catalog page and API with the snapshot enabled through the app config"""
+    app = create_app(init_db=False)
+    app.config['COLUMNAR_CATALOG'] = True
+    client = app.test_client()
+
+    assert b"Bleak House" in client.get('/catalog').data
+    data = client.get('/api/books?available=false&fields=title').get_json()
+    assert [book['title'] for book in data['books']] == ["The Great Gatsby", "Bleak House"]
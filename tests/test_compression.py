@@ -0,0 +1,68 @@
+import gzip
+import json
+
+import pytest
+
+from app import create_app
+from clearDB import clear_database
+from compression import brotli, choose_encoding
+from services.library_service import add_book_to_catalog
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+
+@pytest.fixture
+def app():
+    app = create_app()
+    clear_database()
+    add_book_to_catalog("Compressed Book", "Test Author", "1234567890123", 2)
+    yield app
+    clear_database()
+
+
+def test_catalog_page_gzip(app):
+    """Test that a large HTML page is gzipped when the client accepts gzip"""
+    client = app.test_client()
+    response = client.get('/catalog', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert b'Compressed Book' in gzip.decompress(response.get_data())
+
+
+def test_no_compression_without_accept_encoding(app):
+    """Test that responses are left alone when the client does not ask for compression"""
+    response = app.test_client().get('/catalog')
+    assert 'Content-Encoding' not in response.headers
+    assert b'Compressed Book' in response.get_data()
+
+
+def test_small_body_not_compressed(app):
+    """Test that bodies under the size threshold are not compressed"""
+    response = app.test_client().get('/api/search?q=x', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_streamed_response_compressed(app):
+    """Test that streamed exports are compressed chunk by chunk"""
+    response = app.test_client().get('/api/books/export?format=ndjson', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    rows = gzip.decompress(response.get_data()).decode('utf-8').splitlines()
+    assert json.loads(rows[0])['isbn'] == "1234567890123"
+
+
+def test_compressed_variant_cached(app):
+    """Test that repeated identical pages reuse the cached compressed body"""
+    client = app.test_client()
+    first = client.get('/catalog', headers={'Accept-Encoding': 'gzip'})
+    second = client.get('/catalog', headers={'Accept-Encoding': 'gzip'})
+    assert first.get_data() == second.get_data()
+    assert len(app.extensions['compression_cache']) == 1
+
+
+def test_choose_encoding_respects_quality():
+    """Test that encodings with q=0 are never chosen"""
+    assert choose_encoding(parse_accept_header('gzip;q=0, identity', Accept)) is None
+    assert choose_encoding(parse_accept_header('deflate, gzip;q=0.5', Accept)) == 'gzip'
+    if brotli is not None:
+        assert choose_encoding(parse_accept_header('gzip, br', Accept)) == 'br'
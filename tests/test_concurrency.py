@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+from benchmarks.stress import run_stress
+from clearDB import clear_database
+from services.library_service import add_book_to_catalog, borrow_book_by_patron
+import database
+
+
+def test_availability_update_stays_within_bounds():
+    """Test that available copies can't drop below 0 or rise above total copies"""
+    clear_database()
+    add_book_to_catalog("Bounded Book", "Test Author", "1234567890123", 1)
+
+    assert database.update_book_availability(1, -1) is True
+    assert database.update_book_availability(1, -1) is False
+    assert database.update_book_availability(1, +1) is True
+    assert database.update_book_availability(1, +1) is False
+    assert database.get_book_by_id(1)['available_copies'] == 1
+    clear_database()
+
+
+def test_borrow_record_respects_active_loan_limit():
+    """Test that insert_borrow_record refuses a loan once the patron holds max_active books"""
+    clear_database()
+    now = datetime.now()
+    for _ in range(2):
+        assert database.insert_borrow_record("123456", 1, now, now + timedelta(days=14), max_active=2)
+    assert not database.insert_borrow_record("123456", 1, now, now + timedelta(days=14), max_active=2)
+    assert database.get_patron_borrow_count("123456") == 2
+    clear_database()
+
+
+def test_loan_can_only_be_closed_once():
+    """Test that a second return of the same loan is refused"""
+    clear_database()
+    add_book_to_catalog("Returned Once", "Test Author", "1234567890123", 2)
+    borrow_book_by_patron("123456", 1)
+    due_date = database.get_patron_borrowed_books("123456")[0]['due_date']
+
+    assert database.update_borrow_record_return_date("123456", 1, due_date, datetime.now())
+    assert not database.update_borrow_record_return_date("123456", 1, due_date, datetime.now())
+    clear_database()
+
+
+def test_threaded_borrow_return_keeps_invariants(tmp_path):
+    """Test that many threads borrowing and returning hot titles never oversell or over-return"""
+    report = run_stress(str(tmp_path / 'stress.db'), threads=8, operations=60, hot_books=2, copies=2, patrons=4)
+    assert report['outcomes']['borrow_ok'] > 0
+    assert report['ok'], report
+
+
+def test_multiprocess_app_borrow_return_keeps_invariants(tmp_path):
+    """Test the invariants with several processes going through the Flask routes"""
+    report = run_stress(str(tmp_path / 'stress.db'), processes=2, threads=3, operations=40,
+                        hot_books=2, copies=1, patrons=3, via='app')
+    assert report['processes'] == 2
+    assert report['ok'], report
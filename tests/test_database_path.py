@@ -0,0 +1,30 @@
+from app import create_app
+import database
+
+
+def test_each_app_uses_its_configured_database(tmp_path):
+    """Test that two apps created with different database files don't see each other's data"""
+    first = create_app(database=str(tmp_path / 'first.db'))
+    second = create_app(database=str(tmp_path / 'second.db'))
+
+    response = first.test_client().post('/add_book', data={
+        'title': 'Only In First', 'author': 'Test Author', 'isbn': '1234567890123', 'total_copies': '1'})
+    assert response.status_code == 302
+
+    first_titles = [book['title'] for book in first.test_client().get('/api/books?fields=title&limit=10').get_json()['books']]
+    second_titles = [book['title'] for book in second.test_client().get('/api/books?fields=title&limit=10').get_json()['books']]
+    assert 'Only In First' in first_titles
+    assert 'Only In First' not in second_titles
+
+
+def test_process_default_used_outside_app(library_database):
+    """Test that helpers called outside an app use the process-wide database file"""
+    assert database.get_database_path() == library_database
+    database.insert_book("Default Path", "Test Author", "1234567890123", 1, 1)
+    assert database.get_book_by_isbn("1234567890123")['title'] == "Default Path"
+
+
+def test_tests_start_from_empty_migrated_database():
+    """Test that each test gets a copy of the migrated template with no rows"""
+    assert database.schema_is_current()
+    assert database.get_all_books() == []
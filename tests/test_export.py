@@ -0,0 +1,82 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from app import create_app
+from clearDB import clear_database
+from services.export_service import export_catalog
+from services.library_service import add_book_to_catalog
+
+
+@pytest.fixture
+def client():
+    app = create_app()
+    clear_database()
+    add_book_to_catalog("Export Book 1", "Author, One", "1111111111111", 2)
+    add_book_to_catalog("Export \"Book\" 2", "Author Two", "2222222222222", 1)
+    yield app.test_client()
+    clear_database()
+
+
+def test_export_ndjson(client):
+    """Test that every book is exported as one JSON object per line"""
+    response = client.get('/api/books/export?format=ndjson')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row['isbn'] for row in rows] == ["1111111111111", "2222222222222"]
+    assert rows[0]['available_copies'] == 2
+
+
+def test_export_csv_quotes_fields(client):
+    """Test that CSV export has a header row and quotes commas and quotes correctly"""
+    response = client.get('/api/books/export?format=csv')
+    assert response.status_code == 200
+
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0] == ['id', 'title', 'author', 'isbn', 'total_copies', 'available_copies']
+    assert rows[1][2] == "Author, One"
+    assert rows[2][1] == "Export \"Book\" 2"
+
+
+def test_export_gzip(client):
+    """Test that the gzip option returns a valid gzip file"""
+    response = client.get('/api/books/export?format=ndjson&gzip=true')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/gzip'
+
+    lines = gzip.decompress(response.get_data()).decode('utf-8').splitlines()
+    assert len(lines) == 2
+
+
+def test_export_invalid_format(client):
+    """Test rejecting an unsupported export format"""
+    response = client.get('/api/books/export?format=xml')
+    assert response.status_code == 400
+
+
+def test_export_is_chunked():
+    """Test that rows are grouped into chunks instead of one large string"""
+    books = [
+        {'id': i, 'title': f'T{i}', 'author': 'A', 'isbn': str(i).zfill(13), 'total_copies': 1, 'available_copies': 1}
+        for i in range(10)
+    ]
+    chunks = list(export_catalog('ndjson', books, rows_per_chunk=4))
+    assert len(chunks) == 3
+    assert ''.join(chunks).count('\n') == 10
+
+
+def test_export_uses_app_database(tmp_path):
+    """Test that the streamed body reads the database the app was created with"""
+    app = create_app(database=str(tmp_path / 'other.db'))
+    client = app.test_client()
+    client.post('/add_book', data={
+        'title': 'Only In Other', 'author': 'Test Author', 'isbn': '3333333333333', 'total_copies': '1'})
+
+    response = client.get('/api/books/export?format=ndjson')
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert 'Only In Other' in [row['title'] for row in rows]
@@ -0,0 +1,130 @@
+import random
+import sqlite3
+
+import pytest
+
+import database
+from app import create_app
+from clearDB import clear_database
+from services import fuzzy_service
+from services.fuzzy_service import Vocabulary, edit_distance
+from services.library_service import add_book_to_catalog, search_books_in_catalog
+
+
+@pytest.fixture
+def catalog():
+    clear_database()
+    for i, (title, author) in enumerate([
+        ("The Great Gatsby", "F. Scott Fitzgerald"),
+        ("Tender Is the Night", "F. Scott Fitzgerald"),
+        ("1984", "George Orwell"),
+        ("Animal Farm", "George Orwell"),
+        ("Les Misérables", "Victor Hugo"),
+        ("Great Expectations", "Charles Dickens"),
+    ], start=1):
+        add_book_to_catalog(title, author, f"97800000000{i:02d}", 1)
+    yield
+    clear_database()
+
+
+def titles(books):
+    return [book['title'] for book in books]
+
+
+def test_edit_distance():
+    """Test the edit distance against known values and its limit"""
+    assert edit_distance("fitzgerld", "fitzgerald") == 1
+    assert edit_distance("kitten", "sitting") == 3
+    assert edit_distance("", "abc") == 3
+    assert edit_distance("graet", "great") == 1
+    assert edit_distance("kitten", "sitting", limit=1) == 2
+    assert edit_distance("abc", "abcdef", limit=2) == 3
+
+
+def test_vocabulary_finds_every_close_word():
+    """Test that the letter-pair filter never drops a word within the distance"""
+    rng = random.Random(7)
+    words = {''.join(rng.choice('abcde') for _ in range(rng.randint(1, 8))) for _ in range(2000)}
+    vocabulary = Vocabulary()
+    for word in words:
+        vocabulary.add(word)
+
+    for query in ['abc', 'edcba', 'aaaaaa', 'bcdebcde', 'ab']:
+        for max_distance in (1, 2):
+            expected = sorted((edit_distance(query, word), word) for word in words
+                              if edit_distance(query, word) <= max_distance)
+            assert sorted(vocabulary.search(query, max_distance)) == expected
+
+
+def test_misspelled_author(catalog):
+    """Test that misspelled authors find their books"""
+    assert titles(search_books_in_catalog("Fitzgerld", "author", fuzzy=True)) == ["Tender Is the Night", "The Great Gatsby"]
+    assert titles(search_books_in_catalog("orwel", "author", fuzzy=True)) == ["1984", "Animal Farm"]
+    assert search_books_in_catalog("Fitzgerld", "author") == []
+
+
+def test_ranked_by_distance_then_title(catalog):
+    """Test that closer matches come first and every word must match"""
+    assert titles(search_books_in_catalog("Graet Expectatons", "title", fuzzy=True)) == ["Great Expectations"]
+    assert titles(search_books_in_catalog("gret", "title", fuzzy=True)) == ["Great Expectations", "The Great Gatsby"]
+    assert titles(search_books_in_catalog("miserables", "title", fuzzy=True)) == ["Les Misérables"]
+    assert search_books_in_catalog("Orwelllll", "author", fuzzy=True) == []
+    assert search_books_in_catalog("Georg Dickens", "author", fuzzy=True) == []
+
+
+
+def test_substring_matches_kept(catalog):
+    """Test that allowing typos keeps the substring matches and lists them first"""
+    assert titles(search_books_in_catalog("gats", "title", fuzzy=True)) == ["The Great Gatsby"]
+    assert titles(search_books_in_catalog("great", "title", fuzzy=True)) == ["Great Expectations", "The Great Gatsby"]
+    assert titles(search_books_in_catalog("orwell", "author", fuzzy=True)) == ["1984", "Animal Farm"]
+
+
+def test_short_words_do_not_scan_catalog(catalog, mocker):
+    """Test that words too short to tolerate typos skip the fuzzy lookup instead of reading every book"""
+    candidates = mocker.spy(fuzzy_service, 'get_token_search_candidates')
+    assert titles(search_books_in_catalog("is", "title", fuzzy=True)) == ["Les Misérables", "Tender Is the Night"]
+    assert search_books_in_catalog("xy", "title", fuzzy=True) == []
+    assert candidates.call_count == 0
+
+def test_index_follows_catalog(catalog, mocker):
+    """Test that books added here are indexed in place and changes elsewhere cause a rebuild"""
+    search_books_in_catalog("orwel", "author", fuzzy=True)
+    rebuild = mocker.spy(fuzzy_service, 'iter_search_keys')
+    add_book_to_catalog("Homage to Catalonia", "George Orwell", "9780000000099", 1)
+    assert titles(search_books_in_catalog("Catalnia", "title", fuzzy=True)) == ["Homage to Catalonia"]
+    assert rebuild.call_count == 0
+
+    conn = sqlite3.connect(database.DATABASE)
+    conn.execute("UPDATE books SET author = 'Eric Blair', author_key = 'eric blair' WHERE author = 'George Orwell'")
+    conn.commit()
+    conn.close()
+    assert search_books_in_catalog("orwel", "author", fuzzy=True) == []
+    assert len(search_books_in_catalog("blaire", "author", fuzzy=True)) == 3
+    assert rebuild.call_count == 1
+
+
+def test_fuzzy_search_routes(catalog):
+    """Test the fuzzy flag on the search page and the search API"""
+    client = create_app(init_db=False).test_client()
+
+    data = client.get('/api/search?q=Fitzgerld&type=author&fuzzy=1').get_json()
+    assert data['fuzzy'] is True and data['count'] == 2
+    assert client.get('/api/search?q=Fitzgerld&type=author').get_json()['count'] == 0
+
+    response = client.get('/search?q=Orwel&type=author&fuzzy=on')
+    assert b'Animal Farm' in response.data and b'checked' in response.data
+
+
+def test_first_fuzzy_request_within_budget(catalog, monkeypatch):
+    """Test that building the vocabulary on the first fuzzy request does not count against its budget"""
+    monkeypatch.setattr(fuzzy_service, '_index', fuzzy_service.FuzzyIndex())
+    app = create_app(init_db=False)
+    app.config['QUERY_BUDGET_MODE'] = 'raise'
+    app.testing = True
+    client = app.test_client()
+
+    data = client.get('/api/search?q=Gatsbi&type=title&fuzzy=1').get_json()
+    assert titles(data['results']) == ["The Great Gatsby"]
+    monkeypatch.setattr(fuzzy_service, '_index', fuzzy_service.FuzzyIndex())
+    assert b'The Great Gatsby' in client.get('/search?q=Gatsbi&type=title&fuzzy=1').data
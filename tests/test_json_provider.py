@@ -0,0 +1,46 @@
+import json
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from json_provider import FastJSONProvider, orjson
+
+BORROW_DATE = datetime(2025, 3, 1, 14, 30, 15, 123456)
+
+
+@pytest.fixture(params=[True, False], ids=['orjson', 'stdlib'])
+def app(request):
+    if request.param and orjson is None:
+        pytest.skip("orjson is not installed")
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app, use_orjson=request.param)
+    return app
+
+
+def test_datetime_serialized_as_iso(app):
+    """Test that datetimes are written as ISO 8601 strings"""
+    with app.app_context():
+        response = app.json.response({'due_date': BORROW_DATE})
+    assert json.loads(response.get_data()) == {'due_date': '2025-03-01T14:30:15.123456'}
+    assert response.mimetype == 'application/json'
+
+
+def test_both_encoders_produce_same_document(app):
+    """Test that output matches between orjson and the standard library fallback"""
+    payload = {'b': [1, 2.5, None, True], 'a': 'Café', 'when': BORROW_DATE}
+    with app.app_context():
+        assert json.loads(app.json.dumps(payload)) == {
+            'a': 'Café', 'b': [1, 2.5, None, True], 'when': '2025-03-01T14:30:15.123456'
+        }
+
+
+def test_unserializable_object_raises(app):
+    """Test that unknown objects still raise TypeError"""
+    with pytest.raises(TypeError):
+        app.json.dumps({'value': object()})
+
+
+def test_loads_round_trip(app):
+    """Test that loads reads what dumps writes"""
+    assert app.json.loads(app.json.dumps({'count': 3})) == {'count': 3}
@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import database
+from app import create_app
+from clearDB import clear_database
+from metrics import DB_QUERIES, DB_QUERY_DURATION, PAYMENT_GATEWAY_DURATION, REGISTRY, Registry
+from services.payment_service import PaymentGateway
+
+
+@pytest.fixture
+def client():
+    app = create_app()
+    REGISTRY.reset()
+    yield app.test_client()
+    clear_database()
+
+
+def test_request_and_query_metrics_exposed(client):
+    """Test that /metrics reports request counts, latency and per-helper SQL statements"""
+    client.get('/catalog')
+    body = client.get('/metrics').get_data(as_text=True)
+
+    assert 'library_http_requests_total{blueprint="catalog",endpoint="catalog.catalog",method="GET",status="200"} 1' in body
+    assert 'library_http_request_duration_seconds_count{blueprint="catalog",endpoint="catalog.catalog"} 1' in body
+    assert 'library_db_queries_total{helper="get_all_books"} 1' in body
+    assert 'library_db_query_duration_seconds_bucket{helper="get_all_books",le="+Inf"} 1' in body
+
+
+def test_payment_gateway_latency_recorded(mocker):
+    """Test that gateway calls are timed per operation"""
+    mocker.patch('services.payment_service.time.sleep')
+    REGISTRY.reset()
+    PaymentGateway().process_payment("123456", 5.00, "Late fees")
+    assert PAYMENT_GATEWAY_DURATION.count(operation='process_payment') == 1
+
+
+def test_counter_thread_safe():
+    """Test that concurrent increments are not lost"""
+    registry = Registry()
+    counter = registry.counter('test_total', 'Test counter.', ('kind',))
+
+    def work():
+        for _ in range(1000):
+            counter.inc(kind='a')
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.value(kind='a') == 8000
+
+
+def test_multiprocess_snapshots_merged(tmp_path):
+    """Test that samples written by other worker processes are summed"""
+    registry = Registry()
+    registry.multiprocess_dir = str(tmp_path)
+    counter = registry.counter('test_total', 'Test counter.')
+    histogram = registry.histogram('test_seconds', 'Test histogram.', buckets=(0.1, 1.0))
+    counter.inc(2)
+    histogram.observe(0.05)
+
+    other_worker = registry.snapshot()
+    with open(os.path.join(tmp_path, 'metrics-999999.json'), 'w') as f:
+        json.dump(other_worker, f)
+
+    body = registry.render()
+    assert 'test_total 4' in body
+    assert 'test_seconds_bucket{le="0.1"} 2' in body
+    assert 'test_seconds_count 2' in body
+
+
+def test_db_query_counter_uses_helper_name():
+    """Test that statements are labelled with the database helper that ran them"""
+    REGISTRY.reset()
+    database.get_book_by_id(1)
+    assert DB_QUERIES.value(helper='get_book_by_id') == 1
+
+
+def read_many_rows():
+    conn = database.get_db_connection()
+    rows = conn.execute(
+        'WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 200000) SELECT x FROM n'
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def test_db_query_latency_includes_fetching_rows():
+    """Test that a helper's latency histogram covers reading its rows, not just starting the statement"""
+    REGISTRY.reset()
+    start = time.perf_counter()
+    read_many_rows()
+    elapsed = time.perf_counter() - start
+
+    assert DB_QUERY_DURATION.count(helper='read_many_rows') == 1
+    _, total_seconds, _ = DB_QUERY_DURATION.snapshot()['values'][json.dumps(['read_many_rows'])]
+    assert total_seconds >= elapsed / 2
@@ -0,0 +1,80 @@
+import json
+import threading
+import time
+
+import pytest
+
+from app import create_app
+from clearDB import clear_database
+
+TOKEN = 'profile-secret'
+
+
+def slow_books():
+    time.sleep(0.05)
+    return []
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path, mocker):
+    monkeypatch.setenv('LIBRARY_PROFILE', '1')
+    monkeypatch.setenv('LIBRARY_PROFILE_TOKEN', TOKEN)
+    monkeypatch.setenv('LIBRARY_PROFILE_DIR', str(tmp_path))
+    mocker.patch('routes.catalog_routes.get_catalog_books', side_effect=slow_books)
+    app = create_app()
+    yield app
+    clear_database()
+
+
+def test_admin_header_profiles_request(app, tmp_path):
+    """Test that a request with the admin header writes collapsed stacks and speedscope JSON"""
+    response = app.test_client().get('/catalog', headers={'X-Profile': TOKEN})
+    name = response.headers['X-Profile-Name']
+
+    collapsed = (tmp_path / f'{name}.collapsed.txt').read_text()
+    assert 'catalog (catalog_routes.py' in collapsed
+    assert 'slow_books (test_profiling.py' in collapsed
+
+    speedscope = json.loads((tmp_path / f'{name}.speedscope.json').read_text())
+    assert speedscope['profiles'][0]['type'] == 'sampled'
+    assert speedscope['profiles'][0]['samples']
+
+
+def test_requests_without_header_not_profiled(app, tmp_path):
+    """Test that ordinary requests are not profiled when the sample rate is 0"""
+    response = app.test_client().get('/catalog')
+    assert 'X-Profile-Name' not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_failed_request_stops_sampler(app, tmp_path, mocker):
+    """Test that a request failing before after_request still stops the sampler and writes its profile"""
+    mocker.patch('routes.catalog_routes.get_catalog_books', side_effect=RuntimeError("boom"))
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+    with pytest.raises(RuntimeError):
+        app.test_client().get('/catalog', headers={'X-Profile': TOKEN})
+
+    assert not any(thread.name == 'library-profiler' for thread in threading.enumerate())
+    assert len(list(tmp_path.glob('*.speedscope.json'))) == 1
+
+
+def test_admin_endpoint_lists_profiles(app):
+    """Test that recent profiles are listed and downloadable with the admin token"""
+    client = app.test_client()
+    name = client.get('/catalog', headers={'X-Profile': TOKEN}).headers['X-Profile-Name']
+
+    assert client.get('/admin/profiles').status_code == 403
+    profiles = client.get('/admin/profiles', headers={'X-Profile': TOKEN}).get_json()['profiles']
+    assert profiles[0]['name'] == name
+
+    download = client.get(f"/admin/profiles/{profiles[0]['collapsed']}", headers={'X-Profile': TOKEN})
+    assert download.status_code == 200
+
+
+def test_disabled_registers_nothing(monkeypatch):
+    """Test that no profiling hooks or routes exist when profiling is disabled"""
+    monkeypatch.delenv('LIBRARY_PROFILE', raising=False)
+    app = create_app()
+    assert 'admin_profiles' not in app.view_functions
+    assert not any(getattr(hook, '__module__', '') == 'profiling' for hook in app.before_request_funcs.get(None, []))
+    clear_database()
@@ -0,0 +1,88 @@
+import logging
+
+import pytest
+
+from app import create_app
+from clearDB import clear_database
+from query_budget import QueryBudgetExceeded, assert_max_queries, query_budget
+from services.library_service import (
+    add_book_to_catalog, borrow_book_by_patron, get_patron_status_report, return_book_by_patron
+)
+import database
+
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['QUERY_BUDGET_MODE'] = 'raise'
+    app.testing = True
+    clear_database()
+    for i in range(1, 4):
+        add_book_to_catalog(f"Budget Book {i}", "Test Author", f"123456789000{i}", 2)
+    yield app
+    clear_database()
+
+
+def test_routes_stay_within_budget(app):
+    """Test that every budgeted route stays within its declared statement budget"""
+    client = app.test_client()
+    borrow_book_by_patron("654321", 2)
+
+    assert client.get('/catalog').status_code == 200
+    assert client.post('/add_book', data={'title': 'New', 'author': 'A', 'isbn': '9999999999999', 'total_copies': '1'}).status_code == 302
+    assert client.post('/borrow', data={'patron_id': '123456', 'book_id': '1'}).status_code == 302
+    assert client.post('/return', data={'patron_id': '123456', 'book_id': '1'}).status_code == 200
+    assert client.get('/search?q=Budget&type=title').status_code == 200
+    assert client.get('/api/search?q=Budget&type=title').status_code == 200
+    assert client.get('/api/books').status_code == 200
+    assert client.get('/api/late_fee/654321/2').status_code == 200
+    assert client.get('/api/patron/654321/status').status_code == 200
+
+
+def test_patron_status_has_no_n_plus_one():
+    """Test that the status report issues one query no matter how many books are borrowed"""
+    clear_database()
+    for i in range(1, 5):
+        add_book_to_catalog(f"Budget Book {i}", "Test Author", f"123456789000{i}", 2)
+        borrow_book_by_patron("123456", i)
+
+    with assert_max_queries(1, 'get_patron_status_report'):
+        report = get_patron_status_report("123456")
+    assert len(report['currently_borrowed']) == 4
+    clear_database()
+
+
+def test_service_call_budgets(app):
+    """Test the statement budgets of the borrow and return service calls"""
+    with assert_max_queries(4, 'borrow_book_by_patron'):
+        borrow_book_by_patron("123456", 1)
+    with assert_max_queries(6, 'return_book_by_patron'):
+        return_book_by_patron("123456", 1)
+
+
+def test_budget_exceeded_lists_statements():
+    """Test that exceeding a budget raises with the offending statements"""
+    with pytest.raises(QueryBudgetExceeded) as excinfo:
+        with assert_max_queries(1, 'two lookups'):
+            database.get_book_by_id(1)
+            database.get_book_by_isbn("1234567890001")
+    assert 'two lookups executed 2 SQL statements (budget 1)' in str(excinfo.value)
+    assert 'get_book_by_isbn' in str(excinfo.value)
+
+
+def test_over_budget_route_warns(app, caplog):
+    """Test that warn mode logs an over-budget request instead of failing it"""
+    @app.route('/test-over-budget')
+    @query_budget(0)
+    def over_budget():
+        database.get_all_books()
+        return 'ok'
+
+    app.config['QUERY_BUDGET_MODE'] = 'warn'
+    with caplog.at_level(logging.WARNING, logger='query_budget'):
+        assert app.test_client().get('/test-over-budget').status_code == 200
+    assert 'budget 0' in caplog.text
+
+    app.config['QUERY_BUDGET_MODE'] = 'raise'
+    with pytest.raises(QueryBudgetExceeded):
+        app.test_client().get('/test-over-budget')
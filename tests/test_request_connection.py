@@ -0,0 +1,74 @@
+import pytest
+from flask import g
+
+import database
+from app import create_app
+from clearDB import clear_database
+from services.library_service import add_book_to_catalog, borrow_book_by_patron
+
+
+@pytest.fixture
+def app():
+    app = create_app()
+    clear_database()
+    add_book_to_catalog("Scoped Book", "Test Author", "1234567890123", 2)
+    yield app
+    clear_database()
+
+
+def test_return_uses_one_connection(app, mocker):
+    """Test that a return request opens a single database connection"""
+    borrow_book_by_patron("123456", 1)
+    connect = mocker.spy(database.sqlite3, 'connect')
+
+    response = app.test_client().post('/return', data={'patron_id': '123456', 'book_id': '1'})
+
+    assert response.status_code == 200
+    assert connect.call_count == 1
+    assert database.get_book_by_id(1)['available_copies'] == 2
+
+
+def test_request_changes_committed_at_teardown(app):
+    """Test that writes made during a request are committed when the request ends"""
+    response = app.test_client().post('/borrow', data={'patron_id': '123456', 'book_id': '1'})
+    assert response.status_code == 302
+    assert database.get_book_by_id(1)['available_copies'] == 1
+    assert database.get_patron_borrow_count("123456") == 1
+
+
+def test_request_rolled_back_on_error(app):
+    """Test that writes are rolled back when the request raises"""
+    with pytest.raises(RuntimeError):
+        with app.test_request_context():
+            database.update_book_availability(1, -1)
+            raise RuntimeError("boom")
+    assert database.get_book_by_id(1)['available_copies'] == 2
+
+
+
+def test_failed_return_leaves_loan_open(app, mocker):
+    """Test that a return whose copy can't be given back reopens the loan instead of committing half of it"""
+    borrow_book_by_patron("123456", 1)
+    mocker.patch('services.library_service.update_book_availability', return_value=False)
+
+    response = app.test_client().post('/return', data={'patron_id': '123456', 'book_id': '1'})
+
+    assert response.status_code == 200 and b'Database error' in response.data
+    loans = database.get_patron_borrowed_books("123456")
+    assert len(loans) == 1 and loans[0]['book_id'] == 1
+    assert database.get_patron_borrow_count("123456") == 1
+
+def test_connection_shared_within_request(app):
+    """Test that helpers reuse the same connection inside a request"""
+    with app.test_request_context():
+        first = database.get_db_connection()
+        second = database.get_db_connection()
+        assert first is second
+        assert g._db_connection is first
+
+
+def test_standalone_connection_outside_request():
+    """Test that scripts and tests get a normal connection outside a request"""
+    conn = database.get_db_connection()
+    assert not isinstance(conn, database.RequestConnection)
+    conn.close()
@@ -0,0 +1,102 @@
+import sqlite3
+
+import pytest
+
+import database
+from app import create_app
+from query_budget import assert_max_queries
+from services.library_service import (
+    add_book_to_catalog, borrow_book_by_patron, search_books_batch, search_books_in_catalog,
+)
+
+
+@pytest.fixture
+def catalog():
+    for title, author, isbn in [
+        ("The Great Gatsby", "F. Scott Fitzgerald", "9780743273565"),
+        ("Tender Is the Night", "F. Scott Fitzgerald", "9780684801544"),
+        ("Great Expectations", "Charles Dickens", "9780141439563"),
+        ("Great", "Anonymous", "9780000000001"),
+        ("Émile", "Jean-Jacques Rousseau", "9780465019311"),
+    ]:
+        add_book_to_catalog(title, author, isbn, 1)
+    assert borrow_book_by_patron("123456", 1)[0]
+
+
+SEARCHES = [
+    ("great", "title"), ("GATSBY", "title"), ("fitz", "author"), ("Ém", "title"), ("xyz", "title"),
+    ("978074", "isbn"), ("9780", "isbn"), ("97x", "isbn"),
+    ("title:great available:true", "query"), ("isbn:978014* dickens", "query"),
+    ("great", "genre"),
+]
+
+
+def test_batch_matches_single_searches(catalog):
+    """Test that every search in a batch returns what the same search returns on its own"""
+    results = search_books_batch(SEARCHES)
+
+    assert list(results) == [f'{search_type}:{term}' for term, search_type in SEARCHES]
+    for term, search_type in SEARCHES:
+        expected = search_books_in_catalog(term, search_type)
+        assert results[f'{search_type}:{term}'] == {'results': expected, 'count': len(expected)}
+    assert [book['title'] for book in results['title:great']['results']] == [
+        "Great", "Great Expectations", "The Great Gatsby"]
+
+
+def test_batch_shares_statements(catalog):
+    """Test that a batch runs one statement per kind of search, however many searches it has"""
+    searches = [(title, "title") for title in ("great", "night", "gatsby", "emile")] * 3
+    searches += [("978", "isbn"), ("9780", "isbn"), ("author:fitz", "query"), ("title:great", "query")]
+    with assert_max_queries(4):
+        results = search_books_batch(searches)
+    assert len(results) == 8 and results['title:night']['count'] == 1
+
+    # Short terms can't use the index, so they share one read of the catalog instead
+    with assert_max_queries(2):
+        assert search_books_batch([("ex", "title"), ("em", "title")])['title:ex']['count'] == 1
+
+
+def test_batch_reports_invalid_queries(catalog):
+    """Test that an invalid query gets an error without failing the other searches"""
+    results = search_books_batch([("genre:poetry", "query"), ("gatsby", "title")])
+    assert "Unknown search field" in results['query:genre:poetry']['error']
+    assert results['title:gatsby']['count'] == 1
+
+
+def test_batch_reads_one_snapshot(catalog, monkeypatch):
+    """Test that a batch holds one read transaction, so the catalog can't change between its statements"""
+    search_books_by_keys = database.search_books_by_keys
+
+    def write_midway(searches):
+        books = search_books_by_keys(searches)
+        other = sqlite3.connect(database.DATABASE, timeout=0)
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            other.execute("UPDATE books SET available_copies = 0 WHERE isbn = '9780000000001'")
+            other.commit()
+        other.close()
+        return books
+
+    monkeypatch.setattr('services.library_service.search_books_by_keys', write_midway)
+    results = search_books_batch([("great", "title"), ("978000", "isbn")])
+    assert results['isbn:978000']['count'] == 1
+
+    # The transaction ends with the batch
+    assert add_book_to_catalog("Great Circle", "Maggie Shipstead", "9780000000002", 1)[0]
+
+
+def test_batch_api(catalog):
+    """Test the batch search endpoint and its validation"""
+    client = create_app(init_db=False).test_client()
+
+    response = client.post('/api/search/batch', json={'searches': [
+        {'q': 'gatsby'}, {'q': 'fitz', 'type': 'author'}, {'q': 'isbn:12', 'type': 'query'}]})
+    data = response.get_json()
+    assert response.status_code == 200 and data['count'] == 3
+    assert data['results']['title:gatsby']['results'][0]['title'] == "The Great Gatsby"
+    assert data['results']['author:fitz']['count'] == 2
+    assert 'error' in data['results']['query:isbn:12']
+
+    assert client.post('/api/search/batch', json={}).status_code == 400
+    assert client.post('/api/search/batch', data='searches').status_code == 400
+    assert client.post('/api/search/batch', json={'searches': [{'type': 'title'}]}).status_code == 400
+    assert client.post('/api/search/batch', json={'searches': [{'q': 'a'}] * 101}).status_code == 400
@@ -0,0 +1,182 @@
+import sqlite3
+
+import pytest
+
+from app import create_app
+from clearDB import clear_database
+from services.library_service import add_book_to_catalog, search_books_in_catalog
+import database
+
+
+@pytest.fixture
+def catalog():
+    for title, author, isbn in [
+        ("To Kill a Mockingbird", "Harper Lee", "9780061120084"),
+        ("Mock", "Ann Mock", "9780000000001"),
+        ("Locked Room", "John Dickson Carr", "9780000000002"),
+        ("The Great Gatsby", "F. Scott Fitzgerald", "9780743273565"),
+    ]:
+        add_book_to_catalog(title, author, isbn, 1)
+
+
+def titles(books):
+    return [book['title'] for book in books]
+
+
+def test_substring_anywhere_in_title(catalog):
+    """Test that a term in the middle of a word matches, case-insensitively"""
+    assert titles(search_books_in_catalog("OCK", "title")) == ["Locked Room", "Mock", "To Kill a Mockingbird"]
+
+
+def test_exact_match_listed_first(catalog):
+    """Test that an exact title match comes before the other substring matches"""
+    assert titles(search_books_in_catalog("mock", "title")) == ["Mock", "To Kill a Mockingbird"]
+
+
+def test_short_terms_and_query_syntax(catalog):
+    """Test terms shorter than a trigram and terms containing FTS query syntax"""
+    assert titles(search_books_in_catalog("ck", "title")) == ["Locked Room", "Mock", "To Kill a Mockingbird"]
+    assert search_books_in_catalog('ock" OR "the', "title") == []
+    assert titles(search_books_in_catalog("Scott Fitz", "author")) == ["The Great Gatsby"]
+
+
+
+def test_terms_with_nul_characters(catalog):
+    """Test that a term FTS5 can't quote (it contains NUL) falls back to a scan instead of failing"""
+    assert search_books_in_catalog("abc\x00", "title") == []
+    assert search_books_in_catalog("\x00mock", "title") == []
+    assert search_books_in_catalog("title:\x00abc author:lee", "query") == []
+
+    client = create_app(init_db=False).test_client()
+    assert client.get('/api/search?q=%00abc&type=title').status_code == 200
+    assert client.get('/search?q=abc%00&type=title').status_code == 200
+    assert client.get('/api/search?q=title:%00abc&type=query').status_code == 200
+    response = client.post('/api/search/batch', json={'searches': [{'q': '\x00abc'}, {'q': 'title:\x00abc', 'type': 'query'}]})
+    assert response.status_code == 200
+
+def test_index_follows_inserts_updates_and_deletes(catalog):
+    """Test that the index is updated with the books table"""
+    add_book_to_catalog("Hemlock Grove", "Brian McGreevy", "9780000000003", 1)
+    assert "Hemlock Grove" in titles(search_books_in_catalog("lock", "title"))
+
+    conn = database.get_db_connection()
+    conn.execute("UPDATE books SET title = 'Renamed', title_key = 'renamed' WHERE isbn = '9780000000003'")
+    conn.execute("DELETE FROM books WHERE isbn = '9780000000002'")
+    conn.commit()
+    conn.close()
+    assert titles(search_books_in_catalog("lock", "title")) == []
+
+    clear_database()
+    conn = sqlite3.connect(database.DATABASE)
+    conn.execute("INSERT INTO books_search (books_search) VALUES ('integrity-check')")
+    conn.close()
+
+
+def test_migration_indexes_existing_books(tmp_path, monkeypatch):
+    """Test that upgrading a version 1 database indexes the books it already has"""
+    path = str(tmp_path / 'v1.db')
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE books (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, author TEXT NOT NULL,
+                            isbn TEXT UNIQUE NOT NULL, total_copies INTEGER NOT NULL, available_copies INTEGER NOT NULL)
+    ''')
+    conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                 "VALUES ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 1, 1)")
+    conn.execute('PRAGMA user_version = 1')
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(database, 'DATABASE', path)
+    database.init_database()
+    assert database.get_schema_version() == database.SCHEMA_VERSION
+    assert titles(search_books_in_catalog("ingbi", "title")) == ["To Kill a Mockingbird"]
+
+
+def test_search_keys_fold_case_accents_and_spaces():
+    """Test the normalization used for the stored keys and the search terms"""
+    assert database.search_key("  Les  Misérables ") == "les miserables"
+    assert database.search_key("STRAßE") == "strasse"
+    assert database.search_key("Émile Zola") == database.search_key("EMILE ZOLA")
+
+
+def test_international_titles_and_sorting():
+    """Test that searches ignore accents and case, and books sort by their title key"""
+    add_book_to_catalog("Les Misérables", "Victor Hugo", "9780000000011", 1)
+    add_book_to_catalog("L'Étranger", "Albert Camus", "9780000000012", 1)
+    add_book_to_catalog("apple Pie", "Émile Zola", "9780000000013", 1)
+
+    assert titles(search_books_in_catalog("MISERABLES", "title")) == ["Les Misérables"]
+    assert titles(search_books_in_catalog("étrang", "title")) == ["L'Étranger"]
+    assert titles(search_books_in_catalog("emile", "author")) == ["apple Pie"]
+    assert titles(search_books_in_catalog("les  mis", "title")) == ["Les Misérables"]
+    assert titles(database.get_all_books()) == ["apple Pie", "L'Étranger", "Les Misérables"]
+    assert 'title_key' not in database.get_book_by_isbn("9780000000011")
+
+
+def test_migration_adds_and_indexes_search_keys(tmp_path, monkeypatch):
+    """Test that upgrading a version 3 database fills in the keys and moves the index onto them"""
+    path = str(tmp_path / 'v3.db')
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE books (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, author TEXT NOT NULL,
+                            isbn TEXT UNIQUE NOT NULL, total_copies INTEGER NOT NULL, available_copies INTEGER NOT NULL);
+        CREATE VIRTUAL TABLE books_search USING fts5(title, author, content='books', content_rowid='id', tokenize='trigram');
+        CREATE TRIGGER books_search_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_search (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END;
+        INSERT INTO books (title, author, isbn, total_copies, available_copies)
+        VALUES ('Les Misérables', 'Victor Hugo', '9780000000011', 1, 1);
+        PRAGMA user_version = 3;
+    ''')
+    conn.close()
+
+    monkeypatch.setattr(database, 'DATABASE', path)
+    database.init_database()
+    conn = sqlite3.connect(path)
+    assert conn.execute('SELECT title_key, author_key FROM books').fetchall() == [('les miserables', 'victor hugo')]
+    conn.execute("INSERT INTO books_search (books_search) VALUES ('integrity-check')")
+    conn.close()
+    assert titles(search_books_in_catalog("miserables", "title")) == ["Les Misérables"]
+
+
+def test_isbn_prefix_search(catalog):
+    """Test that an ISBN search returns the books whose ISBN starts with the digits, in ISBN order"""
+    assert [book['isbn'] for book in search_books_in_catalog("978000", "isbn")] == [
+        "9780000000001", "9780000000002"]
+    assert titles(search_books_in_catalog("9780061120084", "isbn")) == ["To Kill a Mockingbird"]
+    assert search_books_in_catalog("9781", "isbn") == []
+    assert search_books_in_catalog("978-0", "isbn") == []
+
+
+def test_isbn_prefix_search_is_limited_and_uses_index(catalog):
+    """Test the result limit and that the prefix becomes a range on the ISBN index"""
+    assert len(database.get_books_by_isbn_prefix("978", limit=2)) == 2
+    assert len(search_books_in_catalog("9", "isbn")) == 4
+
+    conn = sqlite3.connect(database.DATABASE)
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM books WHERE isbn >= '978' AND isbn < '979' "
+                        "ORDER BY isbn LIMIT 50").fetchall()
+    conn.close()
+    assert 'USING INDEX' in plan[0][3] and 'isbn>? AND isbn<?' in plan[0][3]
+
+
+def test_failed_bulk_insert_keeps_indexes_and_triggers(tmp_path, monkeypatch):
+    """Test that a bulk load that raises is rolled back with the indexes and triggers it dropped"""
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'bulk.db'))
+    database.init_database()
+    conn = sqlite3.connect(database.DATABASE)
+    schema = "SELECT type, name FROM sqlite_master WHERE tbl_name = 'books' ORDER BY name"
+    before = conn.execute(schema).fetchall()
+
+    with pytest.raises(sqlite3.IntegrityError):
+        with conn, database.bulk_insert_books(conn):
+            conn.executemany(
+                "INSERT INTO books (title, author, isbn, total_copies, available_copies, title_key, author_key) "
+                "VALUES (?, ?, ?, 1, 1, ?, ?)",
+                [("Mock", "Ann Mock", "9780000000001", "mock", "ann mock")] * 2)
+    assert conn.execute(schema).fetchall() == before
+    assert conn.execute("SELECT COUNT(*) FROM books").fetchone()[0] == 0
+    conn.close()
+
+    add_book_to_catalog("To Kill a Mockingbird", "Harper Lee", "9780061120084", 1)
+    assert titles(search_books_in_catalog("mock", "title")) == ["To Kill a Mockingbird"]
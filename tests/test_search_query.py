@@ -0,0 +1,101 @@
+import pytest
+
+import database
+from app import create_app
+from services.library_service import add_book_to_catalog, borrow_book_by_patron, search_books_in_catalog
+from services.query_service import SearchQueryError, parse_search_query
+
+
+@pytest.fixture
+def catalog():
+    for title, author, isbn, copies in [
+        ("The Great Gatsby", "F. Scott Fitzgerald", "9780743273565", 1),
+        ("Tender Is the Night", "F. Scott Fitzgerald", "9780684801544", 2),
+        ("Great Expectations", "Charles Dickens", "9780141439563", 1),
+        ("Émile", "Jean-Jacques Rousseau", "9780465019311", 1),
+    ]:
+        add_book_to_catalog(title, author, isbn, copies)
+    assert borrow_book_by_patron("123456", 1)[0]
+
+
+def titles(books):
+    return [book['title'] for book in books]
+
+
+def query(text):
+    return titles(search_books_in_catalog(text, 'query'))
+
+
+def test_fielded_terms_all_match(catalog):
+    """Test that every term of a query must match, with results ordered by title"""
+    assert query('author:fitz') == ["Tender Is the Night", "The Great Gatsby"]
+    assert query('title:great author:fitz') == ["The Great Gatsby"]
+    assert query('TITLE:"great   gatsby" author:"scott fitz"') == ["The Great Gatsby"]
+    assert query('great') == ["Great Expectations", "The Great Gatsby"]
+    assert query('dickens expectations') == ["Great Expectations"]
+    assert query('emile') == ["Émile"]
+    assert query('title:fitz') == []
+
+
+def test_availability_and_isbn_terms(catalog):
+    """Test the available filter, exact ISBNs and ISBN prefixes"""
+    assert query('author:fitz available:true') == ["Tender Is the Night"]
+    assert query('great available:false') == ["The Great Gatsby"]
+    assert query('isbn:978074*') == ["The Great Gatsby"]
+    assert query('isbn:9780684801544') == ["Tender Is the Night"]
+    assert query('isbn:978* title:ex') == ["Great Expectations"]
+    assert query('isbn:9780743273565 available:true') == []
+
+
+@pytest.mark.parametrize('text, message', [
+    ('genre:poetry', "Unknown search field 'genre'"),
+    ('title:', "No value given for 'title'"),
+    ('title:""', "No value given for 'title'"),
+    ('isbn:97807x*', "ISBN must be up to 13 digits"),
+    ('isbn:978074', r"search isbn:978074\* for a prefix"),
+    ('available:maybe', "available must be true or false"),
+    ('available:true available:no', "both true and false"),
+    ('title:"great"gatsby', "Cannot read the search query"),
+    (' '.join(['a'] * 11), "at most 10 terms"),
+    ('author:' + 'x' * 101, "Author must be at most 100 characters"),
+])
+def test_invalid_queries(text, message):
+    """Test that invalid queries are rejected with a message saying why"""
+    with pytest.raises(SearchQueryError, match=message):
+        parse_search_query(text)
+
+
+def test_query_is_one_statement_using_indexes(catalog, monkeypatch):
+    """Test that a query runs as one SELECT, through the trigram index or the ISBN index"""
+    statements = []
+    connect = database.get_db_connection
+
+    def traced_connection():
+        conn = connect()
+        # Leave out the statements the FTS5 module runs on its own tables
+        conn.set_trace_callback(lambda sql: "'main'." in sql or sql.startswith('--') or statements.append(sql))
+        return conn
+
+    monkeypatch.setattr(database, 'get_db_connection', traced_connection)
+    assert query('title:great author:"f. scott" available:true isbn:978*') == []
+    assert len(statements) == 1 and 'books_search MATCH' in statements[0]
+
+    statements.clear()
+    assert query('title:great isbn:9780743273565') == ["The Great Gatsby"]
+    assert len(statements) == 1 and 'MATCH' not in statements[0]
+
+
+def test_query_routes(catalog):
+    """Test query searches through the API and the search page, including invalid queries"""
+    client = create_app(init_db=False).test_client()
+
+    data = client.get('/api/search', query_string={'q': 'author:fitz available:true', 'type': 'query'}).get_json()
+    assert data['count'] == 1 and data['results'][0]['title'] == "Tender Is the Night"
+
+    response = client.get('/api/search', query_string={'q': 'genre:poetry', 'type': 'query'})
+    assert response.status_code == 400 and "Unknown search field" in response.get_json()['error']
+
+    page = client.get('/search', query_string={'q': 'title:great isbn:978074*', 'type': 'query'})
+    assert page.status_code == 200 and b"The Great Gatsby" in page.data
+    page = client.get('/search', query_string={'q': 'isbn:12', 'type': 'query'})
+    assert page.status_code == 200 and b"search isbn:12* for a prefix" in page.data
@@ -0,0 +1,78 @@
+import os
+import threading
+import urllib.request
+
+from app import create_app
+from clearDB import clear_database
+import serve
+from serve import PooledWSGIServer, create_listener
+
+
+def test_create_app_without_database_init(mocker):
+    """Test that workers can build the app without touching the schema"""
+    init = mocker.patch('app.init_database')
+    sample = mocker.patch('app.add_sample_data')
+    create_app(init_db=False)
+    init.assert_not_called()
+    sample.assert_not_called()
+
+
+def test_pooled_server_serves_from_shared_listener():
+    """Test that the pooled server accepts requests on a pre-bound socket and shuts down cleanly"""
+    listener = create_listener('127.0.0.1', 0)
+    port = listener.getsockname()[1]
+    server = PooledWSGIServer('127.0.0.1', port, create_app(), threads=2, fd=listener.fileno())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/search?q=1984&type=title', timeout=5) as response:
+            assert response.status == 200
+    finally:
+        server.shutdown()
+        server.server_close()
+        listener.close()
+        clear_database()
+
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+def test_master_removes_metrics_directory(mocker, monkeypatch, library_database):
+    """Test that the metrics directory the master creates for its workers is removed on shutdown"""
+    monkeypatch.delenv('LIBRARY_METRICS_DIR', raising=False)
+    mocker.patch('serve.create_listener')
+    created = []
+    run = mocker.patch('serve.Arbiter.run', side_effect=lambda: created.append(os.environ['LIBRARY_METRICS_DIR']))
+
+    serve.main(['--port', '0', '--database', library_database])
+    run.assert_called_once()
+    assert os.path.isdir(os.path.dirname(created[0])) and not os.path.exists(created[0])
+    assert 'LIBRARY_METRICS_DIR' not in os.environ
+
+
+def test_reload_replaces_new_worker_reaped_by_retire(mocker, monkeypatch):
+    """Test that a new worker that crashed while the old ones were retired is still replaced"""
+    monkeypatch.setattr(serve.signal, 'signal', lambda *args: None)
+    arbiter = serve.Arbiter(mocker.Mock(), '127.0.0.1', 0, workers=2, threads=1)
+    spawned = iter(range(100, 200))
+    mocker.patch.object(arbiter, 'spawn_worker', side_effect=lambda: arbiter.pids.add(next(spawned)))
+    mocker.patch.object(arbiter, 'reap', return_value=set())
+    running = []
+
+    def retire(pids, timeout=None):
+        if not arbiter.stopping:
+            # retire() reaps every exited child, so it also collects new worker 102, which crashed at startup
+            arbiter.pids -= set(pids) | {102}
+        else:
+            running.append(set(pids))
+
+    def sleep(seconds):
+        arbiter.stopping = True
+
+    mocker.patch.object(arbiter, 'retire', side_effect=retire)
+    monkeypatch.setattr(serve.time, 'sleep', sleep)
+    arbiter.reload_requested = True
+    arbiter.run()
+
+    assert running == [{103, 104}]
@@ -0,0 +1,90 @@
+import logging
+import time
+
+import pytest
+
+import database
+from clearDB import clear_database
+from services.library_service import add_book_to_catalog
+
+
+@pytest.fixture(autouse=True)
+def tracing():
+    database.get_sql_trace(clear=True)
+    yield
+    database.disable_sql_trace()
+    database.get_sql_trace(clear=True)
+    clear_database()
+
+
+def test_trace_records_statement_helper_and_caller():
+    """Test that traced statements record their SQL, duration, helper and caller"""
+    database.enable_sql_trace(slow_query_ms=None)
+    database.get_book_by_isbn("1234567890123")
+
+    entry = database.get_sql_trace()[-1]
+    assert entry['sql'] == 'SELECT id, title, author, isbn, total_copies, available_copies FROM books WHERE isbn = ?'
+    assert entry['helper'] == 'get_book_by_isbn'
+    assert 'test_sql_trace.py' in entry['caller']
+    assert entry['duration_ms'] >= 0
+
+
+def test_trace_disabled_records_nothing():
+    """Test that nothing is recorded while tracing is off"""
+    database.disable_sql_trace()
+    database.get_book_by_isbn("1234567890123")
+    assert database.get_sql_trace() == []
+
+
+def test_slow_query_logged_with_plan(caplog):
+    """Test that statements over the threshold are logged with their query plan"""
+    add_book_to_catalog("Traced Book", "Test Author", "1234567890123", 1)
+    database.enable_sql_trace(slow_query_ms=0)
+
+    with caplog.at_level(logging.WARNING, logger='database'):
+        database.get_book_by_isbn("1234567890123")
+
+    entry = database.get_sql_trace()[-1]
+    assert any('isbn' in step for step in entry['plan'])
+    assert 'Slow query' in caplog.text
+    assert 'get_book_by_isbn' in caplog.text
+
+
+def scan_many_rows():
+    """A helper whose statement starts quickly but is slow to read to the end"""
+    conn = database.get_db_connection()
+    rows = conn.execute(
+        'WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 300000) SELECT x FROM n'
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def test_row_fetching_counts_towards_duration(caplog):
+    """Test that the time spent fetching a statement's rows is included, so a slow scan is logged"""
+    database.enable_sql_trace(slow_query_ms=20)
+
+    with caplog.at_level(logging.WARNING, logger='database'):
+        start = time.perf_counter()
+        assert len(scan_many_rows()) == 300000
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+    entry = database.get_sql_trace()[-1]
+    assert entry['helper'] == 'scan_many_rows'
+    assert entry['duration_ms'] >= 20 and entry['duration_ms'] >= elapsed_ms / 2
+    assert 'Slow query' in caplog.text and 'scan_many_rows' in caplog.text
+
+
+def test_explain_query_plan_skips_non_queries():
+    """Test that statements without a plan return no plan lines"""
+    conn = database.get_db_connection()
+    assert database.explain_query_plan(conn, 'PRAGMA user_version') == []
+    conn.close()
+
+
+def test_helper_failure_is_logged(caplog):
+    """Test that helper failures are logged instead of silently returning False"""
+    add_book_to_catalog("Traced Book", "Test Author", "1234567890123", 1)
+    with caplog.at_level(logging.ERROR, logger='database'):
+        assert database.insert_book("Duplicate", "Test Author", "1234567890123", 1, 1) is False
+    assert 'insert_book failed' in caplog.text
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+import database
+from app import create_app
+from clearDB import clear_database
+
+
+def test_schema_version_recorded():
+    """Test that init_database records the current schema version"""
+    database.init_database()
+    assert database.get_schema_version() == database.SCHEMA_VERSION
+    assert database.schema_is_current()
+
+
+def test_fast_startup_skips_schema_work(mocker):
+    """Test that fast startup does no schema or sample data work when the schema is current"""
+    database.init_database()
+    init = mocker.patch('app.init_database')
+    sample = mocker.patch('app.add_sample_data')
+    create_app(fast_startup=True)
+    init.assert_not_called()
+    sample.assert_not_called()
+
+
+def test_fast_startup_initializes_outdated_schema(mocker):
+    """Test that fast startup still initializes a database with an old schema version"""
+    mocker.patch('app.schema_is_current', return_value=False)
+    init = mocker.patch('app.init_database')
+    sample = mocker.patch('app.add_sample_data')
+    create_app(fast_startup=True)
+    init.assert_called_once()
+    sample.assert_called_once()
+    clear_database()
+
+
+def test_payment_stack_imported_lazily():
+    """Test that importing the service layer does not import the payment gateway"""
+    code = "import sys, services.library_service; print('services.payment_service' in sys.modules)"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == 'False'
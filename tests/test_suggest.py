@@ -0,0 +1,109 @@
+import sqlite3
+
+import pytest
+
+import database
+from app import create_app
+from clearDB import clear_database
+from services import suggest_service
+from services.library_service import add_book_to_catalog, borrow_book_by_patron
+from services.suggest_service import suggest_books
+
+
+@pytest.fixture
+def catalog():
+    clear_database()
+    for i, (title, author) in enumerate([
+        ("The Hobbit", "J. R. R. Tolkien"),
+        ("The Two Towers", "J. R. R. Tolkien"),
+        ("Thérèse Raquin", "Émile Zola"),
+        ("Then There Were None", "Agatha Christie"),
+    ], start=1):
+        add_book_to_catalog(title, author, f"97800000000{i:02d}", 3)
+    borrow_book_by_patron("123456", 2)
+    borrow_book_by_patron("234567", 2)
+    borrow_book_by_patron("123456", 4)
+    yield
+    clear_database()
+
+
+def texts(suggestions):
+    return [suggestion['text'] for suggestion in suggestions]
+
+
+def test_prefix_ranked_by_popularity(catalog):
+    """Test that matches are ranked by times borrowed, then alphabetically"""
+    assert texts(suggest_books("the", "title")) == [
+        "The Two Towers", "Then There Were None", "The Hobbit", "Thérèse Raquin"]
+    assert suggest_books("the t", "title") == [{'text': "The Two Towers", 'popularity': 2}]
+    assert texts(suggest_books("j. r", "author")) == ["J. R. R. Tolkien"]
+    assert suggest_books("j. r", "author")[0]['popularity'] == 2
+    assert len(suggest_books("the", "title", limit=2)) == 2
+
+
+def test_prefix_ignores_case_accents_and_spaces(catalog):
+    """Test that the typed prefix is normalized like the catalog"""
+    assert texts(suggest_books("THERE", "title")) == ["Thérèse Raquin"]
+    assert texts(suggest_books("  emile ", "author")) == ["Émile Zola"]
+    assert texts(suggest_books("the   two", "title")) == ["The Two Towers"]
+    assert suggest_books("", "title") == []
+    assert suggest_books("the", "isbn") == []
+
+
+def test_local_changes_update_index_in_place(catalog, mocker):
+    """Test that books added and borrowed in this process don't trigger a rebuild"""
+    suggest_books("the", "title")
+    rebuild = mocker.spy(suggest_service, 'get_all_books')
+
+    add_book_to_catalog("The Silmarillion", "J. R. R. Tolkien", "9780000000099", 2)
+    assert borrow_book_by_patron("345678", 5)[0]
+    borrow_book_by_patron("345678", 1)
+    borrow_book_by_patron("456789", 5)
+
+    assert texts(suggest_books("the s", "title")) == ["The Silmarillion"]
+    assert texts(suggest_books("the", "title", limit=2)) == ["The Silmarillion", "The Two Towers"]
+    assert suggest_books("j", "author")[0]['popularity'] == 5
+    assert rebuild.call_count == 0
+
+
+def test_changes_from_elsewhere_trigger_rebuild(catalog):
+    """Test that books changed outside this process are picked up on the next request"""
+    suggest_books("the", "title")
+
+    conn = sqlite3.connect(database.DATABASE)
+    conn.execute("UPDATE books SET title = 'There and Back Again', title_key = 'there and back again' "
+                 "WHERE title = 'The Hobbit'")
+    conn.commit()
+    conn.close()
+    assert texts(suggest_books("there", "title")) == ["There and Back Again", "Thérèse Raquin"]
+
+    clear_database()
+    assert suggest_books("the", "title") == []
+
+
+def test_cached_top_lists_follow_popularity(catalog, monkeypatch):
+    """Test that prefixes with many matches keep their cached top list in order"""
+    monkeypatch.setattr(suggest_service, 'SCAN_LIMIT', 1)
+    assert texts(suggest_books("the", "title", limit=1)) == ["The Two Towers"]
+
+    for patron in ("111111", "222222", "333333"):
+        borrow_book_by_patron(patron, 3)
+    add_book_to_catalog("The Aeneid", "Virgil", "9780000000098", 1)
+    assert texts(suggest_books("the", "title", limit=3)) == ["Thérèse Raquin", "The Two Towers", "Then There Were None"]
+    assert texts(suggest_books("the", "title"))[-2:] == ["The Aeneid", "The Hobbit"]
+
+
+def test_suggest_api(catalog):
+    """Test the suggest endpoint and its validation"""
+    client = create_app(init_db=False).test_client()
+
+    data = client.get('/api/suggest?q=The+T&type=title').get_json()
+    assert data == {'query': 'The T', 'type': 'title', 'count': 1,
+                    'suggestions': [{'text': 'The Two Towers', 'popularity': 2}]}
+    assert client.get('/api/suggest?q=agatha&type=author').get_json()['count'] == 1
+
+    assert client.get('/api/suggest?q=').status_code == 400
+    assert client.get('/api/suggest?q=the&type=isbn').status_code == 400
+    assert client.get('/api/suggest?q=the&limit=abc').status_code == 400
+    assert client.get('/api/suggest?q=the&limit=0').status_code == 400
+    assert client.get('/api/suggest?q=the&limit=21').status_code == 400